@@ -0,0 +1,157 @@
+"""
+Tiered answering for messages that are not loan status inquiries
+
+Tiers are tried cheapest first and the first confident one answers:
+    exact    - the message is one of an intent's patterns (after preprocessing)
+    index    - the indexed intent matcher scores an intent at or above the threshold
+    llm      - the LLM, given whatever is left of the answer budget
+    fallback - the catalogue's static default reply, when the LLM is unavailable,
+               out of budget, or fails
+"""
+import time
+import threading
+
+from intent_catalogue import normalize_pattern
+from metrics import STAGE_SECONDS
+from llm_handler import UNAVAILABLE_MESSAGE, ERROR_MESSAGE, EMPTY_MESSAGE, OVERLOADED_MESSAGE
+
+TIERS = ('exact', 'index', 'llm', 'fallback')
+
+# Replies the LLM handlers return instead of an answer
+LLM_FAILURE_MESSAGES = frozenset((UNAVAILABLE_MESSAGE, ERROR_MESSAGE, EMPTY_MESSAGE, OVERLOADED_MESSAGE))
+
+
+class AnswerPipeline:
+    def __init__(self, intent_handler, budget=10.0, tier_budgets=None, llm_min_budget=0.25):
+        """
+        Args:
+            intent_handler: IntentHandler whose snapshot serves the exact and index tiers
+            budget: Seconds from the start of a message to its answer
+            tier_budgets: {tier: seconds}. The llm tier's deadline is capped at its
+                budget; exact and index cannot be interrupted, so exceeding theirs
+                is only counted as an overrun
+            llm_min_budget: Below this many seconds left the LLM is skipped for the fallback
+        """
+        self.intent_handler = intent_handler
+        self.budget = budget
+        self.tier_budgets = dict(tier_budgets or {})
+        self.llm_min_budget = llm_min_budget
+
+        self._lock = threading.Lock()
+        self.stats = {tier: {'attempts': 0, 'hits': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'overruns': 0}
+                      for tier in TIERS}
+        self.stats_total = 0
+
+    def match(self, message, timings):
+        """
+        Run the exact and index tiers
+
+        Args:
+            message: The user's message
+            timings: Dict that receives {tier: seconds} for each tier tried
+
+        Returns:
+            (tier, intent), or (None, None) when neither tier is confident
+        """
+        snapshot = self.intent_handler.snapshot
+
+        started = time.monotonic()
+        intent = snapshot.exact.get(normalize_pattern(message))
+        timings['exact'] = time.monotonic() - started
+        if intent is not None:
+            return 'exact', intent
+
+        started = time.monotonic()
+        intent, confidence = self.intent_handler.find_best_intent(message)
+        timings['index'] = time.monotonic() - started
+        if intent is not None:
+            return 'index', intent
+        return None, None
+
+    def llm_deadline(self, started, llm_available):
+        """time.monotonic() deadline for the llm tier, or None if it should be skipped"""
+        if not llm_available:
+            return None
+        deadline = started + self.budget
+        if 'llm' in self.tier_budgets:
+            deadline = min(deadline, time.monotonic() + self.tier_budgets['llm'])
+        if deadline - time.monotonic() < self.llm_min_budget:
+            return None
+        return deadline
+
+    def answer(self, message, llm_handler):
+        """
+        Answer message with the first confident tier
+
+        Returns:
+            (response, tier)
+        """
+        started = time.monotonic()
+        timings = {}
+        tier, intent = self.match(message, timings)
+
+        llm_response = None
+        if tier is None:
+            deadline = self.llm_deadline(started, llm_handler.is_available())
+            if deadline is not None:
+                llm_started = time.monotonic()
+                llm_response = llm_handler.generate_response(message, deadline=deadline)
+                timings['llm'] = time.monotonic() - llm_started
+        return self.resolve(tier, intent, llm_response, timings)
+
+    def resolve(self, tier, intent, llm_response, timings):
+        """
+        Turn the outcome of the tiers into a reply and record it
+
+        Args:
+            tier, intent: What match() returned
+            llm_response: The LLM's reply, or None if the llm tier was skipped
+
+        Returns:
+            (response, tier)
+        """
+        if tier is not None:
+            response = self.intent_handler.pick_response(intent)
+        elif llm_response is not None and llm_response not in LLM_FAILURE_MESSAGES:
+            tier, response = 'llm', llm_response
+        else:
+            started = time.monotonic()
+            tier, response = 'fallback', self.intent_handler.pick_response(None)
+            timings['fallback'] = time.monotonic() - started
+        self.record(tier, timings)
+        return response, tier
+
+    def record(self, tier, timings):
+        """Count one answer from tier, plus the time spent in every tier tried"""
+        for name in ('exact', 'index'):
+            if name in timings:
+                STAGE_SECONDS.observe(f"intent_{name}", timings[name])
+        with self._lock:
+            self.stats_total += 1
+            self.stats[tier]['hits'] += 1
+            for name, seconds in timings.items():
+                tier_stats = self.stats[name]
+                tier_stats['attempts'] += 1
+                tier_stats['seconds'] += seconds
+                if seconds > tier_stats['max_seconds']:
+                    tier_stats['max_seconds'] = seconds
+                budget = self.tier_budgets.get(name)
+                if budget is not None and seconds > budget:
+                    tier_stats['overruns'] += 1
+
+    def get_stats(self):
+        """Per tier: hit share of all answers, attempts, mean and max latency in ms, budget overruns"""
+        with self._lock:
+            total = self.stats_total
+            tiers = {}
+            for tier, tier_stats in self.stats.items():
+                attempts = tier_stats['attempts']
+                tiers[tier] = {
+                    'hits': tier_stats['hits'],
+                    'hit_share': tier_stats['hits'] / total if total else 0.0,
+                    'attempts': attempts,
+                    'mean_ms': tier_stats['seconds'] / attempts * 1000 if attempts else 0.0,
+                    'max_ms': tier_stats['max_seconds'] * 1000,
+                    'overruns': tier_stats['overruns'],
+                }
+        return {'answers': total, 'tiers': tiers}
@@ -1,510 +1,952 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import json
-import re
-from datetime import datetime
-import os
-from intent_handler import IntentHandler 
-
-app = Flask(__name__)
-CORS(app,origins=['http://localhost:4200'])
-
-import base64
-import hashlib
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import unpad
-
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'lms_db',
-    'user': 'postgres',
-    'password': 'prasad',
-    'port': 5432
-}
-
-# Initialize intent handler
-intent_handler = IntentHandler()
-
-class DatabaseManager:
-    def __init__(self):
-        self.connection = None
-    
-    def connect(self):
-        try:
-            self.connection = psycopg2.connect(**DB_CONFIG)
-            return True
-        except Exception as e:
-            print(f"Database connection error: {e}")
-            return False
-    
-    def close(self):
-        if self.connection:
-            self.connection.close()
-    
-    def execute_query(self, query, params=None):
-        try:
-            cursor = self.connection.cursor(cursor_factory=RealDictCursor)
-            cursor.execute(query, params)
-            if query.strip().upper().startswith('SELECT'):
-                result = cursor.fetchall()
-            else:
-                self.connection.commit()
-                result = cursor.rowcount
-            cursor.close()
-            return result
-        except Exception as e:
-            print(f"Query execution error: {e}")
-            self.connection.rollback()
-            return None
-
-db_manager = DatabaseManager()
-
-def decrypt_customer_id(encrypted_data: str) -> int:
-    """
-    Decrypt the encrypted customer_id using AES with the same key and method as Java EncryptionUtil.
-    """
-    try:
-        secret_key = "encryptionNarveePayload"
-        # Generate SHA-256 hash of the secret key and take first 16 bytes
-        key_bytes = hashlib.sha256(secret_key.encode('utf-8')).digest()[:16]
-        cipher = AES.new(key_bytes, AES.MODE_ECB)
-        # Decode URL-safe base64
-        encrypted_bytes = base64.urlsafe_b64decode(encrypted_data)
-        decrypted_bytes = cipher.decrypt(encrypted_bytes)
-        # Unpad decrypted bytes (PKCS7)
-        decrypted_bytes = unpad(decrypted_bytes, AES.block_size)
-        decrypted_str = decrypted_bytes.decode('utf-8')
-        return int(decrypted_str)
-    except Exception as e:
-        print(f"Decryption error: {e}")
-        raise ValueError("Invalid encrypted customer_id")
-
-class ChatBot:
-    def __init__(self):
-        self.intent_handler = intent_handler
-    
-    def get_loan_sanction_details(self, loan_id, account_number):
-        """
-        Fetch loan sanction details using both loan_id AND loan_account_number
-        """
-        query = """
-        SELECT
-            loan_id,
-            loan_account_number,
-            amount_sanctioned,
-            emi_amount,
-            emi_due_date,
-            number_of_emis,
-            emi_start_date,
-            emi_end_date,
-            rate_of_interest,
-            interest_type,
-            status,
-            loan_requested,
-            payment_freqmuency,
-            repayment_mode
-        FROM loancraft.lms_loan_saction
-        WHERE loan_id = %s AND loan_account_number = %s
-        """
-
-        result = db_manager.execute_query(query, (loan_id, account_number))
-
-        if result:
-            loan = result[0]
-            return {
-                'found': True,
-                'loan_id': loan['loan_id'],
-                'loan_account_number': loan['loan_account_number'],
-                'amount_sanctioned': float(loan['amount_sanctioned']) if loan['amount_sanctioned'] else 0,
-                'emi_amount': float(loan['emi_amount']) if loan['emi_amount'] else 0,
-                'emi_due_date': loan['emi_due_date'].strftime('%Y-%m-%d') if loan['emi_due_date'] else 'N/A',
-                'number_of_emis': int(loan['number_of_emis']) if loan['number_of_emis'] else 0,
-                'emi_start_date': loan['emi_start_date'].strftime('%Y-%m-%d') if loan['emi_start_date'] else 'N/A',
-                'emi_end_date': loan['emi_end_date'].strftime('%Y-%m-%d') if loan['emi_end_date'] else 'N/A',
-                'rate_of_interest': float(loan['rate_of_interest']) if loan['rate_of_interest'] else 0,
-                'interest_type': loan['interest_type'] or 'N/A',
-                'status': loan['status'] or 'N/A',
-                'loan_requested': float(loan['loan_requested']) if loan['loan_requested'] else 0,
-                'payment_frequency': loan['payment_freqmuency'] or 'N/A',
-                'repayment_mode': loan['repayment_mode'] or 'N/A'
-            }
-        return {'found': False}
-
-    def get_loans_by_customer_id(self, customer_id):
-        """
-        Fetch all loan details for a customer using customer_id
-        """
-        try:
-            decrypted_customer_id = decrypt_customer_id(customer_id)
-        except ValueError as e:
-            print(f"Error decrypting customer_id: {e}")
-            return []
-
-        query = """
-        SELECT
-            s.loan_id,
-            s.loan_account_number,
-            s.amount_sanctioned,
-            s.emi_amount,
-            s.emi_due_date,
-            s.number_of_emis,
-            s.emi_start_date,
-            s.emi_end_date,
-            s.rate_of_interest,
-            s.interest_type,
-            s.status,
-            s.loan_requested,
-            s.payment_freqmuency,
-            s.repayment_mode,
-            a.application_reference_id
-        FROM loancraft.lms_loan_saction s
-        JOIN loancraft.lms_applications a ON a.loan_id = s.loan_id
-        WHERE a.customer_id = %s
-        ORDER BY s.loan_id
-        """
-
-        result = db_manager.execute_query(query, (decrypted_customer_id,))
-
-        if result:
-            loans = []
-            for loan in result:
-                loans.append({
-                    'found': True,
-                    'loan_id': loan['loan_id'],
-                    'loan_account_number': loan['loan_account_number'],
-                    'application_reference_id': loan['application_reference_id'],
-                    'amount_sanctioned': float(loan['amount_sanctioned']) if loan['amount_sanctioned'] else 0,
-                    'emi_amount': float(loan['emi_amount']) if loan['emi_amount'] else 0,
-                    'emi_due_date': loan['emi_due_date'].strftime('%Y-%m-%d') if loan['emi_due_date'] else 'N/A',
-                    'number_of_emis': int(loan['number_of_emis']) if loan['number_of_emis'] else 0,
-                    'emi_start_date': loan['emi_start_date'].strftime('%Y-%m-%d') if loan['emi_start_date'] else 'N/A',
-                    'emi_end_date': loan['emi_end_date'].strftime('%Y-%m-%d') if loan['emi_end_date'] else 'N/A',
-                    'rate_of_interest': float(loan['rate_of_interest']) if loan['rate_of_interest'] else 0,
-                    'interest_type': loan['interest_type'] or 'N/A',
-                    'status': loan['status'] or 'N/A',
-                    'loan_requested': float(loan['loan_requested']) if loan['loan_requested'] else 0,
-                    'payment_frequency': loan['payment_freqmuency'] or 'N/A',
-                    'repayment_mode': loan['repayment_mode'] or 'N/A'
-                })
-            return loans
-        return []
-
-    def get_customer_name(self, customer_id):
-        """
-        Fetch customer name using customer_id
-        """
-        try:
-            decrypted_customer_id = decrypt_customer_id(customer_id)
-        except ValueError as e:
-            print(f"Error decrypting customer_id: {e}")
-            return None
-
-        query = """
-        SELECT first_name, last_name
-        FROM loancraft.lms_customers_info
-        WHERE customer_id = %s
-        """
-
-        result = db_manager.execute_query(query, (decrypted_customer_id,))
-
-        if result:
-            customer = result[0]
-            first_name = customer['first_name'] or ''
-            last_name = customer['last_name'] or ''
-            return f"{first_name} {last_name}".strip()
-        return None
-    
-    def get_loan_status(self, loan_id, account_number):
-        """
-        Get loan status information - wrapper for backward compatibility
-        """
-        return self.get_loan_sanction_details(loan_id, account_number)
-    
-    def save_chat_history(self, user_message, bot_response, session_id=None):
-        query = """
-        INSERT INTO chat_history (user_message, bot_response, session_id)
-        VALUES (%s, %s, %s)
-        """
-        db_manager.execute_query(query, (user_message, bot_response, session_id))
-    
-    def format_loan_response(self, loan_data):
-        """
-        Format loan data into a user-friendly response
-        """
-        return f"""
-📄 **Loan Sanction Details**
-
-**Loan ID:** {loan_data['loan_id']}
-**Account Number:** {loan_data['loan_account_number']}
-**Status:** {loan_data['status'].upper()}
-
-💰 **Financial Details:**
-• **Amount Sanctioned:** ₹{loan_data['amount_sanctioned']:,.2f}
-• **Loan Requested:** ₹{loan_data['loan_requested']:,.2f}
-• **EMI Amount:** ₹{loan_data['emi_amount']:,.2f}
-• **Number of EMIs:** {loan_data['number_of_emis']}
-
-📅 **EMI Schedule:**
-• **EMI Due Date:** {loan_data['emi_due_date']}
-• **EMI Start Date:** {loan_data['emi_start_date']}
-• **EMI End Date:** {loan_data['emi_end_date']}
-• **Payment Frequency:** {loan_data['payment_frequency']}
-
-📊 **Loan Terms:**
-• **Interest Rate:** {loan_data['rate_of_interest']}%
-• **Interest Type:** {loan_data['interest_type']}
-• **Repayment Mode:** {loan_data['repayment_mode']}
-
-Is there anything else I can help you with regarding your loan?
-        """
-    
-    def process_message(self, message, session_id=None, customer_name=None):
-        # Check if message contains both loan ID and account number patterns
-        loan_id_pattern = r'\b(\d+)\b'  # General number pattern for loan ID
-        account_pattern = r'\b(BHLPL\d+)\b'  # Account number pattern
-        
-        loan_id_matches = re.findall(loan_id_pattern, message)
-        account_matches = re.findall(account_pattern, message.upper())
-        
-        # More specific keywords that indicate loan STATUS/TRACKING inquiry
-        # Removed generic 'loan' keyword to avoid conflicts with FAQ
-        loan_status_keywords = ['status', 'emi', 'sanction', 'due date', 'details', 'track', 'check', 'loan']
-        
-        # Additional patterns that specifically indicate status checking
-        status_patterns = [
-            r'check.*status',
-            r'what.*status',
-            r'loan.*status',
-            r'status.*loan',
-            r'track.*loan',
-            r'loan.*details',
-            r'emi.*details',
-            r'sanction.*details',
-            r'emi.*due.*date',
-            r'loan.*due.*date',
-            r'when.*emi.*due',
-            r'when.*loan.*due'
-        ]
-        
-        # Check for status-specific keywords
-        has_status_keyword = any(keyword in message.lower() for keyword in loan_status_keywords)
-        
-        # Check for status-specific patterns
-        has_status_pattern = any(re.search(pattern, message.lower()) for pattern in status_patterns)
-        
-        # Only treat as loan status inquiry if:
-        # 1. Has specific status keywords OR status patterns
-        # 2. AND EITHER has loan ID/account number OR no loan ID/account number (to support user context)
-        is_status_inquiry = (has_status_keyword or has_status_pattern)
-        
-        if is_status_inquiry:
-            # If both loan ID and account number are provided
-            if loan_id_matches and account_matches:
-                loan_id = loan_id_matches[0]
-                account_number = account_matches[0]
-                loan_details = self.get_loan_sanction_details(loan_id, account_number)
-                if loan_details['found']:
-                    response = self.format_loan_response(loan_details)
-                else:
-                    response = f"❌ No loan found with Loan ID '{loan_id}' and Account Number '{account_number}'. Please verify both details and try again."
-            # If no loan ID/account number, try to get customer_id from session and fetch loans
-            elif not loan_id_matches and not account_matches and session_id:
-                # Here, session_id is assumed to be customer_id for simplicity
-                loans = self.get_loans_by_customer_id(session_id)
-                if loans:
-                    response = ""
-                    for loan in loans:
-                        response += self.format_loan_response(loan) + "\n\n"
-                else:
-                    response = "❌ No loans found for your account. Please verify your details or contact support."
-            # If partial info provided
-            elif loan_id_matches and not account_matches:
-                response = f"""
-❌ **Missing Account Number**
-
-You provided Loan ID: **{loan_id_matches[0]}**
-Please also provide your **Account Number**.
-                """
-            elif account_matches and not loan_id_matches:
-                response = f"""
-❌ **Missing Loan ID**
-
-You provided Account Number: **{account_matches[0]}**
-Please also provide your **Loan ID** .
-                """
-            else:
-                response = """
-❌ **Both Loan ID and Account Number Required**
-
-To check your loan details, please provide **both**:
-• Your **Loan ID**
-• Your **Account Number**
-                """
-        else:
-            # Handle FAQ using intent handler for all other queries
-            response = self.intent_handler.get_response(message, customer_name)
-        
-        # Save chat history
-        self.save_chat_history(message, response, session_id)
-        
-        return response
-
-# Initialize chatbot
-chatbot = ChatBot()
-
-@app.route('/api/chat', methods=['POST'])
-def chat():
-    try:
-        data = request.json
-        message = data.get('message', '').strip()
-        session_id = data.get('session_id')
-        customer_id = data.get('customer_id')  # New parameter for user context
-
-        if not message:
-            return jsonify({'error': 'Message is required'}), 400
-
-        # Use customer_id as session_id if provided, otherwise use session_id
-        # This allows the chatbot to fetch user-specific loan data
-        effective_session_id = customer_id or session_id
-
-        # Fetch customer name if customer_id is provided
-        customer_name = None
-        if customer_id:
-            customer_name = chatbot.get_customer_name(customer_id)
-
-        response = chatbot.process_message(message, effective_session_id, customer_name)
-
-        return jsonify({
-            'response': response,
-            'timestamp': datetime.now().isoformat()
-        })
-
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/welcome', methods=['GET'])
-def welcome():
-    """
-    API endpoint to get a personalized welcome message for signed-in user
-    """
-    try:
-        customer_id = request.args.get('customer_id')
-
-        if not customer_id:
-            return jsonify({'error': 'customer_id is required'}), 400
-
-        customer_name = chatbot.get_customer_name(customer_id)
-
-        if customer_name:
-            message = f"Welcome {customer_name}! I'm here to help you with your loan information and answer any questions you may have."
-        else:
-            message = "Welcome! I'm here to help you with your loan information and answer any questions you may have."
-
-        return jsonify({
-            'message': message,
-            'timestamp': datetime.now().isoformat()
-        })
-
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/loan-details/<loan_id>/<account_number>', methods=['GET'])
-def get_loan_details_api(loan_id, account_number):
-    """
-    API endpoint to get loan details by both loan_id and account_number
-    """
-    try:
-        loan_details = chatbot.get_loan_sanction_details(loan_id, account_number)
-        return jsonify(loan_details)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/loan-status/<loan_id>/<account_number>', methods=['GET'])
-def get_loan_status_api(loan_id, account_number):
-    """
-    Backward compatibility endpoint - now requires both parameters
-    """
-    try:
-        loan_status = chatbot.get_loan_status(loan_id, account_number)
-        return jsonify(loan_status)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/emi-details/<loan_id>/<account_number>', methods=['GET'])
-def get_emi_details_api(loan_id, account_number):
-    """
-    Specific endpoint for EMI details - requires both parameters
-    """
-    try:
-        loan_details = chatbot.get_loan_sanction_details(loan_id, account_number)
-        if loan_details['found']:
-            emi_details = {
-                'found': True,
-                'loan_id': loan_details['loan_id'],
-                'account_number': loan_details['loan_account_number'],
-                'emi_amount': loan_details['emi_amount'],
-                'emi_due_date': loan_details['emi_due_date'],
-                'number_of_emis': loan_details['number_of_emis'],
-                'emi_start_date': loan_details['emi_start_date'],
-                'emi_end_date': loan_details['emi_end_date']
-            }
-        else:
-            emi_details = {'found': False}
-        
-        return jsonify(emi_details)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
-
-@app.route('/api/db-test', methods=['GET'])
-def test_database_connection():
-    """
-    Test endpoint to verify database connection and table structure
-    """
-    try:
-        if not db_manager.connect():
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        # Test query to check if table exists and get sample data
-        test_query = """
-        SELECT 
-            loan_id, 
-            loan_account_number, 
-            amount_sanctioned, 
-            emi_amount, 
-            emi_due_date, 
-            number_of_emis 
-        FROM loancraft.lms_loan_saction 
-        LIMIT 5
-        """
-        
-        result = db_manager.execute_query(test_query)
-        
-        if result:
-            return jsonify({
-                'status': 'success',
-                'message': 'Database connection and table access successful',
-                'sample_data': [dict(row) for row in result]
-            })
-        else:
-            return jsonify({
-                'status': 'error',
-                'message': 'Could not fetch data from loancraft.lms_loan_saction table'
-            }), 500
-    
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-if __name__ == '__main__':
-    # Initialize database connection
-    if db_manager.connect():
-        print("Database connected successfully")
-        app.run(debug=True, host='0.0.0.0', port=5000)
-    else:
-        print("Failed to connect to database")
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+from flask_cors import CORS
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+import json
+from datetime import datetime
+import time
+import threading
+import itertools
+from intent_handler import IntentHandler 
+from llm_handler import LLMHandler, CircuitBreaker
+from answer_pipeline import LLM_FAILURE_MESSAGES
+from db_pool import ConnectionPool, PreparedStatementConnection, PoolTimeout
+from replicas import Replica, ReplicaSet, ReplicaMonitor, REPLICA_LAG_QUERY, replica_configs
+from chat_history_writer import ChatHistoryWriter
+from cache import TTLCache, MISSING
+from loan_record import LoanRecord
+from reply_templates import ReplyTemplates
+from metrics import REGISTRY, STAGE_SECONDS, PROMETHEUS_CONTENT_TYPE, record_request
+from http_caching import CompactJSONProvider, conditional_json, negotiate_encoding, apply_encoding
+from chat_core import (
+    current_config, ReplyRenderer, route, create_intent_watcher, create_answer_pipeline,
+    create_session_store, resolve_customer_id, customer_context_from_rows, status_lookup, LoanPage,
+    parse_loan_batch, loan_batch_params, split_cached_loans, store_loan_batch, assemble_loan_batch,
+    reply_format_error, emi_details_body, loan_record_dict, loan_etag, admin_authorized, LOAN_SANCTION_QUERY,
+    LOAN_SANCTION_BATCH_QUERY, CUSTOMER_CONTEXT_QUERY, CUSTOMER_LOANS_PAGE_QUERY, CUSTOMER_LOANS_QUERY,
+    LOOKUP_LOAN, LOOKUP_CUSTOMER_LOANS
+)
+
+if __name__ == '__main__' and current_config.SERVING_MODE == 'asgi':
+    # Hand over before any of the Flask app's pools and threads below are built
+    import uvicorn
+    uvicorn.run('asgi_app:app', host='0.0.0.0', port=5000)
+    raise SystemExit
+
+app = Flask(__name__)
+CORS(app,origins=['http://localhost:4200'])
+
+# jsonify through orjson when it is installed (see http_caching)
+if current_config.JSON_FAST_SERIALIZER:
+    app.json = CompactJSONProvider(app)
+
+# Initialize intent handler
+intent_handler = IntentHandler()
+
+# Edits to the intent files are picked up without a restart
+intent_watcher = create_intent_watcher(intent_handler)
+if current_config.INTENTS_RELOAD_INTERVAL > 0:
+    intent_watcher.start()
+
+# Reply copy lives in replies/ and is compiled once at startup
+reply_templates = ReplyTemplates(current_config.REPLY_TEMPLATES_DIR)
+renderer = ReplyRenderer(reply_templates)
+
+# LLM used for messages no intent covers
+llm_handler = LLMHandler()
+
+# FAQ answers: exact pattern, then the intent index, then the LLM
+answer_pipeline = create_answer_pipeline(intent_handler)
+
+# Per-conversation slots and recent turns, expired after SESSION_TIMEOUT of inactivity
+session_store = create_session_store()
+
+# Unique names for server-side cursors
+_cursor_ids = itertools.count(1)
+
+# Errors on a read replica that send the read to the primary instead
+REPLICA_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeout)
+
+class DatabaseManager:
+    def __init__(self, db_config=None, pool_config=None):
+        self.db_config = db_config or current_config.DB_CONFIG
+        self.pool_config = pool_config or current_config
+        self.pool = None
+        self.replicas = None  # ReplicaSet when DB_REPLICA_HOSTS is configured
+        self.replica_monitor = None
+        self._lock = threading.Lock()
+
+    def _create_pool(self, db_config):
+        return ConnectionPool(
+            dict(db_config, connection_factory=PreparedStatementConnection),
+            min_size=self.pool_config.DB_POOL_MIN_SIZE,
+            max_size=self.pool_config.DB_POOL_MAX_SIZE,
+            timeout=self.pool_config.DB_POOL_TIMEOUT,
+            healthcheck_interval=self.pool_config.DB_POOL_HEALTHCHECK_INTERVAL,
+            max_idle=self.pool_config.DB_POOL_MAX_IDLE
+        )
+
+    def _connect_replicas(self):
+        replicas = []
+        for replica_config in replica_configs(self.db_config, self.pool_config.DB_REPLICA_HOSTS):
+            name = f"{replica_config['host']}:{replica_config.get('port', 5432)}"
+            pool = self._create_pool(replica_config)
+            try:
+                pool.open()
+            except Exception as e:
+                # Not fatal: the replica stays out of rotation until a lag check reaches it
+                print(f"Read replica {name} connection error: {e}")
+            replicas.append(Replica(name, pool))
+        if not replicas:
+            return
+        self.replicas = ReplicaSet(replicas, self.pool_config.DB_REPLICA_MAX_LAG, busy=lambda pool: pool.busy())
+        self.replica_monitor = ReplicaMonitor(
+            self.replicas, self._replica_lag, interval=self.pool_config.DB_REPLICA_CHECK_INTERVAL
+        )
+        self.replica_monitor.start()
+
+    def _replica_lag(self, replica):
+        with replica.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(REPLICA_LAG_QUERY)
+                lag = cursor.fetchone()[0]
+            finally:
+                cursor.close()
+                connection.rollback()
+        return None if lag is None else float(lag)
+
+    def connect(self):
+        """Create the connection pools (idempotent) and warm up their minimum connections"""
+        with self._lock:
+            if self.pool is not None:
+                return True
+            try:
+                pool = self._create_pool(self.db_config)
+                pool.open()
+                self.pool = pool
+            except Exception as e:
+                print(f"Database connection error: {e}")
+                return False
+            self._connect_replicas()
+            return True
+    
+    def close(self):
+        with self._lock:
+            if self.replica_monitor is not None:
+                self.replica_monitor.stop()
+                self.replica_monitor = None
+            if self.replicas is not None:
+                for replica in self.replicas.replicas:
+                    replica.pool.closeall()
+                self.replicas = None
+            if self.pool:
+                self.pool.closeall()
+                self.pool = None
+
+    def _choose_replica(self):
+        replicas = self.replicas
+        return replicas.choose() if replicas is not None else None
+
+    def _replica_failed(self, replica, error):
+        if isinstance(error, PoolTimeout):
+            # Every connection to this replica is busy: read from the primary, keep the replica in rotation
+            self.replicas.record_fallback()
+        else:
+            self.replicas.fail_over(replica, error)
+    
+    def execute_query(self, query, params=None):
+        """
+        Run any statement on the primary; rows (RealDictRow) if it returns a
+        result set, otherwise the affected row count. None on error.
+        """
+        if self.pool is None and not self.connect():
+            return None
+        try:
+            # Each call checks out its own connection, so a rollback here can
+            # never touch another request's transaction
+            with STAGE_SECONDS.time('db'), self.pool.connection() as connection:
+                cursor = connection.cursor(cursor_factory=RealDictCursor)
+                try:
+                    cursor.execute(query, params)
+                    result = cursor.fetchall() if cursor.description is not None else cursor.rowcount
+                    connection.commit()
+                except Exception:
+                    if not connection.closed:
+                        connection.rollback()
+                    raise
+                finally:
+                    cursor.close()
+            return result
+        except Exception as e:
+            print(f"Query execution error: {e}")
+            return None
+
+    def execute_write(self, query, params=None):
+        """Run an INSERT/UPDATE/DELETE on the primary and commit; affected row count, None on error"""
+        if self.pool is None and not self.connect():
+            return None
+        try:
+            with STAGE_SECONDS.time('db'), self.pool.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(query, params)
+                    connection.commit()
+                    result = cursor.rowcount
+                except Exception:
+                    if not connection.closed:
+                        connection.rollback()
+                    raise
+                finally:
+                    cursor.close()
+            return result
+        except Exception as e:
+            print(f"Query execution error: {e}")
+            return None
+
+    def _fetch_prepared(self, pool, query, params, timeout=None):
+        with STAGE_SECONDS.time('db'), pool.connection(timeout) as connection:
+            cursor = connection.cursor()
+            try:
+                connection.execute_prepared(cursor, query, params)
+                return cursor.fetchall()
+            except Exception:
+                if not connection.closed:
+                    connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def execute_prepared(self, query, params=()):
+        """
+        Run a SELECT on the primary as a per-connection prepared statement and
+        return plain tuples (None on error); query uses %s placeholders like
+        execute_query
+        """
+        if self.pool is None and not self.connect():
+            return None
+        try:
+            return self._fetch_prepared(self.pool, query, params)
+        except Exception as e:
+            print(f"Query execution error: {e}")
+            return None
+
+    def execute_read(self, query, params=()):
+        """
+        execute_prepared for lookups that can be up to DB_REPLICA_MAX_LAG
+        seconds stale: runs on the least busy in-sync read replica, and on the
+        primary when there is none or the replica cannot be reached
+        """
+        if self.pool is None and not self.connect():
+            return None
+        replica = self._choose_replica()
+        if replica is not None:
+            try:
+                # timeout=0: a replica with no free connection sends the read to the primary instead of queueing
+                return self._fetch_prepared(replica.pool, query, params, timeout=0)
+            except REPLICA_ERRORS as e:
+                self._replica_failed(replica, e)
+            except Exception as e:
+                print(f"Query execution error: {e}")
+                return None
+        return self.execute_prepared(query, params)
+
+    def _stream(self, pool, query, params, itersize, timeout=None):
+        with pool.connection(timeout) as connection:
+            cursor = connection.cursor(name=f"stream_{next(_cursor_ids)}")
+            cursor.itersize = itersize or self.pool_config.DB_CURSOR_ITERSIZE
+            try:
+                with STAGE_SECONDS.time('db'):
+                    cursor.execute(query, params)
+                yield from cursor
+            finally:
+                cursor.close()
+                if not connection.closed:
+                    connection.rollback()
+
+    def iter_query(self, query, params=None, itersize=None):
+        """
+        Yield the rows of a SELECT on the primary as tuples through a
+        server-side (named) cursor, fetching itersize rows per round trip so
+        memory stays bounded. Errors are logged and re-raised, so a failed
+        stream is never mistaken for a short result.
+        """
+        if self.pool is None and not self.connect():
+            raise ConnectionError("Database is not connected")
+        try:
+            yield from self._stream(self.pool, query, params, itersize)
+        except Exception as e:
+            print(f"Query execution error: {e}")
+            raise
+
+    def iter_read(self, query, params=None, itersize=None):
+        """
+        iter_query on a read replica chosen like execute_read. Falls back to
+        the primary only if the replica fails before the first row; once rows
+        have been yielded the stream cannot be restarted elsewhere, so a
+        later error is re-raised like iter_query's.
+        """
+        if self.pool is None and not self.connect():
+            raise ConnectionError("Database is not connected")
+        replica = self._choose_replica()
+        if replica is None:
+            yield from self.iter_query(query, params, itersize)
+            return
+        rows = self._stream(replica.pool, query, params, itersize, timeout=0)
+        try:
+            try:
+                first = next(rows)
+            except StopIteration:
+                return
+            except REPLICA_ERRORS as e:
+                self._replica_failed(replica, e)
+            else:
+                yield first
+                yield from rows
+                return
+        except Exception as e:
+            print(f"Query execution error: {e}")
+            raise
+        finally:
+            rows.close()
+        yield from self.iter_query(query, params, itersize)
+
+    def execute_values(self, query, rows, page_size=100):
+        """
+        Run a multi-row INSERT ... VALUES %s for all rows in one transaction
+        on the primary
+        """
+        if self.pool is None and not self.connect():
+            return None
+        try:
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    execute_values(cursor, query, rows, page_size=page_size)
+                    connection.commit()
+                    result = len(rows)
+                except Exception:
+                    if not connection.closed:
+                        connection.rollback()
+                    raise
+                finally:
+                    cursor.close()
+            return result
+        except Exception as e:
+            print(f"Batch execution error: {e}")
+            return None
+
+    def get_pool_stats(self):
+        if not self.pool:
+            return {}
+        stats = self.pool.get_stats()
+        if self.replicas is not None:
+            stats['replicas'] = self.replicas.get_stats()
+        return stats
+
+db_manager = DatabaseManager()
+
+# chat_history rows are written behind the response by a background worker
+chat_history_writer = ChatHistoryWriter(
+    db_manager,
+    max_queue_size=current_config.CHAT_HISTORY_QUEUE_SIZE,
+    batch_size=current_config.CHAT_HISTORY_BATCH_SIZE,
+    flush_interval=current_config.CHAT_HISTORY_FLUSH_INTERVAL,
+    enqueue_timeout=current_config.CHAT_HISTORY_ENQUEUE_TIMEOUT
+)
+
+class ChatBot:
+    def __init__(self):
+        self.intent_handler = intent_handler
+        self.llm_handler = llm_handler
+        self.answer_pipeline = answer_pipeline
+        self.sessions = session_store
+        self.renderer = renderer
+        # Sanction data changes rarely; "not found" answers expire sooner so new loans show up quickly
+        self.loan_cache = TTLCache(
+            maxsize=current_config.LOAN_CACHE_MAXSIZE,
+            ttl=current_config.LOAN_CACHE_TTL,
+            negative_ttl=current_config.LOAN_CACHE_NEGATIVE_TTL
+        )
+        # Name + loan list per signed-in customer, loaded by one query and
+        # reused by /api/welcome and every chat message of the session
+        self.customer_context_cache = TTLCache(
+            maxsize=current_config.CUSTOMER_CONTEXT_CACHE_SIZE,
+            ttl=current_config.CUSTOMER_CONTEXT_TTL
+        )
+        # Last loan_id and count shown per customer, for "more loans"
+        self.loan_page_positions = TTLCache(
+            maxsize=current_config.CUSTOMER_CONTEXT_CACHE_SIZE,
+            ttl=current_config.SESSION_TIMEOUT
+        )
+    
+    def get_loan_record(self, loan_id, account_number):
+        """
+        The LoanRecord for loan_id AND loan_account_number, None if there is no
+        such loan, or MISSING if the query failed
+        """
+        cache_key = (str(loan_id), str(account_number))
+        record = self.loan_cache.get(cache_key)
+        if record is MISSING:
+            result = db_manager.execute_read(LOAN_SANCTION_QUERY, (loan_id, account_number))
+            if result is None:
+                # Never cache a failed query
+                return MISSING
+            record = LoanRecord(result[0]) if result else None
+            self.loan_cache.set(cache_key, record, negative=record is None)
+        return record
+
+    def get_loan_sanction_details(self, loan_id, account_number):
+        """
+        Fetch loan sanction details using both loan_id AND loan_account_number
+        """
+        return loan_record_dict(self.get_loan_record(loan_id, account_number))
+
+    def get_loan_sanction_details_batch(self, pairs):
+        """
+        Fetch loan sanction details for many (loan_id, account_number) pairs with
+        one query; results come back in request order with a per-item found flag
+        """
+        keys = [(str(loan_id), str(account_number)) for loan_id, account_number in pairs]
+        found, missing = split_cached_loans(self.loan_cache, keys)
+        if missing:
+            result = db_manager.execute_read(LOAN_SANCTION_BATCH_QUERY, loan_batch_params(missing))
+            store_loan_batch(self.loan_cache, missing, result, found)
+        return assemble_loan_batch(keys, found)
+
+    def get_customer_context(self, customer_id, decrypted_customer_id=None):
+        """
+        Load a signed-in customer's name and loans with one query, cached per decrypted customer id
+
+        Returns:
+            CustomerContext, or None if the token is invalid or the query failed
+        """
+        if decrypted_customer_id is None:
+            decrypted_customer_id = resolve_customer_id(customer_id)
+            if decrypted_customer_id is None:
+                return None
+
+        context = self.customer_context_cache.get(decrypted_customer_id)
+        if context is not MISSING:
+            return context
+
+        result = db_manager.execute_read(
+            CUSTOMER_CONTEXT_QUERY, (decrypted_customer_id, decrypted_customer_id, current_config.LOAN_PAGE_SIZE)
+        )
+        if result is None:
+            return None
+        context = customer_context_from_rows(result)
+        self.customer_context_cache.set(decrypted_customer_id, context)
+        return context
+
+    def get_loan_page(self, customer_id, decrypted_customer_id=None, next_page=False):
+        """
+        Page of a customer's loans for the status summary
+
+        The first page comes with the cached customer context; with next_page
+        the page after the last loan shown to this customer is read by keyset
+        (loan_id > last shown), so each page costs one bounded query.
+
+        Returns:
+            LoanPage, or None if the token is invalid or a query failed
+        """
+        if decrypted_customer_id is None:
+            decrypted_customer_id = resolve_customer_id(customer_id)
+            if decrypted_customer_id is None:
+                return None
+        context = self.get_customer_context(customer_id, decrypted_customer_id)
+        if context is None:
+            return None
+
+        paged = next_page and context.loan_count > 1
+        position = self.loan_page_positions.get(decrypted_customer_id) if paged else MISSING
+        if position is MISSING:
+            page = LoanPage(context.loans, 0, context.loan_count)
+        else:
+            last_loan_id, offset = position
+            result = db_manager.execute_read(
+                CUSTOMER_LOANS_PAGE_QUERY, (decrypted_customer_id, last_loan_id, current_config.LOAN_PAGE_SIZE)
+            )
+            if result is None:
+                return None
+            loans = tuple(LoanRecord(row, with_reference=True) for row in result)
+            page = LoanPage(loans, offset, max(context.loan_count, offset + len(loans)))
+
+        if page.loans:
+            self.loan_page_positions.set(decrypted_customer_id, (page.loans[-1].loan_id, page.offset + len(page.loans)))
+        else:
+            # Past the last page: the next request starts over
+            self.loan_page_positions.invalidate(decrypted_customer_id)
+        return page
+
+    def iter_loans_by_customer_id(self, customer_id, decrypted_customer_id=None):
+        """
+        Yield every loan of a customer as a LoanRecord, streamed from a
+        server-side cursor so memory does not grow with the number of loans;
+        a database error part way through is raised, not a truncated list
+        """
+        if decrypted_customer_id is None:
+            decrypted_customer_id = resolve_customer_id(customer_id)
+            if decrypted_customer_id is None:
+                return
+        for row in db_manager.iter_read(CUSTOMER_LOANS_QUERY, (decrypted_customer_id,)):
+            yield LoanRecord(row, with_reference=True)
+
+    def get_loans_by_customer_id(self, customer_id, decrypted_customer_id=None):
+        """
+        Fetch all loan details for a customer using customer_id
+
+        Pass decrypted_customer_id when the caller already decrypted the token for this request.
+        Returns None on a database error, like execute_read.
+        """
+        try:
+            return [loan.to_dict() for loan in self.iter_loans_by_customer_id(customer_id, decrypted_customer_id)]
+        except Exception:
+            # Already logged by iter_read
+            return None
+
+    def invalidate_loan(self, loan_id, account_number):
+        """
+        Drop a cached sanction lookup after the loan changes, along with any
+        customer loan lists that include it
+        """
+        self.loan_cache.invalidate((str(loan_id), str(account_number)))
+        self.customer_context_cache.invalidate_where(
+            lambda customer_id, context: any(str(loan.loan_id) == str(loan_id) for loan in context.loans)
+        )
+
+    def invalidate_customer_loans(self, customer_id):
+        """
+        Drop the cached name and loan list for an encrypted customer_id
+        """
+        decrypted_customer_id = resolve_customer_id(customer_id)
+        if decrypted_customer_id is not None:
+            self.customer_context_cache.invalidate(decrypted_customer_id)
+            self.loan_page_positions.invalidate(decrypted_customer_id)
+
+    def get_cache_stats(self):
+        return {
+            'loan_sanction': self.loan_cache.get_stats(),
+            'customer_context': self.customer_context_cache.get_stats()
+        }
+
+    def get_customer_name(self, customer_id, decrypted_customer_id=None):
+        """
+        Fetch customer name using customer_id
+        """
+        context = self.get_customer_context(customer_id, decrypted_customer_id)
+        return context.name if context is not None else None
+    
+    def get_loan_status(self, loan_id, account_number):
+        """
+        Get loan status information - wrapper for backward compatibility
+        """
+        return self.get_loan_sanction_details(loan_id, account_number)
+    
+    def save_chat_history(self, user_message, bot_response, session_id=None):
+        """
+        Queue the exchange for the background chat_history writer
+        """
+        chat_history_writer.submit(user_message, bot_response, session_id)
+    
+    def format_loan_response(self, loan_data, fmt='markdown'):
+        """
+        Format loan data into a user-friendly response (see replies/loan_details.*)
+        """
+        return self.renderer.format_loan_response(loan_data, fmt)
+
+    def build_status_response(self, routing, session_id=None, decrypted_customer_id=None):
+        """
+        Answer a loan status inquiry from the loan IDs/account numbers found by route_message
+        """
+        return ''.join(self.iter_status_response(routing, session_id, decrypted_customer_id))
+
+    def iter_status_response(self, routing, session_id=None, decrypted_customer_id=None):
+        """
+        Run the lookup a status inquiry needs and yield the reply in pieces
+        """
+        loan_details = None
+        page = None
+        lookup = status_lookup(routing, session_id)
+        if lookup == LOOKUP_LOAN:
+            loan_details = self.get_loan_sanction_details(routing.loan_ids[0], routing.account_numbers[0])
+        elif lookup == LOOKUP_CUSTOMER_LOANS:
+            page = self.get_loan_page(session_id, decrypted_customer_id, next_page=routing.next_page)
+        return self.renderer.iter_rendered_status(routing, lookup, loan_details, page)
+
+    def route(self, message, session=None):
+        """Route message, completing it with ids held by the session (see chat_core.route)"""
+        return route(message, session)
+
+    def finish_turn(self, message, response, routing, session_id=None, session=None):
+        """Store the session's updated slots and turns, and queue the chat history row"""
+        if session is not None:
+            self.sessions.record(session_id, session, routing, message, response)
+        self.save_chat_history(message, response, session_id)
+
+    def process_message(self, message, session_id=None, customer_name=None, decrypted_customer_id=None):
+        session = self.sessions.get(session_id) if session_id else None
+        routing = self.route(message, session)
+        
+        if routing.is_status_inquiry:
+            response = self.build_status_response(routing, session_id, decrypted_customer_id)
+        else:
+            # Everything else is answered by the cheapest confident tier
+            response, tier = self.answer_pipeline.answer(message, self.llm_handler)
+        
+        self.finish_turn(message, response, routing, session_id, session)
+        return response
+
+    def stream_message(self, message, session_id=None, customer_name=None, decrypted_customer_id=None):
+        """
+        Generator version of process_message yielding the reply in chunks
+
+        Multi-loan summaries are yielded line by line and FAQ answers as a
+        single chunk; messages no intent matches are streamed token by token
+        from the LLM when it is available.
+        """
+        session = self.sessions.get(session_id) if session_id else None
+        routing = self.route(message, session)
+
+        chunks = []
+        for chunk in self.iter_reply(message, routing, session_id, decrypted_customer_id):
+            chunks.append(chunk)
+            yield chunk
+        self.finish_turn(message, ''.join(chunks), routing, session_id, session)
+
+    def iter_reply(self, message, routing, session_id=None, decrypted_customer_id=None):
+        if routing.is_status_inquiry:
+            yield from self.iter_status_response(routing, session_id, decrypted_customer_id)
+            return
+
+        started = time.monotonic()
+        timings = {}
+        tier, intent = self.answer_pipeline.match(message, timings)
+        first = None
+        if tier is None:
+            # Same budget as answer(); a failure reported before any real token falls back like answer() does
+            deadline = self.answer_pipeline.llm_deadline(started, self.llm_handler.is_available())
+            if deadline is not None:
+                llm_started = time.monotonic()
+                chunks = self.llm_handler.stream_response(message, deadline=deadline)
+                try:
+                    first = next(chunks, None)
+                    if first is not None and first not in LLM_FAILURE_MESSAGES:
+                        yield first
+                        yield from chunks
+                        timings['llm'] = time.monotonic() - llm_started
+                        self.answer_pipeline.record('llm', timings)
+                        return
+                finally:
+                    chunks.close()
+                timings['llm'] = time.monotonic() - llm_started
+        response, tier = self.answer_pipeline.resolve(tier, intent, first, timings)
+        yield response
+
+# Initialize chatbot
+chatbot = ChatBot()
+
+def _pool_connections():
+    stats = db_manager.get_pool_stats()
+    return {('idle',): stats.get('idle'), ('in_use',): stats.get('in_use')}
+
+# Gauges are read when /api/metrics is scraped, never on the request path
+REGISTRY.gauge('db_pool_connections', 'Database pool connections by state', _pool_connections, labels=('state',))
+REGISTRY.gauge('db_replica_lag_seconds', 'Last measured lag per read replica',
+               lambda: {(replica['name'],): replica['lag']
+                        for replica in db_manager.get_pool_stats().get('replicas', {}).get('replicas', ())},
+               labels=('replica',))
+REGISTRY.gauge('llm_inflight_requests', 'Generations currently sent to Ollama',
+               lambda: llm_handler.admission.get_stats()['inflight'])
+REGISTRY.gauge('llm_queued_requests', 'Callers waiting for an LLM slot',
+               lambda: llm_handler.admission.get_stats()['queue_depth'])
+REGISTRY.gauge('llm_circuit_open', '1 while the LLM circuit breaker is open',
+               lambda: int(llm_handler.breaker.state == CircuitBreaker.OPEN))
+REGISTRY.gauge('chat_history_queued_rows', 'chat_history rows waiting to be inserted',
+               lambda: chat_history_writer.get_stats()['queued'])
+REGISTRY.gauge('sessions_active', 'Chat sessions held in the session store',
+               lambda: session_store.get_stats().get('sessions'))
+REGISTRY.gauge('cache_entries', 'Entries per in-process cache', lambda: {
+    ('loan_sanction',): len(chatbot.loan_cache),
+    ('customer_context',): len(chatbot.customer_context_cache),
+}, labels=('cache',))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        record_request(route, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+@app.after_request
+def compress_response(response):
+    encoding = negotiate_encoding(response, request.accept_encodings, current_config.COMPRESS_MIN_SIZE)
+    if encoding:
+        apply_encoding(response, response.get_data(), encoding)
+    return response
+
+def loan_response(record, variant, build_body):
+    """
+    jsonify(build_body()) with an ETag and Cache-Control, or 304 Not Modified
+    when If-None-Match already holds the ETag (the body is then never built)
+    """
+    etag = loan_etag(record, variant)
+    if etag is None:
+        return jsonify(build_body())
+    return conditional_json(
+        request.if_none_match, etag, current_config.LOAN_HTTP_CACHE_CONTROL, build_body, jsonify, Response
+    )
+
+@app.route('/api/chat', methods=['POST'])
+def chat():
+    try:
+        data = request.json
+        message = data.get('message', '').strip()
+        session_id = data.get('session_id')
+        customer_id = data.get('customer_id')  # New parameter for user context
+
+        if not message:
+            return jsonify({'error': 'Message is required'}), 400
+
+        # Use customer_id as session_id if provided, otherwise use session_id
+        # This allows the chatbot to fetch user-specific loan data
+        effective_session_id = customer_id or session_id
+
+        # Fetch customer name if customer_id is provided; the token is decrypted
+        # once here and reused by every lookup in this request
+        customer_name = None
+        decrypted_customer_id = None
+        if customer_id:
+            decrypted_customer_id = resolve_customer_id(customer_id)
+            if decrypted_customer_id is not None:
+                customer_name = chatbot.get_customer_name(customer_id, decrypted_customer_id)
+
+        response = chatbot.process_message(message, effective_session_id, customer_name, decrypted_customer_id)
+
+        return jsonify({
+            'response': response,
+            'timestamp': datetime.now().isoformat()
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _sse_event(event, data):
+    """Encode one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming variant of /api/chat: the reply is sent as Server-Sent Events
+    (`token` events carrying text, then a final `done` event)
+    """
+    try:
+        data = request.json
+        message = data.get('message', '').strip()
+        session_id = data.get('session_id')
+        customer_id = data.get('customer_id')
+
+        if not message:
+            return jsonify({'error': 'Message is required'}), 400
+
+        effective_session_id = customer_id or session_id
+
+        customer_name = None
+        decrypted_customer_id = None
+        if customer_id:
+            decrypted_customer_id = resolve_customer_id(customer_id)
+            if decrypted_customer_id is not None:
+                customer_name = chatbot.get_customer_name(customer_id, decrypted_customer_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    def generate():
+        try:
+            for chunk in chatbot.stream_message(message, effective_session_id, customer_name, decrypted_customer_id):
+                yield _sse_event('token', {'text': chunk})
+            yield _sse_event('done', {'timestamp': datetime.now().isoformat()})
+        except Exception as e:
+            yield _sse_event('error', {'error': str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/welcome', methods=['GET'])
+def welcome():
+    """
+    API endpoint to get a personalized welcome message for signed-in user
+    """
+    try:
+        customer_id = request.args.get('customer_id')
+
+        if not customer_id:
+            return jsonify({'error': 'customer_id is required'}), 400
+
+        customer_name = chatbot.get_customer_name(customer_id)
+
+        if customer_name:
+            message = f"Welcome {customer_name}! I'm here to help you with your loan information and answer any questions you may have."
+        else:
+            message = "Welcome! I'm here to help you with your loan information and answer any questions you may have."
+
+        return jsonify({
+            'message': message,
+            'timestamp': datetime.now().isoformat()
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/loan-details/<loan_id>/<account_number>', methods=['GET'])
+def get_loan_details_api(loan_id, account_number):
+    """
+    API endpoint to get loan details by both loan_id and account_number.
+    With ?format=markdown|text|json the loan is returned rendered as a reply.
+    """
+    try:
+        fmt = request.args.get('format')
+        error = reply_format_error(fmt) if fmt is not None else None
+        if error:
+            return jsonify({'error': error}), 400
+        record = chatbot.get_loan_record(loan_id, account_number)
+        if fmt is None:
+            return loan_response(record, 'details', lambda: loan_record_dict(record))
+        return loan_response(record, renderer.rendered_variant(fmt), lambda: renderer.loan_details_reply(loan_record_dict(record), fmt)[0])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/loan-details/batch', methods=['POST'])
+def get_loan_details_batch_api():
+    """
+    Bulk variant of /api/loan-details for dashboards: resolves every
+    requested (loan_id, account_number) pair with a single query
+    """
+    try:
+        pairs, error = parse_loan_batch(request.get_json(silent=True), current_config.LOAN_BATCH_MAX_SIZE)
+        if error:
+            return jsonify({'error': error}), 400
+        return jsonify({'results': chatbot.get_loan_sanction_details_batch(pairs)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/loan-status/<loan_id>/<account_number>', methods=['GET'])
+def get_loan_status_api(loan_id, account_number):
+    """
+    Backward compatibility endpoint - now requires both parameters
+    """
+    try:
+        record = chatbot.get_loan_record(loan_id, account_number)
+        return loan_response(record, 'status', lambda: loan_record_dict(record))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/emi-details/<loan_id>/<account_number>', methods=['GET'])
+def get_emi_details_api(loan_id, account_number):
+    """
+    Specific endpoint for EMI details - requires both parameters
+    """
+    try:
+        record = chatbot.get_loan_record(loan_id, account_number)
+        return loan_response(record, 'emi', lambda: emi_details_body(loan_record_dict(record)))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/health', methods=['GET'])
+def health_check():
+    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_api():
+    """Stage latencies, request counts and pool gauges in the Prometheus text format"""
+    return Response(REGISTRY.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+def reload_catalogues():
+    """Recompile the intent catalogue and the reply templates from disk"""
+    return {'intents': intent_handler.reload(), 'reply_templates': reply_templates.reload()}
+
+@app.route('/api/admin/reload', methods=['POST'])
+def reload_catalogues_api():
+    """
+    Reload intents and reply templates after editing their files. Files that
+    fail to load are logged and the previous version stays active.
+    """
+    if not admin_authorized(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        return jsonify({'status': 'reloaded', **reload_catalogues()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/stats', methods=['GET'])
+def stats_api():
+    """Answer tier hit shares and latencies, cache, pool and LLM counters"""
+    if not admin_authorized(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({
+        'answer_pipeline': answer_pipeline.get_stats(),
+        'caches': chatbot.get_cache_stats(),
+        'db_pool': db_manager.get_pool_stats(),
+        'llm': llm_handler.get_stats(),
+        'sessions': session_store.get_stats(),
+    })
+
+@app.route('/api/db-test', methods=['GET'])
+def test_database_connection():
+    """
+    Test endpoint to verify database connection and table structure
+    """
+    try:
+        if not db_manager.connect():
+            return jsonify({'error': 'Database connection failed'}), 500
+        
+        # Test query to check if table exists and get sample data
+        test_query = """
+        SELECT 
+            loan_id, 
+            loan_account_number, 
+            amount_sanctioned, 
+            emi_amount, 
+            emi_due_date, 
+            number_of_emis 
+        FROM loancraft.lms_loan_saction 
+        LIMIT 5
+        """
+        
+        result = db_manager.execute_query(test_query)
+        
+        if result:
+            return jsonify({
+                'status': 'success',
+                'message': 'Database connection and table access successful',
+                'sample_data': [dict(row) for row in result]
+            })
+        else:
+            return jsonify({
+                'status': 'error',
+                'message': 'Could not fetch data from loancraft.lms_loan_saction table'
+            }), 500
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+if __name__ == '__main__':
+    # Initialize database connection
+    if db_manager.connect():
+        print("Database connected successfully")
+        chat_history_writer.start()
+        try:
+            app.run(debug=True, host='0.0.0.0', port=5000)
+        finally:
+            chat_history_writer.stop()
+            db_manager.close()
+    else:
+        print("Failed to connect to database")
@@ -0,0 +1,1102 @@
+"""
+Async (ASGI) serving mode
+
+Exposes the same /api/* routes as app.py, but Postgres queries go through a
+psycopg 3 async connection pool and Ollama calls through an httpx.AsyncClient,
+so a request waiting on I/O holds a coroutine instead of a thread.
+
+Select it with SERVING_MODE=asgi (python app.py), or run it directly:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+"""
+import json
+import time
+import asyncio
+import logging
+import itertools
+from datetime import datetime
+
+import httpx
+import psycopg
+from psycopg.rows import dict_row, tuple_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from quart import Quart, request, jsonify, Response, g
+from quart_cors import cors
+
+from chat_core import (
+    current_config, ReplyRenderer, route, create_intent_watcher, create_answer_pipeline,
+    create_session_store, resolve_customer_id, customer_context_from_rows, status_lookup, LoanPage,
+    parse_loan_batch, loan_batch_params, split_cached_loans, store_loan_batch, assemble_loan_batch,
+    reply_format_error, emi_details_body, loan_record_dict, loan_etag, admin_authorized, LOAN_SANCTION_QUERY,
+    LOAN_SANCTION_BATCH_QUERY, CUSTOMER_CONTEXT_QUERY, CUSTOMER_LOANS_PAGE_QUERY, CUSTOMER_LOANS_QUERY,
+    LOOKUP_LOAN, LOOKUP_CUSTOMER_LOANS
+)
+from intent_handler import IntentHandler
+from reply_templates import ReplyTemplates
+from cache import TTLCache, MISSING
+from loan_record import LoanRecord
+from llm_cache import LLMResponseCache, normalize_prompt
+from answer_pipeline import LLM_FAILURE_MESSAGES
+from llm_handler import UNAVAILABLE_MESSAGE, ERROR_MESSAGE, EMPTY_MESSAGE, OVERLOADED_MESSAGE
+from llm_admission import (
+    AsyncAdmissionController, AsyncSingleFlight, AsyncCallGuard, AdmissionRejected, BreakerOpen, CircuitBreaker
+)
+from metrics import REGISTRY, STAGE_SECONDS, PROMETHEUS_CONTENT_TYPE, record_request
+from http_caching import CompactJSONProvider, conditional_json, negotiate_encoding, apply_encoding
+from replicas import Replica, ReplicaSet, REPLICA_LAG_QUERY, replica_configs
+
+logger = logging.getLogger(__name__)
+
+app = Quart(__name__)
+app = cors(app, allow_origin=['http://localhost:4200'])
+if current_config.JSON_FAST_SERIALIZER:
+    app.json = CompactJSONProvider(app)
+
+# Unique names for server-side cursors
+_cursor_ids = itertools.count(1)
+
+# Errors on a read replica that send the read to the primary instead
+REPLICA_ERRORS = (psycopg.OperationalError, psycopg.InterfaceError, PoolTimeout)
+
+
+def _async_pool_busy(pool):
+    """Connections handed out plus requests waiting for one"""
+    stats = pool.get_stats()
+    return stats.get('pool_size', 0) - stats.get('pool_available', 0) + stats.get('requests_waiting', 0)
+
+INSERT_CHAT_HISTORY_ROW = """
+INSERT INTO chat_history (user_message, bot_response, session_id)
+VALUES (%s, %s, %s)
+"""
+
+
+class AsyncDatabaseManager:
+    def __init__(self, db_config=None, pool_config=None):
+        self.db_config = db_config or current_config.DB_CONFIG
+        self.pool_config = pool_config or current_config
+        self.pool = None
+        self.replicas = None  # ReplicaSet when DB_REPLICA_HOSTS is configured
+        self._replica_monitor = None
+
+    def _create_pool(self, db_config):
+        # DB_CONFIG uses psycopg2's 'database' alias, which psycopg 3 rejects
+        connect_kwargs = dict(db_config, row_factory=dict_row)
+        if 'database' in connect_kwargs:
+            connect_kwargs['dbname'] = connect_kwargs.pop('database')
+        return AsyncConnectionPool(
+            kwargs=connect_kwargs,
+            min_size=self.pool_config.DB_POOL_MIN_SIZE,
+            max_size=self.pool_config.DB_POOL_MAX_SIZE,
+            timeout=self.pool_config.DB_POOL_TIMEOUT,
+            max_idle=self.pool_config.DB_POOL_MAX_IDLE,
+            check=AsyncConnectionPool.check_connection,
+            open=False
+        )
+
+    async def connect(self):
+        """Open the async connection pools (idempotent)"""
+        if self.pool is not None:
+            return True
+        try:
+            pool = self._create_pool(self.db_config)
+            await pool.open(wait=True, timeout=self.pool_config.DB_POOL_TIMEOUT)
+            self.pool = pool
+        except Exception as e:
+            print(f"Database connection error: {e}")
+            return False
+        await self._connect_replicas()
+        return True
+
+    async def _connect_replicas(self):
+        replicas = []
+        for replica_config in replica_configs(self.db_config, self.pool_config.DB_REPLICA_HOSTS):
+            name = f"{replica_config['host']}:{replica_config.get('port', 5432)}"
+            pool = self._create_pool(replica_config)
+            try:
+                await pool.open(wait=True, timeout=self.pool_config.DB_POOL_TIMEOUT)
+            except Exception as e:
+                # Not fatal: the pool keeps reconnecting and a lag check puts the replica in rotation
+                print(f"Read replica {name} connection error: {e}")
+            replicas.append(Replica(name, pool))
+        if not replicas:
+            return
+        self.replicas = ReplicaSet(replicas, self.pool_config.DB_REPLICA_MAX_LAG, busy=_async_pool_busy)
+        await self._check_replicas()
+        self._replica_monitor = asyncio.create_task(self._monitor_replicas())
+
+    async def _replica_lag(self, replica):
+        async with replica.pool.connection() as connection:
+            async with connection.cursor(row_factory=tuple_row) as cursor:
+                await cursor.execute(REPLICA_LAG_QUERY)
+                lag = (await cursor.fetchone())[0]
+        return None if lag is None else float(lag)
+
+    async def _check_replicas(self):
+        for replica in self.replicas.replicas:
+            try:
+                self.replicas.record_lag(replica, await self._replica_lag(replica))
+            except Exception as e:
+                self.replicas.mark_failed(replica, e)
+
+    async def _monitor_replicas(self):
+        while True:
+            await asyncio.sleep(self.pool_config.DB_REPLICA_CHECK_INTERVAL)
+            await self._check_replicas()
+
+    async def close(self):
+        if self._replica_monitor is not None:
+            self._replica_monitor.cancel()
+            try:
+                await self._replica_monitor
+            except asyncio.CancelledError:
+                pass
+            self._replica_monitor = None
+        if self.replicas is not None:
+            for replica in self.replicas.replicas:
+                await replica.pool.close()
+            self.replicas = None
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def _choose_replica(self):
+        replicas = self.replicas
+        return replicas.choose() if replicas is not None else None
+
+    def _replica_failed(self, replica, error):
+        if isinstance(error, PoolTimeout):
+            # Every connection to this replica is busy: read from the primary, keep the replica in rotation
+            self.replicas.record_fallback()
+        else:
+            self.replicas.fail_over(replica, error)
+
+    async def fetch(self, query, params=None):
+        """Run a SELECT on the primary and return its rows as dicts, or None on error"""
+        if self.pool is None and not await self.connect():
+            return None
+        try:
+            async with self.pool.connection() as connection:
+                with STAGE_SECONDS.time('db'):
+                    cursor = await connection.execute(query, params)
+                return await cursor.fetchall()
+        except Exception as e:
+            print(f"Query execution error: {e}")
+            return None
+
+    async def _fetch_prepared(self, pool, query, params, timeout=None):
+        async with pool.connection(timeout) as connection:
+            cursor = connection.cursor(row_factory=tuple_row)
+            with STAGE_SECONDS.time('db'):
+                await cursor.execute(query, params, prepare=True)
+                return await cursor.fetchall()
+
+    async def fetch_prepared(self, query, params=None):
+        """
+        Run a SELECT on the primary as a server-side prepared statement
+        (psycopg caches it per connection) and return plain tuples, or None on
+        error
+        """
+        if self.pool is None and not await self.connect():
+            return None
+        try:
+            return await self._fetch_prepared(self.pool, query, params)
+        except Exception as e:
+            print(f"Query execution error: {e}")
+            return None
+
+    async def fetch_read(self, query, params=None):
+        """
+        fetch_prepared for lookups that can be up to DB_REPLICA_MAX_LAG seconds
+        stale: runs on the least busy in-sync read replica, and on the primary
+        when there is none or the replica cannot be reached
+        """
+        if self.pool is None and not await self.connect():
+            return None
+        replica = self._choose_replica()
+        if replica is not None:
+            try:
+                # timeout=0: a replica with no free connection sends the read to the primary instead of queueing
+                return await self._fetch_prepared(replica.pool, query, params, timeout=0)
+            except REPLICA_ERRORS as e:
+                self._replica_failed(replica, e)
+            except Exception as e:
+                print(f"Query execution error: {e}")
+                return None
+        return await self.fetch_prepared(query, params)
+
+    async def _stream(self, pool, query, params, itersize, timeout=None):
+        async with pool.connection(timeout) as connection:
+            async with connection.cursor(name=f"stream_{next(_cursor_ids)}", row_factory=tuple_row) as cursor:
+                cursor.itersize = itersize or self.pool_config.DB_CURSOR_ITERSIZE
+                await cursor.execute(query, params)
+                async for row in cursor:
+                    yield row
+
+    async def iter_query(self, query, params=None, itersize=None):
+        """
+        Yield SELECT rows from the primary as tuples through a server-side
+        cursor, itersize rows per round trip; errors are logged and re-raised
+        """
+        if self.pool is None and not await self.connect():
+            raise ConnectionError("Database is not connected")
+        try:
+            async for row in self._stream(self.pool, query, params, itersize):
+                yield row
+        except Exception as e:
+            print(f"Query execution error: {e}")
+            raise
+
+    async def iter_read(self, query, params=None, itersize=None):
+        """
+        iter_query on a read replica chosen like fetch_read. Falls back to the
+        primary only if the replica fails before the first row; a later error
+        is re-raised like iter_query's.
+        """
+        if self.pool is None and not await self.connect():
+            raise ConnectionError("Database is not connected")
+        replica = self._choose_replica()
+        if replica is not None:
+            rows = self._stream(replica.pool, query, params, itersize, timeout=0)
+            try:
+                try:
+                    first = await rows.__anext__()
+                except StopAsyncIteration:
+                    return
+                except REPLICA_ERRORS as e:
+                    self._replica_failed(replica, e)
+                else:
+                    yield first
+                    async for row in rows:
+                        yield row
+                    return
+            except Exception as e:
+                print(f"Query execution error: {e}")
+                raise
+            finally:
+                await rows.aclose()
+        async for row in self.iter_query(query, params, itersize):
+            yield row
+
+    async def executemany(self, query, rows):
+        """Run query once per row in one transaction on the primary; returns the row count or None on error"""
+        if self.pool is None and not await self.connect():
+            return None
+        try:
+            async with self.pool.connection() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.executemany(query, rows)
+            return len(rows)
+        except Exception as e:
+            print(f"Batch execution error: {e}")
+            return None
+
+    def get_pool_stats(self):
+        if not self.pool:
+            return {}
+        stats = self.pool.get_stats()
+        if self.replicas is not None:
+            stats['replicas'] = self.replicas.get_stats()
+        return stats
+
+
+class AsyncChatHistoryWriter:
+    """asyncio counterpart of chat_history_writer.ChatHistoryWriter"""
+
+    def __init__(self, db, max_queue_size=10000, batch_size=200, flush_interval=1.0, enqueue_timeout=0.05):
+        self.db = db
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = None
+        self._task = None
+        self._pending = []
+        self.stats = {'enqueued': 0, 'flushed': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, user_message, bot_response, session_id=None):
+        if self._task is None:
+            self.start()
+        try:
+            await asyncio.wait_for(self._queue.put((user_message, bot_response, session_id)), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.stats['dropped'] += 1
+            return False
+        self.stats['enqueued'] += 1
+        return True
+
+    async def _write_batch(self, batch):
+        with STAGE_SECONDS.time('chat_history_insert'):
+            rowcount = await self.db.executemany(INSERT_CHAT_HISTORY_ROW, batch)
+        if rowcount is None:
+            self.stats['failed'] += len(batch)
+        else:
+            self.stats['flushed'] += len(batch)
+            self.stats['batches'] += 1
+
+    async def _run(self):
+        while True:
+            # Kept on self so stop() can still write a batch that was being collected
+            self._pending = batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self._pending = []
+            await self._write_batch(batch)
+
+    async def stop(self):
+        """Cancel the worker and flush whatever is still queued"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        batch, self._pending = self._pending, []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+            if len(batch) >= self.batch_size:
+                await self._write_batch(batch)
+                batch = []
+        if batch:
+            await self._write_batch(batch)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['queued'] = self._queue.qsize() if self._queue is not None else 0
+        return stats
+
+
+class AsyncLLMHandler:
+    """
+    asyncio counterpart of llm_handler.LLMHandler: keep-alive httpx client,
+    periodic availability probe and response cache, with the same circuit
+    breaker, admission control and prompt coalescing (the Async* classes in
+    llm_admission)
+    """
+
+    def __init__(self, config=None, model=None):
+        config = config or current_config
+        self.model_name = model or config.LLM_MODEL
+        self.max_tokens = config.LLM_MAX_TOKENS
+        self.temperature = config.LLM_TEMPERATURE
+        self.ollama_base_url = config.OLLAMA_BASE_URL
+        self.request_timeout = config.LLM_REQUEST_TIMEOUT
+        self.probe_interval = config.LLM_PROBE_INTERVAL
+        self.pool_size = config.LLM_HTTP_POOL_SIZE
+        self.queue_timeout = config.LLM_QUEUE_TIMEOUT
+
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.LLM_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=config.LLM_BREAKER_RESET_TIMEOUT
+        )
+        self.admission = AsyncAdmissionController(
+            max_inflight=config.LLM_MAX_INFLIGHT,
+            max_queue=config.LLM_MAX_QUEUE
+        )
+        self.single_flight = AsyncSingleFlight()
+        self.guard = AsyncCallGuard(self.admission, self.breaker)
+        self.response_cache = None
+        if config.LLM_CACHE_ENABLED:
+            self.response_cache = LLMResponseCache(
+                maxsize=config.LLM_CACHE_SIZE,
+                ttl=config.LLM_CACHE_TTL,
+                semantic=config.LLM_SEMANTIC_CACHE_ENABLED,
+                semantic_maxsize=config.LLM_SEMANTIC_CACHE_SIZE,
+                semantic_threshold=config.LLM_SEMANTIC_CACHE_THRESHOLD,
+                path=config.LLM_CACHE_PATH or None
+            )
+
+        self.enabled = False
+        self.client = None
+        self._probe_task = None
+        self.stats = {'requests': 0}
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            base_url=self.ollama_base_url,
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            timeout=httpx.Timeout(self.request_timeout, connect=5.0)
+        )
+        self.enabled = await self._check_ollama_availability()
+        if self.probe_interval > 0:
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def close(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+        if self.response_cache is not None:
+            self.response_cache.save()
+        if self.client is not None:
+            await self.client.aclose()
+
+    async def _check_ollama_availability(self):
+        try:
+            response = await self.client.get('/api/tags', timeout=5)
+            if response.status_code == 200:
+                model_names = [model['name'] for model in response.json().get('models', [])]
+                if self.model_name in model_names:
+                    return True
+                logger.warning(f"Model {self.model_name} not found in available models: {model_names}")
+            else:
+                logger.error(f"Ollama server not responding: {response.status_code}")
+        except Exception as e:
+            logger.error(f"Failed to connect to Ollama: {e}")
+        return False
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            self.enabled = await self._check_ollama_availability()
+
+    def is_available(self):
+        return self.enabled and self.breaker.state != CircuitBreaker.OPEN
+
+    def _payload(self, user_message, stream):
+        return {
+            "model": self.model_name,
+            "prompt": user_message,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "stream": stream
+        }
+
+    def _cached_response(self, user_message):
+        if self.response_cache is None:
+            return MISSING
+        return self.response_cache.get(user_message, self.model_name, self.temperature, self.max_tokens)
+
+    def _store_response(self, user_message, response):
+        if self.response_cache is not None:
+            self.response_cache.set(user_message, self.model_name, self.temperature, self.max_tokens, response)
+
+    async def generate_response(self, user_message, deadline=None):
+        cached = self._cached_response(user_message)
+        if cached is not MISSING:
+            return cached
+        if not self.enabled:
+            return UNAVAILABLE_MESSAGE
+
+        if deadline is None:
+            deadline = time.monotonic() + self.request_timeout
+        key = (normalize_prompt(user_message), self.model_name, self.temperature, self.max_tokens)
+        try:
+            return await self.single_flight.do(
+                key,
+                lambda: self._generate_uncached(user_message, deadline),
+                timeout=max(0.0, deadline - time.monotonic())
+            )
+        except TimeoutError:
+            return OVERLOADED_MESSAGE
+
+    async def _generate_uncached(self, user_message, deadline):
+        try:
+            async with self.guard.call(deadline):
+                self.stats['requests'] += 1
+                timeout = max(0.1, min(self.request_timeout, deadline - time.monotonic()))
+                with STAGE_SECONDS.time('llm'):
+                    response = await self.client.post('/api/generate', json=self._payload(user_message, False), timeout=timeout)
+                if response.status_code != 200:
+                    self.breaker.record_failure()
+                    logger.error(f"Ollama API error: {response.status_code} - {response.text}")
+                    return ERROR_MESSAGE
+                self.breaker.record_success()
+                generated_text = response.json().get('response', '')
+                if not generated_text:
+                    return EMPTY_MESSAGE
+                self._store_response(user_message, generated_text)
+                return generated_text
+        except AdmissionRejected as e:
+            logger.warning(f"Rejected LLM request: {e}")
+            return OVERLOADED_MESSAGE
+        except BreakerOpen:
+            return ERROR_MESSAGE
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            return ERROR_MESSAGE
+
+    async def stream_response(self, user_message, deadline=None):
+        """Yield text fragments as generated; deadline bounds the wait for a slot and for each chunk"""
+        cached = self._cached_response(user_message)
+        if cached is not MISSING:
+            yield cached
+            return
+        if not self.enabled:
+            yield UNAVAILABLE_MESSAGE
+            return
+        if deadline is None:
+            deadline = time.monotonic() + self.queue_timeout
+            read_timeout = self.request_timeout
+        else:
+            read_timeout = None
+
+        yielded_any = False
+        fragments = [] if self.response_cache is not None else None
+        try:
+            async with self.guard.call(deadline):
+                self.stats['requests'] += 1
+                started = time.monotonic()
+                if read_timeout is None:
+                    read_timeout = max(0.1, min(self.request_timeout, deadline - started))
+                async with self.client.stream('POST', '/api/generate', json=self._payload(user_message, True),
+                                              timeout=httpx.Timeout(read_timeout, connect=5.0)) as response:
+                    if response.status_code != 200:
+                        self.breaker.record_failure()
+                        yield ERROR_MESSAGE
+                        return
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get('error'):
+                            raise RuntimeError(chunk['error'])
+                        text = chunk.get('response', '')
+                        if text:
+                            if not yielded_any:
+                                STAGE_SECONDS.observe('llm_first_token', time.monotonic() - started)
+                            yielded_any = True
+                            if fragments is not None:
+                                fragments.append(text)
+                            yield text
+                        if chunk.get('done'):
+                            break
+                self.breaker.record_success()
+                if not yielded_any:
+                    yield EMPTY_MESSAGE
+                elif fragments is not None:
+                    self._store_response(user_message, ''.join(fragments))
+        except AdmissionRejected as e:
+            logger.warning(f"Rejected LLM stream: {e}")
+            yield OVERLOADED_MESSAGE
+        except BreakerOpen:
+            yield ERROR_MESSAGE
+        except Exception as e:
+            logger.error(f"Error streaming response: {e}")
+            if not yielded_any:
+                yield ERROR_MESSAGE
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats.update({
+            'enabled': self.enabled,
+            'breaker': self.breaker.get_stats(),
+            'admission': self.admission.get_stats(),
+            'coalescing': self.single_flight.get_stats(),
+        })
+        if self.response_cache is not None:
+            stats['response_cache'] = self.response_cache.get_stats()
+        return stats
+
+
+class AsyncChatBot:
+    """
+    Same answers as app.ChatBot; only the I/O is async. Routing and reply
+    rendering come from chat_core, like the sync ChatBot's.
+    """
+
+    def __init__(self, db, llm, history_writer, answer_pipeline, sessions, renderer):
+        self.db = db
+        self.llm_handler = llm
+        self.history_writer = history_writer
+        self.intent_handler = answer_pipeline.intent_handler
+        self.answer_pipeline = answer_pipeline
+        self.sessions = sessions
+        self.renderer = renderer
+        self.loan_cache = TTLCache(
+            maxsize=current_config.LOAN_CACHE_MAXSIZE,
+            ttl=current_config.LOAN_CACHE_TTL,
+            negative_ttl=current_config.LOAN_CACHE_NEGATIVE_TTL
+        )
+        self.customer_context_cache = TTLCache(
+            maxsize=current_config.CUSTOMER_CONTEXT_CACHE_SIZE,
+            ttl=current_config.CUSTOMER_CONTEXT_TTL
+        )
+        self.loan_page_positions = TTLCache(
+            maxsize=current_config.CUSTOMER_CONTEXT_CACHE_SIZE,
+            ttl=current_config.SESSION_TIMEOUT
+        )
+
+    async def get_loan_record(self, loan_id, account_number):
+        cache_key = (str(loan_id), str(account_number))
+        record = self.loan_cache.get(cache_key)
+        if record is MISSING:
+            result = await self.db.fetch_read(LOAN_SANCTION_QUERY, (loan_id, account_number))
+            if result is None:
+                return MISSING
+            record = LoanRecord(result[0]) if result else None
+            self.loan_cache.set(cache_key, record, negative=record is None)
+        return record
+
+    async def get_loan_sanction_details(self, loan_id, account_number):
+        return loan_record_dict(await self.get_loan_record(loan_id, account_number))
+
+    async def get_loan_sanction_details_batch(self, pairs):
+        keys = [(str(loan_id), str(account_number)) for loan_id, account_number in pairs]
+        found, missing = split_cached_loans(self.loan_cache, keys)
+        if missing:
+            result = await self.db.fetch_read(LOAN_SANCTION_BATCH_QUERY, loan_batch_params(missing))
+            store_loan_batch(self.loan_cache, missing, result, found)
+        return assemble_loan_batch(keys, found)
+
+    async def get_customer_context(self, customer_id, decrypted_customer_id=None):
+        if decrypted_customer_id is None:
+            decrypted_customer_id = resolve_customer_id(customer_id)
+            if decrypted_customer_id is None:
+                return None
+
+        context = self.customer_context_cache.get(decrypted_customer_id)
+        if context is not MISSING:
+            return context
+
+        result = await self.db.fetch_read(
+            CUSTOMER_CONTEXT_QUERY, (decrypted_customer_id, decrypted_customer_id, current_config.LOAN_PAGE_SIZE)
+        )
+        if result is None:
+            return None
+        context = customer_context_from_rows(result)
+        self.customer_context_cache.set(decrypted_customer_id, context)
+        return context
+
+    async def get_loan_page(self, customer_id, decrypted_customer_id=None, next_page=False):
+        if decrypted_customer_id is None:
+            decrypted_customer_id = resolve_customer_id(customer_id)
+            if decrypted_customer_id is None:
+                return None
+        context = await self.get_customer_context(customer_id, decrypted_customer_id)
+        if context is None:
+            return None
+
+        paged = next_page and context.loan_count > 1
+        position = self.loan_page_positions.get(decrypted_customer_id) if paged else MISSING
+        if position is MISSING:
+            page = LoanPage(context.loans, 0, context.loan_count)
+        else:
+            last_loan_id, offset = position
+            result = await self.db.fetch_read(
+                CUSTOMER_LOANS_PAGE_QUERY, (decrypted_customer_id, last_loan_id, current_config.LOAN_PAGE_SIZE)
+            )
+            if result is None:
+                return None
+            loans = tuple(LoanRecord(row, with_reference=True) for row in result)
+            page = LoanPage(loans, offset, max(context.loan_count, offset + len(loans)))
+
+        if page.loans:
+            self.loan_page_positions.set(decrypted_customer_id, (page.loans[-1].loan_id, page.offset + len(page.loans)))
+        else:
+            self.loan_page_positions.invalidate(decrypted_customer_id)
+        return page
+
+    async def iter_loans_by_customer_id(self, customer_id, decrypted_customer_id=None):
+        if decrypted_customer_id is None:
+            decrypted_customer_id = resolve_customer_id(customer_id)
+            if decrypted_customer_id is None:
+                return
+        async for row in self.db.iter_read(CUSTOMER_LOANS_QUERY, (decrypted_customer_id,)):
+            yield LoanRecord(row, with_reference=True)
+
+    async def get_loans_by_customer_id(self, customer_id, decrypted_customer_id=None):
+        """Every loan of a customer as dicts, or None on a database error"""
+        try:
+            return [loan.to_dict() async for loan in self.iter_loans_by_customer_id(customer_id, decrypted_customer_id)]
+        except Exception:
+            # Already logged by iter_read
+            return None
+
+    async def get_customer_name(self, customer_id, decrypted_customer_id=None):
+        context = await self.get_customer_context(customer_id, decrypted_customer_id)
+        return context.name if context is not None else None
+
+    async def iter_status_response(self, routing, session_id=None, decrypted_customer_id=None):
+        """Run the lookup a status inquiry needs; returns a generator over the reply pieces"""
+        loan_details = None
+        page = None
+        lookup = status_lookup(routing, session_id)
+        if lookup == LOOKUP_LOAN:
+            loan_details = await self.get_loan_sanction_details(routing.loan_ids[0], routing.account_numbers[0])
+        elif lookup == LOOKUP_CUSTOMER_LOANS:
+            page = await self.get_loan_page(session_id, decrypted_customer_id, next_page=routing.next_page)
+        return self.renderer.iter_rendered_status(routing, lookup, loan_details, page)
+
+    async def build_status_response(self, routing, session_id=None, decrypted_customer_id=None):
+        return ''.join(await self.iter_status_response(routing, session_id, decrypted_customer_id))
+
+    async def finish_turn(self, message, response, routing, session_id=None, session=None):
+        if session is not None:
+            self.sessions.record(session_id, session, routing, message, response)
+        await self.history_writer.submit(message, response, session_id)
+
+    async def process_message(self, message, session_id=None, customer_name=None, decrypted_customer_id=None):
+        session = self.sessions.get(session_id) if session_id else None
+        routing = route(message, session)
+        if routing.is_status_inquiry:
+            response = await self.build_status_response(routing, session_id, decrypted_customer_id)
+        else:
+            response, tier = await self.answer(message)
+        await self.finish_turn(message, response, routing, session_id, session)
+        return response
+
+    async def answer(self, message):
+        """AnswerPipeline.answer with the LLM tier awaited instead of blocking"""
+        started = time.monotonic()
+        timings = {}
+        tier, intent = self.answer_pipeline.match(message, timings)
+        llm_response = None
+        if tier is None:
+            deadline = self.answer_pipeline.llm_deadline(started, self.llm_handler.is_available())
+            if deadline is not None:
+                llm_started = time.monotonic()
+                llm_response = await self.llm_handler.generate_response(message, deadline=deadline)
+                timings['llm'] = time.monotonic() - llm_started
+        return self.answer_pipeline.resolve(tier, intent, llm_response, timings)
+
+    async def stream_message(self, message, session_id=None, customer_name=None, decrypted_customer_id=None):
+        session = self.sessions.get(session_id) if session_id else None
+        routing = route(message, session)
+        chunks = []
+        async for chunk in self.iter_reply(message, routing, session_id, decrypted_customer_id):
+            chunks.append(chunk)
+            yield chunk
+        await self.finish_turn(message, ''.join(chunks), routing, session_id, session)
+
+    async def iter_reply(self, message, routing, session_id=None, decrypted_customer_id=None):
+        if routing.is_status_inquiry:
+            for chunk in await self.iter_status_response(routing, session_id, decrypted_customer_id):
+                yield chunk
+            return
+
+        started = time.monotonic()
+        timings = {}
+        tier, intent = self.answer_pipeline.match(message, timings)
+        first = None
+        if tier is None:
+            deadline = self.answer_pipeline.llm_deadline(started, self.llm_handler.is_available())
+            if deadline is not None:
+                llm_started = time.monotonic()
+                chunks = self.llm_handler.stream_response(message, deadline=deadline)
+                try:
+                    first = await chunks.__anext__()
+                    if first not in LLM_FAILURE_MESSAGES:
+                        yield first
+                        async for chunk in chunks:
+                            yield chunk
+                        timings['llm'] = time.monotonic() - llm_started
+                        self.answer_pipeline.record('llm', timings)
+                        return
+                except StopAsyncIteration:
+                    pass
+                finally:
+                    await chunks.aclose()
+                timings['llm'] = time.monotonic() - llm_started
+        response, tier = self.answer_pipeline.resolve(tier, intent, first, timings)
+        yield response
+
+
+intent_handler = IntentHandler()
+intent_watcher = create_intent_watcher(intent_handler)
+reply_templates = ReplyTemplates(current_config.REPLY_TEMPLATES_DIR)
+renderer = ReplyRenderer(reply_templates)
+answer_pipeline = create_answer_pipeline(intent_handler)
+session_store = create_session_store()
+
+db_manager = AsyncDatabaseManager()
+llm_handler = AsyncLLMHandler()
+chat_history_writer = AsyncChatHistoryWriter(
+    db_manager,
+    max_queue_size=current_config.CHAT_HISTORY_QUEUE_SIZE,
+    batch_size=current_config.CHAT_HISTORY_BATCH_SIZE,
+    flush_interval=current_config.CHAT_HISTORY_FLUSH_INTERVAL,
+    enqueue_timeout=current_config.CHAT_HISTORY_ENQUEUE_TIMEOUT
+)
+chatbot = AsyncChatBot(db_manager, llm_handler, chat_history_writer, answer_pipeline, session_store, renderer)
+
+
+def _pool_connections():
+    stats = db_manager.get_pool_stats()
+    if not stats:
+        return {}
+    return {('idle',): stats['pool_available'], ('in_use',): stats['pool_size'] - stats['pool_available']}
+
+
+# Same gauges as app.py, pointed at the async pool, LLM client and writer
+REGISTRY.gauge('db_pool_connections', 'Database pool connections by state', _pool_connections, labels=('state',))
+REGISTRY.gauge('db_replica_lag_seconds', 'Last measured lag per read replica',
+               lambda: {(replica['name'],): replica['lag']
+                        for replica in db_manager.get_pool_stats().get('replicas', {}).get('replicas', ())},
+               labels=('replica',))
+REGISTRY.gauge('llm_inflight_requests', 'Generations currently sent to Ollama',
+               lambda: llm_handler.admission.get_stats()['inflight'])
+REGISTRY.gauge('llm_queued_requests', 'Callers waiting for an LLM slot',
+               lambda: llm_handler.admission.get_stats()['queue_depth'])
+REGISTRY.gauge('llm_circuit_open', '1 while the LLM circuit breaker is open',
+               lambda: int(llm_handler.breaker.state == CircuitBreaker.OPEN))
+REGISTRY.gauge('chat_history_queued_rows', 'chat_history rows waiting to be inserted',
+               lambda: chat_history_writer.get_stats()['queued'])
+REGISTRY.gauge('sessions_active', 'Chat sessions held in the session store',
+               lambda: chatbot.sessions.get_stats().get('sessions'))
+REGISTRY.gauge('cache_entries', 'Entries per in-process cache', lambda: {
+    ('loan_sanction',): len(chatbot.loan_cache),
+    ('customer_context',): len(chatbot.customer_context_cache),
+}, labels=('cache',))
+
+
+@app.before_request
+async def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+async def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        record_request(route, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+
+@app.after_request
+async def compress_response(response):
+    encoding = negotiate_encoding(response, request.accept_encodings, current_config.COMPRESS_MIN_SIZE)
+    if encoding:
+        apply_encoding(response, await response.get_data(), encoding)
+    return response
+
+
+def loan_response(record, variant, build_body):
+    """See app.loan_response"""
+    etag = loan_etag(record, variant)
+    if etag is None:
+        return jsonify(build_body())
+    return conditional_json(
+        request.if_none_match, etag, current_config.LOAN_HTTP_CACHE_CONTROL, build_body, jsonify, Response
+    )
+
+
+@app.before_serving
+async def startup():
+    if await db_manager.connect():
+        print("Database connected successfully")
+    else:
+        print("Failed to connect to database")
+    await llm_handler.start()
+    chat_history_writer.start()
+    if current_config.INTENTS_RELOAD_INTERVAL > 0:
+        intent_watcher.start()
+
+
+@app.after_serving
+async def shutdown():
+    intent_watcher.stop()
+    await chat_history_writer.stop()
+    await llm_handler.close()
+    await db_manager.close()
+
+
+async def _resolve_chat_request():
+    """Parse a /api/chat body; returns (args tuple, None) or (None, error response)"""
+    data = await request.get_json()
+    message = data.get('message', '').strip()
+    session_id = data.get('session_id')
+    customer_id = data.get('customer_id')
+
+    if not message:
+        return None, (jsonify({'error': 'Message is required'}), 400)
+
+    customer_name = None
+    decrypted_customer_id = None
+    if customer_id:
+        decrypted_customer_id = resolve_customer_id(customer_id)
+        if decrypted_customer_id is not None:
+            customer_name = await chatbot.get_customer_name(customer_id, decrypted_customer_id)
+    return (message, customer_id or session_id, customer_name, decrypted_customer_id), None
+
+
+@app.route('/api/chat', methods=['POST'])
+async def chat():
+    try:
+        args, error = await _resolve_chat_request()
+        if error:
+            return error
+        response = await chatbot.process_message(*args)
+        return jsonify({
+            'response': response,
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+async def chat_stream():
+    try:
+        args, error = await _resolve_chat_request()
+        if error:
+            return error
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    async def generate():
+        try:
+            async for chunk in chatbot.stream_message(*args):
+                yield _sse_event('token', {'text': chunk})
+            yield _sse_event('done', {'timestamp': datetime.now().isoformat()})
+        except Exception as e:
+            yield _sse_event('error', {'error': str(e)})
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/welcome', methods=['GET'])
+async def welcome():
+    try:
+        customer_id = request.args.get('customer_id')
+        if not customer_id:
+            return jsonify({'error': 'customer_id is required'}), 400
+
+        customer_name = await chatbot.get_customer_name(customer_id)
+        if customer_name:
+            message = f"Welcome {customer_name}! I'm here to help you with your loan information and answer any questions you may have."
+        else:
+            message = "Welcome! I'm here to help you with your loan information and answer any questions you may have."
+
+        return jsonify({
+            'message': message,
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/loan-details/<loan_id>/<account_number>', methods=['GET'])
+async def get_loan_details_api(loan_id, account_number):
+    try:
+        fmt = request.args.get('format')
+        error = reply_format_error(fmt) if fmt is not None else None
+        if error:
+            return jsonify({'error': error}), 400
+        record = await chatbot.get_loan_record(loan_id, account_number)
+        if fmt is None:
+            return loan_response(record, 'details', lambda: loan_record_dict(record))
+        return loan_response(record, renderer.rendered_variant(fmt), lambda: renderer.loan_details_reply(loan_record_dict(record), fmt)[0])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/loan-details/batch', methods=['POST'])
+async def get_loan_details_batch_api():
+    try:
+        pairs, error = parse_loan_batch(await request.get_json(silent=True), current_config.LOAN_BATCH_MAX_SIZE)
+        if error:
+            return jsonify({'error': error}), 400
+        return jsonify({'results': await chatbot.get_loan_sanction_details_batch(pairs)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/loan-status/<loan_id>/<account_number>', methods=['GET'])
+async def get_loan_status_api(loan_id, account_number):
+    try:
+        record = await chatbot.get_loan_record(loan_id, account_number)
+        return loan_response(record, 'status', lambda: loan_record_dict(record))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/emi-details/<loan_id>/<account_number>', methods=['GET'])
+async def get_emi_details_api(loan_id, account_number):
+    try:
+        record = await chatbot.get_loan_record(loan_id, account_number)
+        return loan_response(record, 'emi', lambda: emi_details_body(loan_record_dict(record)))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+
+
+@app.route('/api/metrics', methods=['GET'])
+async def metrics_api():
+    return Response(REGISTRY.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def reload_catalogues():
+    """Recompile the intent catalogue and the reply templates from disk"""
+    return {'intents': intent_handler.reload(), 'reply_templates': reply_templates.reload()}
+
+
+@app.route('/api/admin/reload', methods=['POST'])
+async def reload_catalogues_api():
+    if not admin_authorized(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        # Compiling a large catalogue is CPU work; keep it off the event loop
+        return jsonify({'status': 'reloaded', **(await asyncio.to_thread(reload_catalogues))})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/admin/stats', methods=['GET'])
+async def stats_api():
+    if not admin_authorized(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({
+        'answer_pipeline': chatbot.answer_pipeline.get_stats(),
+        'caches': {
+            'loan_sanction': chatbot.loan_cache.get_stats(),
+            'customer_context': chatbot.customer_context_cache.get_stats()
+        },
+        'chat_history': chat_history_writer.get_stats(),
+        'llm': llm_handler.get_stats(),
+        'sessions': chatbot.sessions.get_stats(),
+    })
+
+
+@app.route('/api/db-test', methods=['GET'])
+async def test_database_connection():
+    try:
+        if not await db_manager.connect():
+            return jsonify({'error': 'Database connection failed'}), 500
+
+        result = await db_manager.fetch("""
+        SELECT
+            loan_id,
+            loan_account_number,
+            amount_sanctioned,
+            emi_amount,
+            emi_due_date,
+            number_of_emis
+        FROM loancraft.lms_loan_saction
+        LIMIT 5
+        """)
+        if result:
+            return jsonify({
+                'status': 'success',
+                'message': 'Database connection and table access successful',
+                'sample_data': [dict(row) for row in result]
+            })
+        return jsonify({
+            'status': 'error',
+            'message': 'Could not fetch data from loancraft.lms_loan_saction table'
+        }), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,75 @@
+"""
+Benchmark: cold start of the intent catalogue
+
+Writes a synthetic catalogue of N intents to a temporary directory and times
+building the snapshot from the JSON files (tokenize + index) against loading
+it from the pickle cache, then checks both snapshots classify the same way.
+
+Usage:
+    python benchmarks/bench_intent_catalogue.py [--intents N] [--matcher overlap|tfidf]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_catalogue import load_snapshot
+
+WORDS = (
+    "loan emi account interest rate home car personal business education apply document "
+    "status branch payment due date balance statement transfer closure foreclosure tenure "
+    "insurance credit score salary income property vehicle fees charges penalty refund"
+).split()
+
+
+def synthetic_catalogue(intents, rng):
+    catalogue = []
+    for n in range(intents):
+        patterns = [' '.join(rng.sample(WORDS, rng.randint(2, 6))) + f" topic{n}" for _ in range(6)]
+        catalogue.append({'tag': f"faq_{n}", 'patterns': patterns, 'responses': [f"Answer {n}"]})
+    catalogue.append({'tag': 'default', 'patterns': [], 'responses': ["Sorry, I didn't understand that."]})
+    return catalogue
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--intents', type=int, default=5000, help='synthetic intents in the catalogue')
+    parser.add_argument('--matcher', choices=('overlap', 'tfidf'), default='overlap')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'faq.json'), 'w', encoding='utf-8') as f:
+            json.dump({'intents': synthetic_catalogue(args.intents, rng)}, f)
+        cache_file = os.path.join(directory, '__pycache__', 'catalogue.pickle')
+
+        compiled, compile_ms = timed(lambda: load_snapshot(directory, args.matcher, 0.3, cache_file))
+        cached, cached_ms = timed(lambda: load_snapshot(directory, args.matcher, 0.3, cache_file))
+
+        messages = [' '.join(rng.sample(WORDS, 4)) + f" topic{rng.randrange(args.intents)}" for _ in range(200)]
+        for message in messages:
+            if args.matcher == 'tfidf':
+                a, b = compiled.tfidf.find_best(message), cached.tfidf.find_best(message)
+            else:
+                a, b = compiled.index.find_best(message, 0.3), cached.index.find_best(message, 0.3)
+            assert (a[0] and a[0]['tag'], a[1]) == (b[0] and b[0]['tag'], b[1]), message
+
+        print(f"intents:              {args.intents} ({args.matcher})")
+        print(f"compile from files:   {compile_ms:8.1f} ms")
+        print(f"load from cache:      {cached_ms:8.1f} ms")
+        print(f"speedup:              {compile_ms / cached_ms:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
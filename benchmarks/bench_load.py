@@ -0,0 +1,156 @@
+"""
+Load test: the Flask routes under a realistic message mix
+
+The threaded Flask server runs against the in-process fake lms_loan_saction
+store and a stub Ollama server (benchmarks/fakes.py), each with a configurable
+latency. Client threads send a weighted mix of greetings, FAQ questions, loan
+status lookups, signed-in customers' loan lists, LLM fallbacks and the REST
+loan routes; throughput and p50/p95/p99 latency are reported overall and per
+kind of request. A second, sequential pass through the Flask test client
+measures the memory each request allocates.
+
+Usage:
+    python benchmarks/bench_load.py [--requests N] [--concurrency N] [--db-latency S]
+                                    [--llm-latency S] [--json results.json] [--compare previous.json]
+"""
+import os
+import sys
+import random
+import argparse
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EXACT_MESSAGES = ["hello", "thanks", "interest rates", "loan types", "bye", "processing time"]
+FAQ_MESSAGES = [
+    "could you tell me your interest rates for a home loan",
+    "how do I apply for a personal loan online",
+    "what documents and eligibility criteria do you need",
+    "how long does approval usually take",
+    "what is your customer care phone number",
+    "which kinds of loans can I get from you",
+]
+
+# (kind, share of requests)
+DEFAULT_MIX = (
+    ('faq_exact', 0.20),
+    ('faq_index', 0.20),
+    ('status_lookup', 0.25),
+    ('customer_loans', 0.08),
+    ('missing_ids', 0.03),
+    ('llm_fallback', 0.10),
+    ('loan_details_api', 0.10),
+    ('welcome', 0.04),
+)
+
+
+def build_workload(count, loan_count, loans_per_customer=4, mix=DEFAULT_MIX, seed=7):
+    """Return (kind, method, path, body) requests drawn from mix with a fixed seed"""
+    from benchmarks.fakes import account_number_for, encrypt_customer_id
+
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix)
+    customer_count = loan_count // loans_per_customer
+    workload = []
+    for i in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        session_id = f"load-{rng.randrange(500)}"
+        loan_id = rng.randint(1, loan_count)
+        if kind == 'faq_exact':
+            request = ('POST', '/api/chat', {'message': rng.choice(EXACT_MESSAGES), 'session_id': session_id})
+        elif kind == 'faq_index':
+            request = ('POST', '/api/chat', {'message': rng.choice(FAQ_MESSAGES), 'session_id': session_id})
+        elif kind == 'status_lookup':
+            message = f"what is the status of loan {loan_id} account {account_number_for(loan_id)}"
+            request = ('POST', '/api/chat', {'message': message, 'session_id': session_id})
+        elif kind == 'customer_loans':
+            token = encrypt_customer_id(rng.randint(1, customer_count))
+            request = ('POST', '/api/chat', {'message': "what is the status of my loans", 'customer_id': token})
+        elif kind == 'missing_ids':
+            request = ('POST', '/api/chat', {'message': "check my loan status", 'session_id': session_id})
+        elif kind == 'llm_fallback':
+            # Distinct questions so neither the intent tiers nor an LLM cache answer them
+            message = f"summarise yesterday's cricket scores, match {i}"
+            request = ('POST', '/api/chat', {'message': message, 'session_id': session_id})
+        elif kind == 'loan_details_api':
+            request = ('GET', f"/api/loan-details/{loan_id}/{account_number_for(loan_id)}", None)
+        else:
+            token = encrypt_customer_id(rng.randint(1, customer_count))
+            request = ('GET', f"/api/welcome?customer_id={quote(token)}", None)
+        workload.append((kind,) + request)
+    return workload
+
+
+def allocation_pass(workload, calls):
+    """Memory allocated per request, sending workload sequentially through the Flask test client"""
+    import app
+    from benchmarks.harness import measure_allocations
+
+    client = app.app.test_client()
+    requests = iter(workload * (calls // max(len(workload), 1) + 2))
+
+    def one_request():
+        _, method, path, body = next(requests)
+        client.open(path, method=method, json=body).get_data()
+
+    return measure_allocations(one_request, calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--loans', type=int, default=5000)
+    parser.add_argument('--db-latency', type=float, default=0.002, help='seconds per fake query')
+    parser.add_argument('--llm-latency', type=float, default=0.05, help='seconds before the fake LLM answers')
+    parser.add_argument('--ollama-port', type=int, default=11501, help='port for the fake Ollama server')
+    parser.add_argument('--port', type=int, default=5103, help='port for the Flask server')
+    parser.add_argument('--allocation-requests', type=int, default=300, help='requests in the allocation pass')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    # Must be set before app/config are imported (benchmarks.fakes imports app)
+    os.environ['OLLAMA_BASE_URL'] = f"http://127.0.0.1:{args.ollama_port}"
+    os.environ['LLM_CACHE_ENABLED'] = 'False'
+    os.environ['LLM_PROBE_INTERVAL'] = '0'
+    os.environ['LLM_MAX_INFLIGHT'] = str(args.concurrency)
+    os.environ['LLM_MAX_QUEUE'] = str(args.concurrency)
+
+    from benchmarks.fakes import FakeLoanStore, start_fake_ollama
+    from benchmarks.harness import run_load, save_results, compare_results
+    from benchmarks.bench_serving import start_wsgi
+
+    start_fake_ollama(latency=args.llm_latency, port=args.ollama_port)
+    import app
+    # app was imported (through benchmarks.fakes) before the stub server was listening
+    app.llm_handler.enabled = app.llm_handler._check_ollama_availability()
+
+    store = FakeLoanStore(args.loans)
+    workload = build_workload(args.requests, args.loans)
+    stop = start_wsgi(args.port, store, args.db_latency)
+    try:
+        run_load(args.port, workload[:args.concurrency * 2], args.concurrency)  # warm-up
+        results = run_load(args.port, workload, args.concurrency)
+    finally:
+        stop()
+    results['allocations'] = allocation_pass(workload[:200], args.allocation_requests)
+
+    print(f"{results['throughput']:8.1f} req/s  p50 {results['p50_ms']:7.1f} ms  p95 {results['p95_ms']:7.1f} ms  "
+          f"p99 {results['p99_ms']:7.1f} ms  errors {results['errors']}/{results['requests']}")
+    for kind, summary in results['by_label'].items():
+        print(f"  {kind:<18} {summary['count']:6d}  p50 {summary['p50_ms']:7.1f} ms  "
+              f"p95 {summary['p95_ms']:7.1f} ms  p99 {summary['p99_ms']:7.1f} ms")
+    allocations = results['allocations']
+    print(f"allocations: peak {allocations['peak_kib']:.1f} KiB/request, "
+          f"retained {allocations['retained_bytes_per_call']:.0f} B/request, "
+          f"{allocations['blocks_per_call']:.1f} blocks/request")
+
+    if args.json:
+        save_results(args.json, 'bench_load', args, results)
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
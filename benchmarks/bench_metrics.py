@@ -0,0 +1,92 @@
+"""
+Microbenchmark: cost of the latency instrumentation in metrics.py
+
+Times one histogram observation, the `with STAGE_SECONDS.time(...)` timer,
+and a full /api/chat request through the Flask test client (fake database,
+LLM disabled) with the registry enabled and disabled. The difference between
+the last two is what the per-stage timers, the HTTP counters and the request
+histogram add to every message.
+
+Usage:
+    python benchmarks/bench_metrics.py [--number N] [--requests N]
+"""
+import os
+import sys
+import time
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from metrics import REGISTRY, STAGE_SECONDS
+from benchmarks.fakes import FakeDatabaseManager, FakeLoanStore, account_number_for
+
+SAMPLE_MESSAGES = [
+    "hello",
+    "What are your interest rates?",
+    "check status of loan 12 account {account}",
+    "When is my EMI due?",
+    "how do I apply for a loan",
+    "thanks a lot, that was helpful",
+    "my loan id is 42",
+    "bye",
+]
+
+
+def microbenchmarks(number):
+    def observe():
+        STAGE_SECONDS.observe('bench', 0.001)
+
+    def timed():
+        with STAGE_SECONDS.time('bench'):
+            pass
+
+    def bare():
+        pass
+
+    results = {}
+    for name, function in (('bare call', bare), ('observe()', observe), ('time() block', timed)):
+        results[name] = timeit.timeit(function, number=number) / number * 1e9
+    return results
+
+
+def chat_microseconds(client, requests):
+    messages = [message.format(account=account_number_for(12)) for message in SAMPLE_MESSAGES]
+    started = time.perf_counter()
+    for i in range(requests):
+        client.post('/api/chat', json={'message': messages[i % len(messages)], 'session_id': f"bench-{i % 50}"})
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=200000, help='iterations of each microbenchmark')
+    parser.add_argument('--requests', type=int, default=4000, help='/api/chat requests per run')
+    args = parser.parse_args()
+
+    for name, nanoseconds in microbenchmarks(args.number).items():
+        print(f"{name:<14} {nanoseconds:8.0f} ns")
+
+    fake = FakeDatabaseManager(FakeLoanStore(1000), latency=0)
+    app.db_manager = app.chat_history_writer.db_manager = fake
+    app.llm_handler.enabled = False
+    client = app.app.test_client()
+
+    chat_microseconds(client, args.requests // 4)  # warm caches and sessions
+    timings = {}
+    # Alternate so drift (GC, CPU frequency) affects both settings alike
+    for _ in range(3):
+        for enabled in (False, True):
+            REGISTRY.enabled = enabled
+            timings.setdefault(enabled, []).append(chat_microseconds(client, args.requests))
+    REGISTRY.enabled = True
+
+    disabled, enabled = min(timings[False]), min(timings[True])
+    print(f"/api/chat, metrics disabled  {disabled:8.1f} us/request")
+    print(f"/api/chat, metrics enabled   {enabled:8.1f} us/request")
+    print(f"overhead                     {enabled - disabled:8.1f} us/request ({(enabled - disabled) / disabled:.1%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Microbenchmark: per-message cost of ChatBot.process_message routing
+
+Compares the original routing code (uncompiled re.findall calls, repeated
+lower(), keyword loop and twelve re.search calls) with message_router.route_message,
+after checking both produce the same routing on the sample corpus.
+
+Usage:
+    python benchmarks/bench_routing.py [--number N]
+"""
+import os
+import re
+import sys
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_router import route_message
+
+SAMPLE_MESSAGES = [
+    "hello",
+    "What are your interest rates?",
+    "check status of loan 1234 BHLPL0001234",
+    "my loan id is 42",
+    "account bhlpl987",
+    "When is my EMI due?",
+    "loan details please",
+    "how do I apply for a loan",
+    "thanks a lot, that was helpful",
+    "I want to track my loan 77 with account number BHLPL00077 and also know the due date",
+    "What documents do I need for a home loan application and how long does processing take?",
+    "bye",
+]
+
+
+def legacy_route(message):
+    """The routing block of ChatBot.process_message before message_router existed"""
+    loan_id_pattern = r'\b(\d+)\b'
+    account_pattern = r'\b(BHLPL\d+)\b'
+
+    loan_id_matches = re.findall(loan_id_pattern, message)
+    account_matches = re.findall(account_pattern, message.upper())
+
+    loan_status_keywords = ['status', 'emi', 'sanction', 'due date', 'details', 'track', 'check', 'loan']
+    status_patterns = [
+        r'check.*status',
+        r'what.*status',
+        r'loan.*status',
+        r'status.*loan',
+        r'track.*loan',
+        r'loan.*details',
+        r'emi.*details',
+        r'sanction.*details',
+        r'emi.*due.*date',
+        r'loan.*due.*date',
+        r'when.*emi.*due',
+        r'when.*loan.*due'
+    ]
+
+    has_status_keyword = any(keyword in message.lower() for keyword in loan_status_keywords)
+    has_status_pattern = any(re.search(pattern, message.lower()) for pattern in status_patterns)
+    return (has_status_keyword or has_status_pattern), loan_id_matches, account_matches
+
+
+def per_message_microseconds(function, number):
+    elapsed = timeit.timeit(lambda: [function(message) for message in SAMPLE_MESSAGES], number=number)
+    return elapsed / (number * len(SAMPLE_MESSAGES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=5000, help='passes over the sample corpus')
+    args = parser.parse_args()
+
+    for message in SAMPLE_MESSAGES:
+        assert tuple(route_message(message))[:3] == legacy_route(message), message
+
+    legacy = per_message_microseconds(legacy_route, args.number)
+    compiled = per_message_microseconds(route_message, args.number)
+    print(f"legacy routing:   {legacy:8.2f} us/message")
+    print(f"compiled routing: {compiled:8.2f} us/message")
+    print(f"speedup:          {legacy / compiled:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
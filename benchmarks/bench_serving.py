@@ -0,0 +1,127 @@
+"""
+Load benchmark: Flask (threaded WSGI) vs asgi_app (Quart under uvicorn)
+
+Both servers run the real routes against the fakes in benchmarks/fakes.py,
+which add a fixed latency to every Postgres query and Ollama generation.
+A pool of client threads then sends a mix of loan status lookups (/api/chat)
+and LLM fallbacks (/api/chat/stream) over keep-alive connections and the
+throughput and latency percentiles of each mode are reported.
+
+Usage:
+    python benchmarks/bench_serving.py [--mode wsgi|asgi|both] [--concurrency N]
+                                       [--requests N] [--db-latency S] [--llm-latency S]
+                                       [--json results.json]
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_workload(count, loan_count, stream_share, seed=7):
+    """Return (kind, method, path, body) requests: status lookups on random loans plus streamed LLM fallbacks"""
+    from benchmarks.fakes import account_number_for
+
+    rng = random.Random(seed)
+    workload = []
+    for i in range(count):
+        if rng.random() < stream_share:
+            body = {'message': f"summarise yesterday's cricket scores, match {i}"}
+            workload.append(('llm_stream', 'POST', '/api/chat/stream', body))
+        else:
+            loan_id = rng.randint(1, loan_count)
+            message = f"what is the status of loan {loan_id} account {account_number_for(loan_id)}"
+            workload.append(('status_lookup', 'POST', '/api/chat', {'message': message}))
+    return workload
+
+
+def start_wsgi(port, store, db_latency):
+    from werkzeug.serving import make_server
+    import app
+    from benchmarks.fakes import FakeDatabaseManager
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    fake_db = FakeDatabaseManager(store, db_latency)
+    app.db_manager = fake_db
+    app.chat_history_writer.db_manager = fake_db
+    app.chat_history_writer.start()
+
+    server = make_server('127.0.0.1', port, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown
+
+
+def start_asgi(port, store, db_latency):
+    import uvicorn
+    import asgi_app
+    from benchmarks.fakes import AsyncFakeDatabaseManager
+
+    fake_db = AsyncFakeDatabaseManager(store, db_latency)
+    asgi_app.db_manager = fake_db
+    asgi_app.chatbot.db = fake_db
+    asgi_app.chat_history_writer.db = fake_db
+
+    server = uvicorn.Server(uvicorn.Config(asgi_app.app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+    return stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mode', choices=['wsgi', 'asgi', 'both'], default='both')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--loans', type=int, default=5000)
+    parser.add_argument('--stream-share', type=float, default=0.2, help='fraction of requests that hit the LLM')
+    parser.add_argument('--db-latency', type=float, default=0.005, help='seconds per fake query')
+    parser.add_argument('--llm-latency', type=float, default=0.05, help='seconds before the fake LLM answers')
+    parser.add_argument('--ollama-port', type=int, default=11500, help='port for the fake Ollama server')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    # Must be set before app/config are imported (benchmarks.fakes imports app)
+    os.environ['OLLAMA_BASE_URL'] = f"http://127.0.0.1:{args.ollama_port}"
+    os.environ['LLM_CACHE_ENABLED'] = 'False'
+    os.environ['LLM_PROBE_INTERVAL'] = '0'
+    os.environ['LLM_MAX_INFLIGHT'] = str(args.concurrency)
+    os.environ['LLM_MAX_QUEUE'] = str(args.concurrency)
+
+    from benchmarks.fakes import FakeLoanStore, start_fake_ollama
+    from benchmarks.harness import run_load, save_results
+
+    start_fake_ollama(latency=args.llm_latency, port=args.ollama_port)
+
+    store = FakeLoanStore(args.loans)
+    workload = build_workload(args.requests, args.loans, args.stream_share)
+    modes = ['wsgi', 'asgi'] if args.mode == 'both' else [args.mode]
+    starters = {'wsgi': (start_wsgi, 5101), 'asgi': (start_asgi, 5102)}
+
+    results = {}
+    for mode in modes:
+        start, port = starters[mode]
+        stop = start(port, store, args.db_latency)
+        try:
+            run_load(port, workload[:args.concurrency], args.concurrency)  # warm-up
+            results[mode] = run_load(port, workload, args.concurrency)
+        finally:
+            stop()
+        r = results[mode]
+        print(f"{mode}: {r['throughput']:8.1f} req/s  p50 {r['p50_ms']:7.1f} ms  "
+              f"p95 {r['p95_ms']:7.1f} ms  p99 {r['p99_ms']:7.1f} ms  errors {r['errors']}")
+
+    if args.json:
+        save_results(args.json, 'bench_serving', args, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Microbenchmark suite for the per-message hot paths of app.py
+
+Times, per call:
+    find_best_intent   IntentHandler.find_best_intent over a mix of FAQ phrasings
+    routing            ChatBot.route (message_router plus the session slots)
+    decrypt_cold       decrypt_customer_id on tokens not yet memoized
+    decrypt_cached     decrypt_customer_id on memoized tokens
+    format_loan        ChatBot.format_loan_response on loans from the fake store
+
+and, under tracemalloc, the largest transient allocation of one call and the
+memory and blocks a call leaves behind. Results can be written to JSON and
+compared with an earlier run.
+
+Usage:
+    python benchmarks/bench_suite.py [--number N] [--json results.json] [--compare previous.json]
+"""
+import os
+import sys
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('LLM_PROBE_INTERVAL', '0')
+
+import app
+import chat_core
+from loan_record import LoanRecord
+from session_store import Session
+from benchmarks.fakes import FakeLoanStore, account_number_for, encrypt_customer_id
+from benchmarks.harness import measure_allocations, save_results, compare_results
+
+FAQ_MESSAGES = [
+    "hello",
+    "What are your interest rates?",
+    "how do I apply for a loan",
+    "what documents are needed",
+    "thanks a lot, that was helpful",
+    "can I pay my emi early",
+    "tell me something about foreclosure charges on my home loan",
+    "bye",
+]
+
+ROUTING_MESSAGES = FAQ_MESSAGES + [
+    "check status of loan 1234 BHLPL0001234",
+    "my loan id is 42",
+    "account bhlpl987",
+    "When is my EMI due?",
+    "I want to track my loan 77 with account number BHLPL00077 and also know the due date",
+]
+
+
+def per_call_microseconds(function, items, number):
+    elapsed = timeit.timeit(lambda: [function(item) for item in items], number=number)
+    return elapsed / (number * len(items)) * 1e6
+
+
+def benchmark(name, function, items, number, setup=None):
+    """Time function over items, then measure the allocations of one pass; setup runs before every pass"""
+    if setup is None:
+        seconds = per_call_microseconds(function, items, number)
+    else:
+        seconds = 0.0
+        for _ in range(number):
+            setup()
+            seconds += timeit.timeit(lambda: [function(item) for item in items], number=1)
+        seconds = seconds / (number * len(items)) * 1e6
+
+    def one_pass():
+        if setup is not None:
+            setup()
+        for item in items:
+            function(item)
+
+    allocations = measure_allocations(one_pass, calls=max(10, number // 100))
+    result = {'us_per_call': seconds}
+    result.update({key: value / len(items) if key != 'peak_kib' else value for key, value in allocations.items()})
+    return name, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000, help='passes over each sample')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    store = FakeLoanStore(200)
+    loans = [
+        LoanRecord(store.query(app.LOAN_SANCTION_QUERY, (loan_id, account_number_for(loan_id)))[0]).to_dict()
+        for loan_id in range(1, 51)
+    ]
+    tokens = [encrypt_customer_id(customer_id) for customer_id in range(1, 51)]
+    session = Session()
+    session.loan_id = '42'
+
+    suite = [
+        ('find_best_intent', app.intent_handler.find_best_intent, FAQ_MESSAGES, None),
+        ('routing', lambda message: app.chatbot.route(message, session), ROUTING_MESSAGES, None),
+        ('decrypt_cold', chat_core.decrypt_customer_id, tokens, chat_core._customer_id_cache.clear),
+        ('decrypt_cached', chat_core.decrypt_customer_id, tokens, None),
+        ('format_loan', app.chatbot.format_loan_response, loans, None),
+    ]
+
+    results = {}
+    for name, function, items, setup in suite:
+        _, results[name] = benchmark(name, function, items, args.number, setup)
+        r = results[name]
+        print(f"{name:<18} {r['us_per_call']:9.2f} us/call  peak {r['peak_kib']:7.1f} KiB  "
+              f"retained {r['retained_bytes_per_call']:7.1f} B/call  blocks {r['blocks_per_call']:6.2f}/call")
+
+    if args.json:
+        save_results(args.json, 'bench_suite', args, results)
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Microbenchmark: rendering the loan details reply
+
+Compares the original inline f-string of ChatBot.format_loan_response with the
+compiled replies/loan_details.md template, after checking both produce the same
+text on a sample of loans (ignoring the digit grouping of amounts and the
+surrounding whitespace the f-string carried). Also times format_inr against
+the plain f"{x:,.2f}" it replaces.
+
+Usage:
+    python benchmarks/bench_templates.py [--number N]
+"""
+import os
+import sys
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reply_templates import ReplyTemplates, format_inr
+
+REPLIES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'replies')
+
+
+def sample_loans(count=50):
+    return [{
+        'found': True,
+        'loan_id': n,
+        'loan_account_number': f"BHLPL{n:07d}",
+        'amount_sanctioned': 500000.0 + n * 1234.5,
+        'emi_amount': 12000.0 + n,
+        'emi_due_date': '2024-02-04',
+        'number_of_emis': 48,
+        'emi_start_date': '2024-01-05',
+        'emi_end_date': '2027-12-15',
+        'rate_of_interest': 9.5,
+        'interest_type': 'Fixed',
+        'status': 'active',
+        'loan_requested': 500000.0,
+        'payment_frequency': 'Monthly',
+        'repayment_mode': 'NACH',
+    } for n in range(1, count + 1)]
+
+
+def legacy_format_loan_response(loan_data):
+    """ChatBot.format_loan_response before reply templates existed"""
+    return f"""
+📄 **Loan Sanction Details**
+
+**Loan ID:** {loan_data['loan_id']}
+**Account Number:** {loan_data['loan_account_number']}
+**Status:** {loan_data['status'].upper()}
+
+💰 **Financial Details:**
+• **Amount Sanctioned:** ₹{loan_data['amount_sanctioned']:,.2f}
+• **Loan Requested:** ₹{loan_data['loan_requested']:,.2f}
+• **EMI Amount:** ₹{loan_data['emi_amount']:,.2f}
+• **Number of EMIs:** {loan_data['number_of_emis']}
+
+📅 **EMI Schedule:**
+• **EMI Due Date:** {loan_data['emi_due_date']}
+• **EMI Start Date:** {loan_data['emi_start_date']}
+• **EMI End Date:** {loan_data['emi_end_date']}
+• **Payment Frequency:** {loan_data['payment_frequency']}
+
+📊 **Loan Terms:**
+• **Interest Rate:** {loan_data['rate_of_interest']}%
+• **Interest Type:** {loan_data['interest_type']}
+• **Repayment Mode:** {loan_data['repayment_mode']}
+
+Is there anything else I can help you with regarding your loan?
+        """
+
+
+def normalized(text):
+    return text.replace(',', '').strip()
+
+
+def per_call_microseconds(function, items, number):
+    elapsed = timeit.timeit(lambda: [function(item) for item in items], number=number)
+    return elapsed / (number * len(items)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000, help='passes over the sample loans')
+    args = parser.parse_args()
+
+    templates = ReplyTemplates(REPLIES_DIR)
+    loans = sample_loans()
+
+    def compiled(loan_data):
+        return templates.render('loan_details', loan_data)
+
+    for loan in loans:
+        assert normalized(compiled(loan)) == normalized(legacy_format_loan_response(loan)), loan['loan_id']
+
+    legacy = per_call_microseconds(legacy_format_loan_response, loans, args.number)
+    template = per_call_microseconds(compiled, loans, args.number)
+    print(f"legacy f-string:   {legacy:8.2f} us/reply")
+    print(f"compiled template: {template:8.2f} us/reply")
+    print(f"speedup:           {legacy / template:8.2f}x")
+
+    amounts = [loan[field] for loan in loans for field in ('amount_sanctioned', 'emi_amount', 'loan_requested')]
+    western = per_call_microseconds(lambda amount: f"{amount:,.2f}", amounts, args.number)
+    indian = per_call_microseconds(format_inr, amounts, args.number)
+    print(f"f'{{x:,.2f}}':        {western:8.2f} us/amount")
+    print(f"format_inr:        {indian:8.2f} us/amount")
+
+
+if __name__ == '__main__':
+    main()
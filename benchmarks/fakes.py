@@ -0,0 +1,237 @@
+"""
+In-process stand-ins for Postgres and Ollama used by the serving benchmarks
+
+Each fake adds a fixed latency per call so the benchmarks measure how the
+serving modes overlap I/O waits, not how fast a real database happens to be.
+"""
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import threading
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+
+from chat_core import (
+    CUSTOMER_ID_SECRET_KEY, LOAN_SANCTION_QUERY, LOAN_SANCTION_BATCH_QUERY, CUSTOMER_CONTEXT_QUERY, CUSTOMER_LOANS_PAGE_QUERY,
+    CUSTOMER_LOANS_QUERY
+)
+from loan_record import LOAN_COLUMNS
+
+
+def account_number_for(loan_id):
+    return f"BHLPL{loan_id:07d}"
+
+
+def encrypt_customer_id(customer_id):
+    """The token the frontend sends for customer_id, as produced by Java EncryptionUtil"""
+    key = hashlib.sha256(CUSTOMER_ID_SECRET_KEY.encode('utf-8')).digest()[:16]
+    encrypted = AES.new(key, AES.MODE_ECB).encrypt(pad(str(customer_id).encode('utf-8'), AES.block_size))
+    return base64.urlsafe_b64encode(encrypted).decode('ascii')
+
+
+class FakeLoanStore:
+    """Synthetic lms_loan_saction rows keyed by (loan_id, account_number), one customer per loans_per_customer loans"""
+
+    def __init__(self, loan_count=5000, loans_per_customer=4):
+        self.loans = {}
+        self.loans_by_customer = {}
+        start = date(2024, 1, 5)
+        for loan_id in range(1, loan_count + 1):
+            row = {
+                'loan_id': loan_id,
+                'loan_account_number': account_number_for(loan_id),
+                'amount_sanctioned': 500000 + loan_id,
+                'emi_amount': 12000 + loan_id % 500,
+                'emi_due_date': start + timedelta(days=30),
+                'number_of_emis': 48,
+                'emi_start_date': start,
+                'emi_end_date': start + timedelta(days=48 * 30),
+                'rate_of_interest': 9.5,
+                'interest_type': 'Fixed',
+                'status': 'Active',
+                'loan_requested': 500000,
+                'payment_freqmuency': 'Monthly',
+                'repayment_mode': 'NACH',
+            }
+            self.loans[(str(loan_id), row['loan_account_number'])] = row
+            customer_loans = self.loans_by_customer.setdefault(loan_id // loans_per_customer, [])
+            customer_loans.append(dict(row, application_reference_id=f"APP{loan_id:07d}"))
+
+    def query(self, query, params):
+        """Answer the loan queries with positional rows, as the prepared-statement paths expect"""
+        if query == LOAN_SANCTION_QUERY:
+            row = self.loans.get((str(params[0]), str(params[1])))
+            return [self._loan_tuple(row)] if row else []
+        if query == LOAN_SANCTION_BATCH_QUERY:
+            pairs = [(loan_id, account_number) for loan_id, account_number in zip(*params) if (loan_id, account_number) in self.loans]
+            return [pair + self._loan_tuple(self.loans[pair]) for pair in pairs]
+        if query == CUSTOMER_CONTEXT_QUERY:
+            customer_id, _, limit = params
+            name = ('Test', f"Customer{customer_id}")
+            loans = self.loans_by_customer.get(customer_id, [])
+            if not loans:
+                return [name + (None,) * (len(LOAN_COLUMNS) + 2)]
+            return [name + self._customer_loan_tuple(loan) + (len(loans),) for loan in loans[:limit]]
+        if query == CUSTOMER_LOANS_PAGE_QUERY:
+            customer_id, after_loan_id, limit = params
+            loans = [loan for loan in self.loans_by_customer.get(customer_id, []) if loan['loan_id'] > after_loan_id]
+            return [self._customer_loan_tuple(loan) for loan in loans[:limit]]
+        if query == CUSTOMER_LOANS_QUERY:
+            return [self._customer_loan_tuple(loan) for loan in self.loans_by_customer.get(params[0], [])]
+        return []
+
+    @classmethod
+    def _customer_loan_tuple(cls, loan):
+        return cls._loan_tuple(loan) + (loan['application_reference_id'],)
+
+    @staticmethod
+    def _loan_tuple(row):
+        return tuple(row[column] for column in LOAN_COLUMNS)
+
+
+class FakeDatabaseManager:
+    """Drop-in for app.DatabaseManager; latency is slept on the calling thread like a blocking driver"""
+
+    def __init__(self, store=None, latency=0.005):
+        self.store = store or FakeLoanStore()
+        self.latency = latency
+        self.queries = 0
+        self.rows_written = 0
+        self._lock = threading.Lock()
+
+    def connect(self):
+        return True
+
+    def close(self):
+        pass
+
+    def execute_query(self, query, params=None):
+        time.sleep(self.latency)
+        with self._lock:
+            self.queries += 1
+        return []
+
+    def execute_prepared(self, query, params=()):
+        time.sleep(self.latency)
+        with self._lock:
+            self.queries += 1
+        return self.store.query(query, params)
+
+    def execute_write(self, query, params=None):
+        time.sleep(self.latency)
+        with self._lock:
+            self.queries += 1
+        return 1
+
+    def iter_query(self, query, params=None, itersize=None):
+        yield from self.execute_prepared(query, params)
+
+    # One fake database: replica reads are primary reads
+    execute_read = execute_prepared
+    iter_read = iter_query
+
+    def execute_values(self, query, rows, page_size=100):
+        time.sleep(self.latency)
+        with self._lock:
+            self.rows_written += len(rows)
+        return len(rows)
+
+    def get_pool_stats(self):
+        return {'queries': self.queries, 'rows_written': self.rows_written}
+
+
+class AsyncFakeDatabaseManager:
+    """Drop-in for asgi_app.AsyncDatabaseManager; latency is awaited so other requests keep running"""
+
+    def __init__(self, store=None, latency=0.005):
+        self.store = store or FakeLoanStore()
+        self.latency = latency
+        self.queries = 0
+        self.rows_written = 0
+
+    async def connect(self):
+        return True
+
+    async def close(self):
+        pass
+
+    async def fetch(self, query, params=None):
+        await asyncio.sleep(self.latency)
+        self.queries += 1
+        return []
+
+    async def fetch_prepared(self, query, params=None):
+        await asyncio.sleep(self.latency)
+        self.queries += 1
+        return self.store.query(query, params)
+
+    async def iter_query(self, query, params=None, itersize=None):
+        for row in await self.fetch_prepared(query, params):
+            yield row
+
+    # One fake database: replica reads are primary reads
+    fetch_read = fetch_prepared
+    iter_read = iter_query
+
+    async def executemany(self, query, rows):
+        await asyncio.sleep(self.latency)
+        self.rows_written += len(rows)
+        return len(rows)
+
+
+class _FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    words = ['EMI ', 'means ', 'equated ', 'monthly ', 'instalment.']
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._send_json({'models': [{'name': self.server.model_name}]})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.server.lock:
+            self.server.calls += 1
+        time.sleep(self.server.latency)
+        if not payload.get('stream'):
+            self._send_json({'response': ''.join(self.words), 'done': True})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        chunks = [{'response': word, 'done': False} for word in self.words] + [{'response': '', 'done': True}]
+        for chunk in chunks:
+            line = (json.dumps(chunk) + '\n').encode('utf-8')
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+            self.wfile.flush()
+            time.sleep(self.server.token_interval)
+        self.wfile.write(b'0\r\n\r\n')
+
+
+def start_fake_ollama(latency=0.05, token_interval=0.005, model_name='llama3:latest', port=0):
+    """Serve /api/tags and /api/generate on 127.0.0.1; returns the server (server.calls counts generations)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), _FakeOllamaHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.token_interval = token_interval
+    server.model_name = model_name
+    server.calls = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
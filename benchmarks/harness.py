@@ -0,0 +1,185 @@
+"""
+Shared pieces of the benchmark scripts: latency percentiles, the HTTP load
+runner, allocation measurement and the JSON result files
+
+Result files carry the arguments, the environment (Python, platform, git
+commit) and the results, so two runs of the same script can be compared with
+--compare previous.json.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import threading
+import subprocess
+import tracemalloc
+import http.client
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def latency_summary(latencies):
+    """Count and p50/p95/p99/max in milliseconds of a list of seconds"""
+    latencies = sorted(latencies)
+    return {
+        'count': len(latencies),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+def run_load(port, workload, concurrency):
+    """
+    Send workload from concurrency client threads over keep-alive connections
+
+    Args:
+        workload: (label, method, path, JSON body or None) tuples; latencies are
+            also summarized per label
+
+    Returns:
+        Dict with requests, errors, elapsed, throughput, the overall latency
+        summary and a per-label one under 'by_label'
+    """
+    local = threading.local()
+
+    def send(item):
+        label, method, path, body = item
+        connection = getattr(local, 'connection', None)
+        if connection is None:
+            connection = local.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        payload = json.dumps(body) if body is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, payload, headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            local.connection = None
+            ok = False
+        return label, time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, workload))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for _, latency, ok in results if ok]
+    by_label = {}
+    for label, latency, ok in results:
+        if ok:
+            by_label.setdefault(label, []).append(latency)
+    summary = {
+        'requests': len(results),
+        'errors': sum(1 for _, _, ok in results if not ok),
+        'elapsed': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+    }
+    summary.update(latency_summary(latencies))
+    summary['by_label'] = {label: latency_summary(values) for label, values in sorted(by_label.items())}
+    return summary
+
+
+def measure_allocations(function, calls):
+    """
+    Memory allocated by function() under tracemalloc
+
+    Returns:
+        peak_kib: Largest transient allocation of a single call above the
+            memory in use before it (temporaries that are freed again)
+        retained_bytes_per_call: Growth in traced memory over all calls,
+            divided by calls (what caches and leaks keep)
+        blocks_per_call: Growth in allocated blocks, divided by calls
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        function()  # first call fills lazily built state outside the measurement
+        start_current, _ = tracemalloc.get_traced_memory()
+        start_blocks = sys.getallocatedblocks()
+        peak = 0
+        for _ in range(calls):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            function()
+            _, call_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, call_peak - before)
+        end_current, _ = tracemalloc.get_traced_memory()
+        end_blocks = sys.getallocatedblocks()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return {
+        'peak_kib': peak / 1024,
+        'retained_bytes_per_call': (end_current - start_current) / calls,
+        'blocks_per_call': (end_blocks - start_blocks) / calls,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPOSITORY, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def save_results(path, benchmark, args, results):
+    document = {
+        'benchmark': benchmark,
+        'environment': environment(),
+        'args': vars(args),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2, default=str)
+
+
+def _flatten(value, prefix=''):
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+
+def compare_results(previous_path, results):
+    """Print every numeric result next to the same one in an earlier result file"""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = json.load(f)
+    before = _flatten(previous.get('results', {}))
+    after = _flatten(results)
+    commit = previous.get('environment', {}).get('commit') or 'unknown commit'
+    print(f"\nchange against {previous_path} ({commit}):")
+    for key, value in after.items():
+        if key not in before:
+            continue
+        old = before[key]
+        change = f"{(value - old) / old:+8.1%}" if old else '     n/a'
+        print(f"  {key:<48} {old:12.2f} -> {value:12.2f}  {change}")
@@ -0,0 +1,126 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Sentinel returned by TTLCache.get on a miss so that None can be cached
+MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=300.0, negative_ttl=None, clock=time.monotonic):
+        """
+        Thread-safe in-process cache with per-entry TTL and LRU eviction
+
+        Args:
+            maxsize: Maximum number of entries; the least recently used entry is evicted beyond this
+            ttl: Default seconds an entry stays valid (None for no expiry)
+            negative_ttl: Seconds a negative result stays valid when stored with negative=True
+            clock: Time source; pass time.time for caches whose entries are persisted across restarts
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.clock = clock
+
+        self._data = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+
+    def get(self, key, default=MISSING):
+        """Return the cached value for key, or default if absent or expired"""
+        now = self.clock()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                del self._data[key]
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl=None, negative=False):
+        """
+        Store value under key
+
+        Args:
+            ttl: Overrides the default TTL for this entry
+            negative: Use negative_ttl, for "not found" results that should be re-checked sooner
+        """
+        if ttl is None:
+            ttl = self.negative_ttl if negative else self.ttl
+        expires_at = None if ttl is None else self.clock() + ttl
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, key):
+        """Drop a single key; returns True if it was cached"""
+        with self._lock:
+            if self._data.pop(key, None) is None:
+                return False
+            self.stats['invalidations'] += 1
+            return True
+
+    def invalidate_where(self, predicate):
+        """Drop every entry for which predicate(key, value) is true; returns the number dropped"""
+        with self._lock:
+            keys = [key for key, (value, _) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+            self.stats['invalidations'] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.stats['invalidations'] += len(self._data)
+            self._data.clear()
+
+    def dump(self):
+        """Return unexpired (key, value, expires_at) triples, least recently used first"""
+        now = self.clock()
+        with self._lock:
+            return [
+                (key, value, expires_at) for key, (value, expires_at) in self._data.items()
+                if expires_at is None or expires_at > now
+            ]
+
+    def load(self, entries):
+        """Insert (key, value, expires_at) triples produced by dump(), skipping expired ones"""
+        now = self.clock()
+        with self._lock:
+            for key, value, expires_at in entries:
+                if expires_at is None or expires_at > now:
+                    self._data[key] = (value, expires_at)
+                    self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._data)
+            stats['maxsize'] = self.maxsize
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,506 @@
+"""
+Pieces shared by app.py (Flask) and asgi_app.py (Quart)
+
+Configuration, the customer_id decryption, the loan queries, row decoding and
+reply rendering: nothing here opens a connection or starts a thread, so each
+serving mode builds its own pools, LLM client, intent catalogue and session
+store from the factories below and imports only this module from the other.
+"""
+import os
+import base64
+import hashlib
+import hmac
+from collections import namedtuple
+
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import unpad
+
+from config import config
+from cache import TTLCache, MISSING
+from loan_record import LoanRecord
+from reply_templates import FORMAT_EXTENSIONS
+from intent_catalogue import CatalogueWatcher
+from answer_pipeline import AnswerPipeline
+from session_store import SessionStore
+from message_router import route_message
+from metrics import STAGE_SECONDS
+
+# Connection settings (DB_CONFIG, from the DB_* environment variables), pool
+# sizing and timeouts come from the active config class
+current_config = config.get(os.environ.get('FLASK_ENV', 'development'), config['default'])
+
+# The AES key matches Java EncryptionUtil: first 16 bytes of SHA-256(secret).
+# It is derived once here; ECB keeps no chaining state, so one cipher object
+# can be shared by all request threads.
+CUSTOMER_ID_SECRET_KEY = "encryptionNarveePayload"
+_customer_id_key = hashlib.sha256(CUSTOMER_ID_SECRET_KEY.encode('utf-8')).digest()[:16]
+_customer_id_cipher = AES.new(_customer_id_key, AES.MODE_ECB)
+
+# token -> customer_id, or _DECRYPTION_FAILED so bad tokens are not retried
+_customer_id_cache = TTLCache(maxsize=current_config.CUSTOMER_ID_CACHE_SIZE, ttl=None)
+_DECRYPTION_FAILED = object()
+
+def decrypt_customer_id(encrypted_data: str) -> int:
+    """
+    Decrypt the encrypted customer_id using AES with the same key and method as Java EncryptionUtil.
+    Results (including failures) are memoized per token.
+    """
+    cached = _customer_id_cache.get(encrypted_data)
+    if cached is _DECRYPTION_FAILED:
+        raise ValueError("Invalid encrypted customer_id")
+    if cached is not MISSING:
+        return cached
+
+    try:
+        # Decode URL-safe base64
+        encrypted_bytes = base64.urlsafe_b64decode(encrypted_data)
+        decrypted_bytes = _customer_id_cipher.decrypt(encrypted_bytes)
+        # Unpad decrypted bytes (PKCS7)
+        decrypted_bytes = unpad(decrypted_bytes, AES.block_size)
+        decrypted_str = decrypted_bytes.decode('utf-8')
+        customer_id = int(decrypted_str)
+    except Exception as e:
+        print(f"Decryption error: {e}")
+        _customer_id_cache.set(encrypted_data, _DECRYPTION_FAILED)
+        raise ValueError("Invalid encrypted customer_id")
+
+    _customer_id_cache.set(encrypted_data, customer_id)
+    return customer_id
+
+def resolve_customer_id(customer_id):
+    """
+    Decrypt a customer_id token, returning None instead of raising for invalid tokens
+    """
+    try:
+        with STAGE_SECONDS.time('decrypt'):
+            return decrypt_customer_id(customer_id)
+    except ValueError as e:
+        print(f"Error decrypting customer_id: {e}")
+        return None
+
+# Loan queries select the lms_loan_saction columns in loan_record.LOAN_COLUMNS
+# order; rows are decoded by position into LoanRecords
+LOAN_SANCTION_QUERY = """
+        SELECT
+            loan_id,
+            loan_account_number,
+            amount_sanctioned,
+            emi_amount,
+            emi_due_date,
+            number_of_emis,
+            emi_start_date,
+            emi_end_date,
+            rate_of_interest,
+            interest_type,
+            status,
+            loan_requested,
+            payment_freqmuency,
+            repayment_mode
+        FROM loancraft.lms_loan_saction
+        WHERE loan_id = %s AND loan_account_number = %s
+        """
+
+# One round trip for a whole batch. The requested (loan_id, account_number)
+# pairs are joined in SQL and echoed in front of the LOAN_COLUMNS, so each row
+# is keyed by the ids the client sent. loan_id gets the same integer coercion
+# LOAN_SANCTION_QUERY's parameter gets ('007' finds loan 7); a pair whose
+# loan_id is not an integer matches nothing instead of failing the batch.
+LOAN_SANCTION_BATCH_QUERY = """
+        SELECT
+            k.loan_id,
+            k.account_number,
+            s.loan_id,
+            s.loan_account_number,
+            s.amount_sanctioned,
+            s.emi_amount,
+            s.emi_due_date,
+            s.number_of_emis,
+            s.emi_start_date,
+            s.emi_end_date,
+            s.rate_of_interest,
+            s.interest_type,
+            s.status,
+            s.loan_requested,
+            s.payment_freqmuency,
+            s.repayment_mode
+        FROM unnest(%s::text[], %s::text[]) AS k(loan_id, account_number)
+        JOIN loancraft.lms_loan_saction s
+          ON s.loan_id = CASE WHEN k.loan_id ~ '^[[:space:]]*[+-]?[0-9]{1,18}[[:space:]]*$' THEN k.loan_id::bigint END
+         AND s.loan_account_number = k.account_number
+        """
+
+# Name, loan count and first page of loans of a signed-in customer in one
+# round trip. Params: customer id, customer id, page size. Joining both sides
+# to a one-row subquery keeps the loans when lms_customers_info has no row,
+# and the name when the customer has no sanctioned loans yet.
+CUSTOMER_CONTEXT_QUERY = """
+        SELECT
+            c.first_name,
+            c.last_name,
+            l.loan_id,
+            l.loan_account_number,
+            l.amount_sanctioned,
+            l.emi_amount,
+            l.emi_due_date,
+            l.number_of_emis,
+            l.emi_start_date,
+            l.emi_end_date,
+            l.rate_of_interest,
+            l.interest_type,
+            l.status,
+            l.loan_requested,
+            l.payment_freqmuency,
+            l.repayment_mode,
+            l.application_reference_id,
+            l.loan_count
+        FROM (SELECT 1) k
+        LEFT JOIN loancraft.lms_customers_info c ON c.customer_id = %s
+        LEFT JOIN (
+            SELECT s.*, a.application_reference_id, count(*) OVER () AS loan_count
+            FROM loancraft.lms_loan_saction s
+            JOIN loancraft.lms_applications a ON a.loan_id = s.loan_id
+            WHERE a.customer_id = %s
+            ORDER BY s.loan_id
+            LIMIT %s
+        ) l ON true
+        ORDER BY l.loan_id
+        """
+
+# Keyset pagination over a customer's loans: the page after a given loan_id
+CUSTOMER_LOANS_PAGE_QUERY = """
+        SELECT
+            s.loan_id,
+            s.loan_account_number,
+            s.amount_sanctioned,
+            s.emi_amount,
+            s.emi_due_date,
+            s.number_of_emis,
+            s.emi_start_date,
+            s.emi_end_date,
+            s.rate_of_interest,
+            s.interest_type,
+            s.status,
+            s.loan_requested,
+            s.payment_freqmuency,
+            s.repayment_mode,
+            a.application_reference_id
+        FROM loancraft.lms_loan_saction s
+        JOIN loancraft.lms_applications a ON a.loan_id = s.loan_id
+        WHERE a.customer_id = %s AND s.loan_id > %s
+        ORDER BY s.loan_id
+        LIMIT %s
+        """
+
+# Every loan of a customer, read through a server-side cursor
+CUSTOMER_LOANS_QUERY = """
+        SELECT
+            s.loan_id,
+            s.loan_account_number,
+            s.amount_sanctioned,
+            s.emi_amount,
+            s.emi_due_date,
+            s.number_of_emis,
+            s.emi_start_date,
+            s.emi_end_date,
+            s.rate_of_interest,
+            s.interest_type,
+            s.status,
+            s.loan_requested,
+            s.payment_freqmuency,
+            s.repayment_mode,
+            a.application_reference_id
+        FROM loancraft.lms_loan_saction s
+        JOIN loancraft.lms_applications a ON a.loan_id = s.loan_id
+        WHERE a.customer_id = %s
+        ORDER BY s.loan_id
+        """
+
+def loan_records_by_key(rows):
+    """
+    Decode LOAN_SANCTION_BATCH_QUERY rows into {(loan_id, account_number): LoanRecord},
+    keyed by the requested ids like loan_cache; the first row per pair wins, as
+    in the single lookup
+    """
+    records = {}
+    for row in rows:
+        records.setdefault((row[0], row[1]), LoanRecord(row, offset=2))
+    return records
+
+def loan_batch_params(keys):
+    """LOAN_SANCTION_BATCH_QUERY parameters for (loan_id, account_number) string pairs"""
+    return [loan_id for loan_id, _ in keys], [account_number for _, account_number in keys]
+
+def parse_loan_batch(data, max_size):
+    """
+    Validate a /api/loan-details/batch body of the form
+    {"loans": [{"loan_id": ..., "account_number": ...} or [loan_id, account_number], ...]}
+
+    Returns:
+        (list of (loan_id, account_number) string pairs, None) or (None, error message)
+    """
+    loans = data.get('loans') if isinstance(data, dict) else None
+    if not isinstance(loans, list) or not loans:
+        return None, 'loans must be a non-empty list'
+    if len(loans) > max_size:
+        return None, f'At most {max_size} loans can be requested at once'
+
+    pairs = []
+    for item in loans:
+        if isinstance(item, dict):
+            item = (item.get('loan_id'), item.get('account_number'))
+        if not isinstance(item, (list, tuple)) or len(item) != 2 or None in item:
+            return None, 'Each loan needs a loan_id and an account_number'
+        pairs.append((str(item[0]), str(item[1])))
+    return pairs, None
+
+def split_cached_loans(cache, keys):
+    """
+    Returns ({key: cached LoanRecord or None}, [keys to query]) for the distinct keys
+    """
+    found = {}
+    missing = []
+    for key in dict.fromkeys(keys):
+        cached = cache.get(key)
+        if cached is MISSING:
+            missing.append(key)
+        else:
+            found[key] = cached
+    return found, missing
+
+def store_loan_batch(cache, missing, rows, found):
+    """
+    Add the batch query result for the missing keys to found and to the cache
+    (rows is None when the query failed; those keys are reported but not cached)
+    """
+    if rows is None:
+        return
+    records_by_key = loan_records_by_key(rows)
+    for key in missing:
+        record = records_by_key.get(key)
+        cache.set(key, record, negative=record is None)
+        found[key] = record
+
+def assemble_loan_batch(keys, found):
+    """
+    Batch results in request order; unknown loans echo the requested ids
+    """
+    results = []
+    for loan_id, account_number in keys:
+        record = found.get((loan_id, account_number))
+        if record is not None:
+            results.append(record.to_dict())
+        else:
+            results.append({'found': False, 'loan_id': loan_id, 'loan_account_number': account_number})
+    return results
+
+def customer_name_from_row(customer):
+    """
+    Full name from a row starting with (first_name, last_name)
+    """
+    first_name = customer[0] or ''
+    last_name = customer[1] or ''
+    return f"{first_name} {last_name}".strip()
+
+# What the chat and welcome paths need to know about a signed-in customer;
+# loans holds only the first page, loan_count is the customer's total
+CustomerContext = namedtuple('CustomerContext', ['name', 'loans', 'loan_count'])
+
+# One page of a customer's loans: offset is how many loans came before it
+LoanPage = namedtuple('LoanPage', ['loans', 'offset', 'total'])
+
+def customer_context_from_rows(rows):
+    """
+    Build a CustomerContext from CUSTOMER_CONTEXT_QUERY rows; name is None when
+    lms_customers_info has no row, loans is a tuple of LoanRecords
+    """
+    name = None
+    if rows and (rows[0][0] is not None or rows[0][1] is not None):
+        name = customer_name_from_row(rows[0])
+    loans = tuple(LoanRecord(row, offset=2, with_reference=True) for row in rows if row[2] is not None)
+    loan_count = (rows[0][-1] or 0) if rows else 0
+    return CustomerContext(name, loans, loan_count)
+
+def reply_format_error(fmt):
+    """Error message for an unknown ?format= value, or None"""
+    if fmt not in FORMAT_EXTENSIONS:
+        return f"format must be one of: {', '.join(FORMAT_EXTENSIONS)}"
+    return None
+
+def emi_details_body(loan_details):
+    """Body for /api/emi-details: the EMI fields of a loan dict"""
+    if not loan_details['found']:
+        return {'found': False}
+    return {
+        'found': True,
+        'loan_id': loan_details['loan_id'],
+        'account_number': loan_details['loan_account_number'],
+        'emi_amount': loan_details['emi_amount'],
+        'emi_due_date': loan_details['emi_due_date'],
+        'number_of_emis': loan_details['number_of_emis'],
+        'emi_start_date': loan_details['emi_start_date'],
+        'emi_end_date': loan_details['emi_end_date']
+    }
+
+def loan_record_dict(record):
+    """The API dict for a get_loan_record result"""
+    return record.to_dict() if isinstance(record, LoanRecord) else {'found': False}
+
+def loan_etag(record, variant):
+    """
+    ETag for a loan route's body: the sanction row's digest plus which route
+    (and, for rendered replies, format and template version) produced it.
+    None when the lookup failed, so nothing is cached or validated.
+    """
+    if record is MISSING:
+        return None
+    return f"{record.digest if record is not None else 'none'}-{variant}"
+
+# Lookups a loan status inquiry can need (see status_lookup)
+LOOKUP_LOAN = 'loan'
+LOOKUP_CUSTOMER_LOANS = 'customer_loans'
+
+def status_lookup(routing, session_id=None):
+    """
+    Decide which database lookup, if any, a status inquiry needs:
+    LOOKUP_LOAN, LOOKUP_CUSTOMER_LOANS or None (reply asks for missing details)
+    """
+    if routing.loan_ids and routing.account_numbers:
+        return LOOKUP_LOAN
+    if not routing.loan_ids and not routing.account_numbers and session_id:
+        return LOOKUP_CUSTOMER_LOANS
+    return None
+
+def admin_authorized(token):
+    """True if token matches ADMIN_TOKEN; admin routes are off while ADMIN_TOKEN is empty"""
+    expected = current_config.ADMIN_TOKEN
+    return bool(expected) and hmac.compare_digest((token or '').encode(), expected.encode())
+
+def create_intent_watcher(intent_handler):
+    """Watcher that reloads intent_handler when its intent files change (not started)"""
+    return CatalogueWatcher(intent_handler.intents_dir, intent_handler.reload, current_config.INTENTS_RELOAD_INTERVAL)
+
+def create_answer_pipeline(intent_handler):
+    """FAQ answers: exact pattern, then the intent index, then the LLM"""
+    return AnswerPipeline(
+        intent_handler,
+        budget=current_config.ANSWER_BUDGET,
+        tier_budgets={
+            'exact': current_config.ANSWER_EXACT_BUDGET_MS / 1000,
+            'index': current_config.ANSWER_INDEX_BUDGET_MS / 1000,
+            'llm': current_config.ANSWER_LLM_BUDGET,
+        },
+        llm_min_budget=current_config.ANSWER_LLM_MIN_BUDGET
+    )
+
+def create_session_store():
+    """Per-conversation slots and recent turns, expired after SESSION_TIMEOUT of inactivity"""
+    return SessionStore(
+        ttl=current_config.SESSION_TIMEOUT,
+        max_bytes=current_config.SESSION_STORE_MAX_BYTES,
+        max_turns=current_config.SESSION_MAX_TURNS,
+        turn_chars=current_config.SESSION_TURN_CHARS
+    )
+
+def route(message, session=None):
+    """
+    Loan IDs, account numbers and status keywords are all picked up in one
+    pass of a precompiled regex (see message_router); ids the session is
+    still holding from an earlier message complete the inquiry
+    """
+    with STAGE_SECONDS.time('routing'):
+        routing = route_message(message)
+    return session.fill(routing) if session is not None else routing
+
+class ReplyRenderer:
+    """
+    Replies built from the reply templates and already-fetched data (no I/O),
+    so both serving modes render the same text after their own lookups
+    """
+
+    def __init__(self, templates):
+        self.templates = templates
+
+    def format_loan_response(self, loan_data, fmt='markdown'):
+        """
+        Format loan data into a user-friendly response (see replies/loan_details.*)
+        """
+        return self.templates.render('loan_details', loan_data, fmt)
+
+    def iter_loan_summary(self, page, fmt='markdown'):
+        """
+        Yield the summary reply for a page of a customer's loans piece by piece,
+        so the reply is joined once (or streamed) instead of grown with +=
+        """
+        first = page.offset + 1
+        last = page.offset + len(page.loans)
+        yield self.templates.render('loan_summary_header', {'first': first, 'last': last, 'total': page.total}, fmt) + "\n\n"
+        for loan in page.loans:
+            yield self.templates.render('loan_summary_line', loan.to_dict(), fmt) + "\n"
+        yield "\n"
+        if last < page.total:
+            yield self.templates.render('loan_summary_more', None, fmt) + "\n"
+        yield self.templates.render('loan_summary_footer', None, fmt) + "\n"
+
+    def loan_details_reply(self, loan_details, fmt):
+        """
+        Body for /api/loan-details?format=...: the loan rendered with the reply
+        templates, or the not-found dict unchanged. Returns (body, error).
+        """
+        error = reply_format_error(fmt)
+        if error:
+            return None, error
+        if not loan_details.get('found'):
+            return loan_details, None
+        return {'found': True, 'format': fmt, 'reply': self.templates.render('loan_details', loan_details, fmt)}, None
+
+    def rendered_variant(self, fmt):
+        return f"details.{fmt}.{self.templates.version}"
+
+    def render_status_response(self, routing, lookup, loan_details=None, page=None):
+        """
+        The status reply for a lookup's results, joined into one string
+        """
+        return ''.join(self.iter_rendered_status(routing, lookup, loan_details, page))
+
+    def iter_rendered_status(self, routing, lookup, loan_details=None, page=None):
+        """
+        Generator behind render_status_response; a multi-loan summary is
+        yielded line by line
+        """
+        if lookup == LOOKUP_CUSTOMER_LOANS and page and page.total > 1:
+            if page.loans:
+                yield from self.iter_loan_summary(page)
+            else:
+                yield self.templates.render('loans_all_shown', {'total': page.total})
+            return
+        yield self.render_single_status(routing, lookup, loan_details, page)
+
+    def render_single_status(self, routing, lookup, loan_details=None, page=None):
+        """
+        Replies that are a single block: one loan's details or a request for missing ids
+        """
+        loan_id_matches = routing.loan_ids
+        account_matches = routing.account_numbers
+        
+        # If both loan ID and account number are provided
+        if lookup == LOOKUP_LOAN:
+            if loan_details['found']:
+                response = self.format_loan_response(loan_details)
+            else:
+                response = self.templates.render(
+                    'loan_not_found', {'loan_id': loan_id_matches[0], 'account_number': account_matches[0]}
+                )
+        # If no loan ID/account number, the loans were fetched for the customer in session
+        elif lookup == LOOKUP_CUSTOMER_LOANS:
+            if page and page.loans:
+                response = self.format_loan_response(page.loans[0].to_dict()) + "\n\n"
+            else:
+                response = self.templates.render('no_loans')
+        # If partial info provided
+        elif loan_id_matches and not account_matches:
+            response = self.templates.render('missing_account_number', {'loan_id': loan_id_matches[0]})
+        elif account_matches and not loan_id_matches:
+            response = self.templates.render('missing_loan_id', {'account_number': account_matches[0]})
+        else:
+            response = self.templates.render('missing_ids')
+        return response
@@ -0,0 +1,145 @@
+import time
+import queue
+import atexit
+import logging
+import threading
+
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+INSERT_CHAT_HISTORY = """
+INSERT INTO chat_history (user_message, bot_response, session_id)
+VALUES %s
+"""
+
+
+class ChatHistoryWriter:
+    def __init__(self, db_manager, max_queue_size=10000, batch_size=200,
+                 flush_interval=1.0, enqueue_timeout=0.05):
+        """
+        Write-behind buffer for chat_history rows
+
+        Rows are queued by request threads and inserted by a single background
+        worker as multi-row INSERTs, flushed when batch_size rows are pending or
+        flush_interval seconds have passed, whichever comes first.
+
+        Args:
+            db_manager: DatabaseManager used for the batched INSERTs
+            max_queue_size: Rows buffered before producers are back-pressured
+            batch_size: Maximum rows per INSERT statement
+            flush_interval: Maximum seconds a row waits before being flushed
+            enqueue_timeout: Seconds a producer waits on a full queue before the row is dropped
+        """
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._exit_hook = False  # stop() registered with atexit
+
+        self.stats = {
+            'enqueued': 0,
+            'flushed': 0,
+            'dropped': 0,
+            'failed': 0,
+            'batches': 0,
+        }
+
+    def start(self):
+        """Start the background worker (idempotent)"""
+        with self._start_lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stop.clear()
+            self._worker = threading.Thread(target=self._run, name='chat-history-writer', daemon=True)
+            self._worker.start()
+            if not self._exit_hook:
+                atexit.register(self.stop)
+                self._exit_hook = True
+
+    def submit(self, user_message, bot_response, session_id=None):
+        """
+        Queue one chat_history row without touching the database
+
+        Returns:
+            True if the row was queued, False if it was dropped because the queue stayed full
+        """
+        if self._worker is None:
+            self.start()
+        try:
+            self._queue.put((user_message, bot_response, session_id), timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._increment('dropped')
+            return False
+        self._increment('enqueued')
+        return True
+
+    def _increment(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _drain_batch(self, first_row):
+        batch = [first_row]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch):
+        with STAGE_SECONDS.time('chat_history_insert'):
+            rowcount = self.db_manager.execute_values(INSERT_CHAT_HISTORY, batch, page_size=self.batch_size)
+        if rowcount is None:
+            self._increment('failed', len(batch))
+            logger.error(f"Dropped {len(batch)} chat_history rows after a failed batch insert")
+        else:
+            self._increment('flushed', len(batch))
+            self._increment('batches')
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first_row = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._write_batch(self._drain_batch(first_row))
+        self.flush()
+
+    def flush(self):
+        """Synchronously write everything currently queued"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                batch = []
+        if batch:
+            self._write_batch(batch)
+
+    def stop(self, timeout=10.0):
+        """Stop the worker after flushing pending rows"""
+        self._stop.set()
+        worker = self._worker
+        if worker is not None and worker.is_alive() and worker is not threading.current_thread():
+            worker.join(timeout)
+        self.flush()
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['queued'] = self._queue.qsize()
+        return stats
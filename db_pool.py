@@ -0,0 +1,241 @@
+import re
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+_PLACEHOLDER_RE = re.compile(r'%s')
+
+
+class PreparedStatementConnection(psycopg2.extensions.connection):
+    """
+    psycopg2 connection that remembers which queries it has PREPAREd
+
+    Prepared statements live as long as the server session, so each pooled
+    connection prepares a query once and afterwards only sends EXECUTE with
+    the parameters, skipping parse and plan on every later call.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = {}  # query text -> statement name
+
+    def execute_prepared(self, cursor, query, params):
+        """Run query (with %s placeholders) on cursor as a prepared statement"""
+        name = self.prepared.get(query)
+        if name is None:
+            name = f"stmt_{len(self.prepared) + 1}"
+            counter = iter(range(1, len(params) + 1))
+            statement = _PLACEHOLDER_RE.sub(lambda match: f"${next(counter)}", query)
+            cursor.execute(f"PREPARE {name} AS {statement}")
+            self.prepared[query] = name
+        if params:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out before the timeout"""
+
+
+class ConnectionPool:
+    def __init__(self, connect_kwargs, min_size=1, max_size=10, timeout=5.0,
+                 healthcheck_interval=30.0, max_idle=300.0):
+        """
+        Bounded, thread-safe pool of psycopg2 connections
+
+        Args:
+            connect_kwargs: Keyword arguments passed to psycopg2.connect
+            min_size: Connections opened up front and kept open while idle
+            max_size: Upper bound on open connections (idle + checked out)
+            timeout: Seconds to wait for a free connection before PoolTimeout
+            healthcheck_interval: Idle seconds after which a connection is pinged before reuse
+            max_idle: Idle seconds after which surplus connections above min_size are closed
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: need 0 <= min_size <= max_size and max_size >= 1")
+
+        self.connect_kwargs = dict(connect_kwargs)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        self.max_idle = max_idle
+
+        self._idle = deque()  # (connection, last_used) pairs, most recently used on the right
+        self._in_use = set()
+        self._opening = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        self.stats = {
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'reconnects': 0,
+            'checkouts': 0,
+            'timeouts': 0,
+        }
+
+    def _open_connection(self):
+        connection = psycopg2.connect(**self.connect_kwargs)
+        with self._cond:
+            self.stats['connections_opened'] += 1
+        return connection
+
+    def _close_connection(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._cond:
+            self.stats['connections_closed'] += 1
+
+    def _is_healthy(self, connection):
+        if connection.closed:
+            return False
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+            connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def open(self):
+        """Open min_size connections so the first requests do not pay for connect()"""
+        connections = [self._open_connection() for _ in range(self.min_size)]
+        now = time.monotonic()
+        with self._cond:
+            for connection in connections:
+                self._idle.append((connection, now))
+            self._cond.notify_all()
+
+    def _checkout_slot(self, timeout):
+        """
+        Reserve either an idle connection or the right to open a new one.
+        Returns (connection, last_used) or (None, None) when a new connection must be opened.
+        Either way the slot is counted in _opening until getconn hands it out or gives it back,
+        so a connection being health-checked still counts against max_size.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                if self._idle:
+                    self._opening += 1
+                    return self._idle.pop()
+                if len(self._in_use) + self._opening < self.max_size:
+                    self._opening += 1
+                    return None, None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(f"No database connection available within {timeout}s")
+                self._cond.wait(remaining)
+
+    def getconn(self, timeout=None):
+        """Check out a healthy connection, reconnecting stale ones transparently"""
+        timeout = self.timeout if timeout is None else timeout
+        connection, last_used = self._checkout_slot(timeout)
+
+        if connection is not None:
+            stale = time.monotonic() - last_used >= self.healthcheck_interval
+            if connection.closed or (stale and not self._is_healthy(connection)):
+                # The slot stays reserved for the replacement
+                self._close_connection(connection)
+                with self._cond:
+                    self.stats['reconnects'] += 1
+                connection = None
+
+        if connection is None:
+            try:
+                connection = self._open_connection()
+            except Exception:
+                with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                raise
+
+        with self._cond:
+            self._opening -= 1
+            self._in_use.add(connection)
+            self.stats['checkouts'] += 1
+        return connection
+
+    def putconn(self, connection, discard=False):
+        """Return a connection to the pool; broken or discarded connections are closed"""
+        with self._cond:
+            self._in_use.discard(connection)
+
+        if not discard and not connection.closed:
+            try:
+                # Never hand a connection with an open transaction to the next request
+                if connection.status != psycopg2.extensions.STATUS_READY:
+                    connection.rollback()
+            except Exception:
+                discard = True
+        else:
+            discard = True
+
+        if discard or self._closed:
+            self._close_connection(connection)
+            with self._cond:
+                self._cond.notify()
+            return
+
+        now = time.monotonic()
+        surplus = []
+        with self._cond:
+            self._idle.append((connection, now))
+            # Trim connections that sat idle too long, keeping min_size warm
+            while len(self._idle) > self.min_size and now - self._idle[0][1] >= self.max_idle:
+                surplus.append(self._idle.popleft()[0])
+            self._cond.notify()
+        for stale_connection in surplus:
+            self._close_connection(stale_connection)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that checks a connection out and always returns it"""
+        connection = self.getconn(timeout)
+        discard = False
+        try:
+            yield connection
+        except (psycopg2.InterfaceError, psycopg2.OperationalError):
+            # The socket is likely dead; do not put it back in circulation
+            discard = True
+            raise
+        finally:
+            self.putconn(connection, discard=discard)
+
+    def busy(self):
+        """Connections checked out, being opened or being health-checked; the load measure for picking a read replica"""
+        with self._cond:
+            return len(self._in_use) + self._opening
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for connection in idle:
+            self._close_connection(connection)
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats.update({
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        return stats
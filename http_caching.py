@@ -0,0 +1,125 @@
+"""
+Conditional GET, compact JSON and response compression for the HTTP apps
+
+Shared by app.py (Flask) and asgi_app.py (Quart). Both frameworks use
+werkzeug's request data structures (if_none_match, accept_encodings) and
+Flask's JSON provider, so nothing here depends on which one is serving.
+
+orjson and brotli are optional: without orjson jsonify keeps using the
+standard library, without brotli only gzip is offered.
+"""
+import gzip
+
+try:
+    import orjson
+except ImportError:  # jsonify falls back to json.dumps
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import quote_etag
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # brotli's sweet spot for on-the-fly compression; 11 is for static assets
+
+if orjson is not None:
+    _ORJSON_OPTIONS = (
+        orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        # Leave dates and dataclasses to Flask's default() so the output matches jsonify's
+        | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+
+
+class CompactJSONProvider(DefaultJSONProvider):
+    """
+    jsonify through orjson: compact, keys sorted like the default provider,
+    non-ASCII text sent as UTF-8 instead of \\u escapes. Pretty-printed
+    output (compact = False) and custom json.dumps arguments still go
+    through the standard library.
+    """
+
+    compact = True
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or set(kwargs) - {'separators'}:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=_ORJSON_OPTIONS).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=_ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE),
+            mimetype=self.mimetype
+        )
+
+
+def conditional_json(if_none_match, etag, cache_control, build_body, jsonify, response_class):
+    """
+    304 Not Modified if the client already holds etag, else jsonify(build_body())
+
+    The ETag is weak: the same body may be sent gzip- or brotli-encoded, and
+    If-None-Match on GET uses weak comparison anyway. build_body is only
+    called when a full response is needed.
+
+    Args:
+        if_none_match: The request's werkzeug ETags (request.if_none_match)
+        etag: Opaque validator for the current representation
+        cache_control: Cache-Control header value for both outcomes
+    """
+    headers = {'ETag': quote_etag(etag, weak=True), 'Cache-Control': cache_control}
+    if if_none_match.contains_weak(etag):
+        return response_class(status=304, headers=headers)
+    response = jsonify(build_body())
+    response.headers.update(headers)
+    return response
+
+
+def choose_encoding(accept_encodings):
+    """'br', 'gzip' or None for the request's werkzeug Accept-Encoding (request.accept_encodings)"""
+    offered = ('br', 'gzip') if brotli is not None else ('gzip',)
+    best = accept_encodings.best_match(offered)
+    return best if best is not None and accept_encodings[best] > 0 else None
+
+
+def should_compress(response, min_size):
+    """A complete (not streamed) JSON body of at least min_size bytes that is not encoded yet"""
+    return (
+        min_size > 0
+        and response.status_code == 200
+        and response.mimetype == 'application/json'
+        and 'Content-Encoding' not in response.headers
+        and response.content_length is not None
+        and response.content_length >= min_size
+    )
+
+
+def negotiate_encoding(response, accept_encodings, min_size):
+    """
+    Encoding to compress response with, or None
+
+    Every response that could be compressed is marked Vary: Accept-Encoding,
+    whichever encoding this client gets, so shared caches keep them apart.
+    """
+    if not should_compress(response, min_size):
+        return None
+    response.vary.add('Accept-Encoding')
+    return choose_encoding(accept_encodings)
+
+
+def compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def apply_encoding(response, data, encoding):
+    """Replace the body (data, the response's current bytes) with its encoded form"""
+    response.set_data(compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,256 @@
+"""
+External intent catalogue, compiled into immutable snapshots
+
+Intents live in JSON (or, with PyYAML installed, YAML) files under INTENTS_DIR.
+Each file holds either {"intents": [...]} or a bare list of intents; files are
+read in name order and their intents concatenated, so catalogue order (which
+breaks scoring ties) is file name order, then order within the file.
+
+An IntentSnapshot bundles the frozen intents with the indexes built from them.
+It is never modified after construction: reloading builds a new snapshot and
+swaps the reference, so readers take one snapshot and use it without locks.
+Compiled snapshots are pickled to a cache file keyed by a hash of the source
+files, so a restart with an unchanged catalogue skips tokenizing and indexing.
+"""
+import gc
+import os
+import re
+import json
+import pickle
+import hashlib
+import logging
+import threading
+
+try:
+    import yaml
+except ImportError:  # YAML catalogues need PyYAML; JSON always works
+    yaml = None
+
+from intent_index import IntentIndex
+from tfidf_matcher import TfidfIntentMatcher
+
+logger = logging.getLogger(__name__)
+
+CATALOGUE_EXTENSIONS = ('.json', '.yaml', '.yml')
+
+# Part of the cache key; bump when IntentSnapshot or the indexes change shape
+SNAPSHOT_FORMAT = 2
+
+FALLBACK_RESPONSE = "I'm sorry, I didn't understand that. Could you please rephrase your question?"
+
+
+def preprocess_text(text):
+    """Clean and preprocess text (module level so compiled indexes can be pickled)"""
+    text = text.lower().strip()
+    text = re.sub(r'[^\w\s]', '', text)
+    return text
+
+
+def normalize_pattern(text):
+    """Key for exact pattern hits: preprocessed text with runs of whitespace collapsed"""
+    return ' '.join(preprocess_text(text).split())
+
+
+def read_sources(directory):
+    """Return [(filename, raw bytes)] for every catalogue file in directory, in name order"""
+    sources = []
+    for filename in sorted(os.listdir(directory)):
+        if os.path.splitext(filename)[1] in CATALOGUE_EXTENSIONS:
+            with open(os.path.join(directory, filename), 'rb') as f:
+                sources.append((filename, f.read()))
+    return sources
+
+
+def source_key(sources, matcher, threshold):
+    """Hash identifying a compiled snapshot: the source files plus the matcher settings"""
+    digest = hashlib.sha256(f"{SNAPSHOT_FORMAT}|{matcher}|{threshold}".encode())
+    for filename, data in sources:
+        digest.update(b'\0' + filename.encode() + b'\0')
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def freeze_intent(intent, origin='<intent>'):
+    """Validate one intent mapping and return it with tuple patterns and responses"""
+    if not isinstance(intent, dict) or not isinstance(intent.get('tag'), str):
+        raise ValueError(f"{origin}: every intent needs a string 'tag'")
+    patterns = intent.get('patterns', [])
+    responses = intent.get('responses', [])
+    if not isinstance(patterns, list) or not all(isinstance(p, str) for p in patterns):
+        raise ValueError(f"{origin}: patterns of intent {intent['tag']!r} must be a list of strings")
+    if not responses or not isinstance(responses, list) or not all(isinstance(r, str) for r in responses):
+        raise ValueError(f"{origin}: intent {intent['tag']!r} needs a non-empty list of string responses")
+    return {'tag': intent['tag'], 'patterns': tuple(patterns), 'responses': tuple(responses)}
+
+
+def parse_sources(sources):
+    """Decode catalogue files into one list of frozen intents"""
+    intents = []
+    tags = set()
+    for filename, data in sources:
+        try:
+            if filename.endswith('.json'):
+                document = json.loads(data.decode('utf-8'))
+            elif yaml is not None:
+                document = yaml.safe_load(data)
+            else:
+                raise ValueError("PyYAML is required for YAML intent files (pip install pyyaml)")
+        except Exception as e:
+            raise ValueError(f"{filename}: {e}") from None
+
+        entries = document.get('intents') if isinstance(document, dict) else document
+        if not isinstance(entries, list):
+            raise ValueError(f"{filename}: expected a list of intents or {{\"intents\": [...]}}")
+        for entry in entries:
+            intent = freeze_intent(entry, filename)
+            if intent['tag'] in tags:
+                raise ValueError(f"{filename}: duplicate intent tag {intent['tag']!r}")
+            tags.add(intent['tag'])
+            intents.append(intent)
+    return intents
+
+
+class IntentSnapshot:
+    __slots__ = ('intents', 'tags', 'default_response', 'exact', 'index', 'tfidf', 'key')
+
+    def __init__(self, intents, matcher, threshold, key=None):
+        """
+        Compiled, read-only view of an intent catalogue
+
+        Args:
+            intents: Frozen intents (see freeze_intent) in catalogue order
+            matcher: 'overlap' or 'tfidf'; decides which index is built
+            threshold: Confidence threshold baked into the tfidf matcher
+            key: source_key of the files the intents came from, if any
+        """
+        self.intents = tuple(intents)
+        self.tags = tuple(intent['tag'] for intent in self.intents)
+        default = next((intent for intent in self.intents if intent['tag'] == 'default'), None)
+        self.default_response = default['responses'][0] if default else FALLBACK_RESPONSE
+        # Normalized pattern -> intent; the first intent listing a pattern keeps it
+        self.exact = {}
+        for intent in self.intents:
+            if intent['tag'] != 'default':
+                for pattern in intent['patterns']:
+                    self.exact.setdefault(normalize_pattern(pattern), intent)
+        self.index = IntentIndex(self.intents, preprocess_text)
+        self.tfidf = TfidfIntentMatcher(self.intents, preprocess_text, threshold) if matcher == 'tfidf' else None
+        self.key = key
+
+    def with_intent(self, intent, matcher, threshold):
+        """New snapshot with intent appended; the source key is dropped since it no longer matches the files"""
+        return IntentSnapshot(self.intents + (intent,), matcher, threshold)
+
+
+def _read_cache(cache_file, key):
+    # Unpickling the automaton allocates hundreds of thousands of small containers;
+    # pausing the cyclic GC meanwhile makes the load several times faster
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(cache_file, 'rb') as f:
+            cached_key, snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable intent cache {cache_file}: {e}")
+        return None
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return snapshot if cached_key == key else None
+
+
+def _write_cache(cache_file, snapshot):
+    # Write to a temporary file and rename so a concurrent reader never sees half a pickle
+    temporary = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_file) or '.', exist_ok=True)
+        with open(temporary, 'wb') as f:
+            pickle.dump((snapshot.key, snapshot), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, cache_file)
+    except OSError as e:
+        logger.warning(f"Could not write intent cache {cache_file}: {e}")
+
+
+def load_snapshot(directory, matcher, threshold, cache_file=None):
+    """
+    Build the snapshot for the catalogue in directory, from cache_file when it is current
+
+    The cache is a pickle, so cache_file must only ever be writable by this service.
+
+    Raises:
+        OSError: if the directory or a file cannot be read
+        ValueError: if a file is malformed
+    """
+    sources = read_sources(directory)
+    key = source_key(sources, matcher, threshold)
+    if cache_file:
+        snapshot = _read_cache(cache_file, key)
+        if snapshot is not None:
+            return snapshot
+
+    snapshot = IntentSnapshot(parse_sources(sources), matcher, threshold, key)
+    if cache_file:
+        _write_cache(cache_file, snapshot)
+    return snapshot
+
+
+def directory_signature(directory):
+    """Cheap change detector: (name, mtime, size) of every catalogue file"""
+    signature = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if os.path.splitext(entry.name)[1] in CATALOGUE_EXTENSIONS:
+                stat = entry.stat()
+                signature.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(signature))
+
+
+class CatalogueWatcher:
+    def __init__(self, directory, on_change, interval=2.0):
+        """
+        Background thread that calls on_change() when files in directory change
+
+        Args:
+            directory: Folder to poll
+            on_change: Callable run on the watcher thread after a change is seen
+            interval: Seconds between polls
+        """
+        self.directory = directory
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._worker = None
+
+    def _signature(self):
+        try:
+            return directory_signature(self.directory)
+        except OSError:
+            return None
+
+    def start(self):
+        """Start polling (idempotent)"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stop.clear()
+        # Taken before returning so a change made right after start() is not missed
+        last = self._signature()
+        self._worker = threading.Thread(target=self._run, args=(last,), name='intent-catalogue-watcher', daemon=True)
+        self._worker.start()
+
+    def _run(self, last):
+        while not self._stop.wait(self.interval):
+            current = self._signature()
+            if current is not None and current != last:
+                last = current
+                try:
+                    self.on_change()
+                except Exception as e:
+                    logger.error(f"Reload after change in {self.directory} failed: {e}")
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        worker = self._worker
+        if worker is not None and worker.is_alive() and worker is not threading.current_thread():
+            worker.join(timeout)
@@ -0,0 +1,139 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: one pass over the text finds every pattern it contains"""
+
+    def __init__(self, patterns):
+        # Trie stored as parallel lists indexed by state number; state 0 is the root
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        # Empty strings are contained in every text and never reached by the trie walk
+        self._always = []
+
+        for pattern_id, pattern in enumerate(patterns):
+            if not pattern:
+                self._always.append(pattern_id)
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(pattern_id)
+
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # Inherit matches that end at the suffix state
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text):
+        """Return the set of pattern ids that occur anywhere in text"""
+        found = set(self._always)
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class IntentIndex:
+    """
+    Pre-tokenized view of an intent catalogue
+
+    Scores a message exactly like IntentHandler's original scan (word overlap
+    ratio against each pattern, plus a flat 0.8 for patterns contained in the
+    lowercased message) but only visits patterns that share a token with the
+    message, and finds substring hits with a single automaton pass.
+    """
+
+    SUBSTRING_SCORE = 0.8
+
+    def __init__(self, intents, preprocess):
+        self.preprocess = preprocess
+        # One entry per (intent, pattern) in catalogue order; the order breaks ties
+        self.entry_intents = []
+        self.entry_sizes = []
+        self.token_index = {}
+        patterns = []
+
+        for intent in intents:
+            if intent["tag"] == "default":
+                continue
+            for pattern in intent["patterns"]:
+                entry_id = len(self.entry_intents)
+                pattern_words = set(preprocess(pattern).split())
+                self.entry_intents.append(intent)
+                self.entry_sizes.append(len(pattern_words))
+                for word in pattern_words:
+                    self.token_index.setdefault(word, []).append(entry_id)
+                patterns.append(pattern)
+
+        self.automaton = AhoCorasick(patterns)
+
+    def score_entries(self, user_input, threshold):
+        """Return {entry_id: score} for every pattern that scores above zero"""
+        counts = {}
+        for word in set(self.preprocess(user_input).split()):
+            for entry_id in self.token_index.get(word, ()):
+                counts[entry_id] = counts.get(entry_id, 0) + 1
+
+        scores = {}
+        for entry_id, overlap in counts.items():
+            score = overlap / self.entry_sizes[entry_id]
+            if score >= threshold:
+                scores[entry_id] = score
+
+        for entry_id in self.automaton.find_all(user_input.lower()):
+            if scores.get(entry_id, 0) < self.SUBSTRING_SCORE:
+                scores[entry_id] = self.SUBSTRING_SCORE
+
+        return scores
+
+    def top_intents(self, user_input, threshold, top_k=1):
+        """Return up to top_k (intent, score) pairs, best first, one per intent"""
+        best = {}
+        for entry_id, score in self.score_entries(user_input, threshold).items():
+            key = id(self.entry_intents[entry_id])
+            current = best.get(key)
+            if current is None or score > current[0] or (score == current[0] and entry_id < current[1]):
+                best[key] = (score, entry_id)
+        ranked = sorted(best.values(), key=lambda item: (-item[0], item[1]))[:top_k]
+        return [(self.entry_intents[entry_id], score) for score, entry_id in ranked]
+
+    def find_best(self, user_input, threshold):
+        """Return (intent, score) for the best match, or (None, 0) if nothing scores"""
+        best_entry = None
+        best_score = 0
+        for entry_id, score in self.score_entries(user_input, threshold).items():
+            # Earlier catalogue entries win ties, as in the original linear scan
+            if score > best_score or (score == best_score and entry_id < best_entry):
+                best_entry = entry_id
+                best_score = score
+
+        if best_entry is None:
+            return None, 0
+        return self.entry_intents[best_entry], best_score
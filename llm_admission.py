@@ -0,0 +1,458 @@
+"""
+Protection for the single local Ollama, shared by the Flask and ASGI handlers
+
+AdmissionController bounds concurrency and queueing, SingleFlight coalesces
+identical prompts, CircuitBreaker fails fast after repeated errors, and
+CallGuard puts admission and the breaker around each upstream call. The
+Async* classes keep the same state machines and stats but await where the
+thread versions block.
+"""
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Awaitable, Callable, Hashable, Optional
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call cannot be admitted before its deadline"""
+
+
+class BreakerOpen(Exception):
+    """Raised when the circuit breaker refuses a call"""
+
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated upstream errors
+
+    closed    - calls go through; consecutive failures are counted
+    open      - calls are rejected until reset_timeout has passed
+    half_open - a limited number of trial calls go through; one success
+                closes the breaker, one failure opens it again
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'rejected': 0,
+            'opened': 0,
+            'successes': 0,
+            'failures': 0,
+        }
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Return True if a call may be attempted now"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.stats['successes'] += 1
+            self._failures = 0
+            self._state = self.CLOSED
+
+    def release_trial(self):
+        """Give back a half-open trial slot whose call ended without an outcome (the client went away)"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_failure(self):
+        with self._lock:
+            self.stats['failures'] += 1
+            self._failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self.stats['opened'] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['state'] = self._current_state()
+            stats['consecutive_failures'] = self._failures
+        return stats
+
+
+class AdmissionController:
+    """
+    Bounds concurrent upstream calls and queues the overflow
+
+    At most max_inflight calls run at once and at most max_queue callers
+    wait for a slot. A caller is turned away immediately when the queue is
+    full or when the expected wait (from a moving average of recent service
+    times) already exceeds its deadline, instead of queueing only to time out.
+    """
+
+    def __init__(self, max_inflight: int = 4, max_queue: int = 32):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+
+        self._inflight = 0
+        self._waiting = 0
+        self._avg_service_time = 0.0
+        self._cond = threading.Condition(threading.Lock())
+
+        self.stats = {
+            'admitted': 0,
+            'rejected_queue_full': 0,
+            'rejected_deadline': 0,
+            'total_wait_time': 0.0,
+            'max_wait_time': 0.0,
+        }
+
+    def _expected_wait(self) -> float:
+        # Callers ahead of us drain at roughly max_inflight per service time
+        return (self._waiting + 1) / self.max_inflight * self._avg_service_time
+
+    def _try_admit(self, started: float, deadline: float) -> bool:
+        """
+        Take a free slot (True) or decide the caller may queue for one (False); called with _cond held
+
+        Raises:
+            AdmissionRejected: if the queue is full or the deadline cannot be met
+        """
+        if self._inflight < self.max_inflight and not self._waiting:
+            self._inflight += 1
+            self.stats['admitted'] += 1
+            return True
+
+        if self._waiting >= self.max_queue:
+            self.stats['rejected_queue_full'] += 1
+            raise AdmissionRejected("LLM queue is full")
+        if started + self._expected_wait() > deadline:
+            self.stats['rejected_deadline'] += 1
+            raise AdmissionRejected("LLM queue wait would exceed the deadline")
+        return False
+
+    def _record_wait(self, waited: float):
+        self.stats['admitted'] += 1
+        self.stats['total_wait_time'] += waited
+        self.stats['max_wait_time'] = max(self.stats['max_wait_time'], waited)
+
+    def _record_service_time(self, service_time: Optional[float]):
+        if service_time is not None:
+            # Exponential moving average, weighted towards recent calls
+            self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * service_time if self._avg_service_time else service_time
+
+    def acquire(self, deadline: float) -> float:
+        """
+        Wait for a slot until the monotonic deadline
+
+        Returns:
+            Seconds spent waiting
+        Raises:
+            AdmissionRejected: if the queue is full or the deadline cannot be met
+        """
+        started = time.monotonic()
+        with self._cond:
+            if self._try_admit(started, deadline):
+                return 0.0
+
+            self._waiting += 1
+            try:
+                while self._inflight >= self.max_inflight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats['rejected_deadline'] += 1
+                        raise AdmissionRejected("Deadline passed while waiting for an LLM slot")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+            self._inflight += 1
+            waited = time.monotonic() - started
+            self._record_wait(waited)
+            return waited
+
+    def release(self, service_time: Optional[float] = None):
+        with self._cond:
+            self._inflight -= 1
+            self._record_service_time(service_time)
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, deadline: float):
+        self.acquire(deadline)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            stats = dict(self.stats)
+            stats.update({
+                'inflight': self._inflight,
+                'queue_depth': self._waiting,
+                'avg_service_time': self._avg_service_time,
+                'max_inflight': self.max_inflight,
+                'max_queue': self.max_queue,
+            })
+        admitted = stats['admitted']
+        stats['avg_wait_time'] = stats['total_wait_time'] / admitted if admitted else 0.0
+        return stats
+
+
+class AsyncAdmissionController(AdmissionController):
+    """
+    AdmissionController for coroutines on one event loop
+
+    Same limits, rejection rules and stats; a queued caller awaits instead of
+    blocking the loop, and a released slot is handed straight to the oldest
+    waiter so a newcomer can never take it first.
+    """
+
+    def __init__(self, max_inflight: int = 4, max_queue: int = 32):
+        super().__init__(max_inflight, max_queue)
+        self._waiters = deque()  # futures of queued callers, oldest first
+
+    async def acquire(self, deadline: float) -> float:
+        """
+        Await a slot until the monotonic deadline
+
+        Returns:
+            Seconds spent waiting
+        Raises:
+            AdmissionRejected: if the queue is full or the deadline cannot be met
+        """
+        started = time.monotonic()
+        with self._cond:
+            if self._try_admit(started, deadline):
+                return 0.0
+            self._waiting += 1
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+        admitted = False
+        try:
+            try:
+                await asyncio.wait_for(waiter, max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                with self._cond:
+                    self.stats['rejected_deadline'] += 1
+                raise AdmissionRejected("Deadline passed while waiting for an LLM slot")
+            admitted = True
+        finally:
+            with self._cond:
+                self._waiting -= 1
+            if not admitted and waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as this caller gave up: pass it on
+                self.release()
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self._record_wait(waited)
+        return waited
+
+    def release(self, service_time: Optional[float] = None):
+        with self._cond:
+            self._record_service_time(service_time)
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    # The slot stays counted in _inflight for its new holder
+                    waiter.set_result(None)
+                    return
+            self._inflight -= 1
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution whose result they all share"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {'leaders': 0, 'coalesced': 0}
+
+    def _join(self, key: Hashable, new_call: Callable):
+        """(call, True) after registering new_call() as the leader for key, or (running call, False)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = new_call()
+                self.stats['leaders'] += 1
+                return call, True
+            self.stats['coalesced'] += 1
+            return call, False
+
+    def _leave(self, key: Hashable):
+        with self._lock:
+            del self._calls[key]
+
+    def do(self, key: Hashable, function: Callable, timeout: Optional[float] = None):
+        """
+        Run function() unless an identical call is already in flight, in which case wait for its result
+
+        Raises:
+            TimeoutError: if a follower gives up waiting for the leader
+        """
+        call, leader = self._join(key, _Call)
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError("Timed out waiting for a coalesced LLM call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            self._leave(key)
+            call.done.set()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight_keys'] = len(self._calls)
+        return stats
+
+
+class AsyncSingleFlight(SingleFlight):
+    """SingleFlight for coroutines: followers await the leader's future instead of blocking on an Event"""
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable], timeout: Optional[float] = None):
+        """
+        Await function() unless an identical call is already in flight, in which case await its result
+
+        Raises:
+            TimeoutError: if a follower gives up waiting for the leader
+        """
+        call, leader = self._join(key, asyncio.get_running_loop().create_future)
+
+        if not leader:
+            try:
+                # shield: a follower giving up must not cancel the leader's call
+                return await asyncio.wait_for(asyncio.shield(call), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError("Timed out waiting for a coalesced LLM call")
+
+        try:
+            result = await function()
+            call.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        except Exception as e:
+            call.set_exception(e)
+            raise
+        finally:
+            self._leave(key)
+            if call.done() and not call.cancelled():
+                # Mark any exception as retrieved when no follower was waiting
+                call.exception()
+
+
+class CallGuard:
+    """
+    Admission first, then the circuit breaker, around each upstream call
+
+    The breaker is only asked once a slot is held, so a half-open trial call
+    is never spent on a request the queue turns away. Inside the guarded
+    block the caller reports a response it judged with breaker.record_success()
+    or record_failure(); an exception escaping the block counts as a failure,
+    and leaving it with neither (GeneratorExit when a streaming client
+    disconnects, CancelledError) gives a half-open trial slot back.
+    """
+
+    def __init__(self, admission: AdmissionController, breaker: CircuitBreaker):
+        self.admission = admission
+        self.breaker = breaker
+
+    def _admitted(self) -> float:
+        if not self.breaker.allow_request():
+            self.admission.release()
+            raise BreakerOpen("LLM circuit breaker is open")
+        return time.monotonic()
+
+    def _abandoned(self, error: BaseException):
+        if isinstance(error, Exception):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_trial()
+
+    @contextmanager
+    def call(self, deadline: float):
+        """
+        Hold a slot and a breaker pass for the block
+
+        Raises:
+            AdmissionRejected: if no slot frees up before deadline
+            BreakerOpen: if the breaker refuses the call
+        """
+        self.admission.acquire(deadline)
+        started = self._admitted()
+        try:
+            yield
+        except BaseException as e:
+            self._abandoned(e)
+            raise
+        finally:
+            self.admission.release(time.monotonic() - started)
+
+
+class AsyncCallGuard(CallGuard):
+    """CallGuard over an AsyncAdmissionController, used with async with"""
+
+    @asynccontextmanager
+    async def call(self, deadline: float):
+        await self.admission.acquire(deadline)
+        started = self._admitted()
+        try:
+            yield
+        except BaseException as e:
+            self._abandoned(e)
+            raise
+        finally:
+            self.admission.release(time.monotonic() - started)
@@ -0,0 +1,208 @@
+import os
+import re
+import json
+import math
+import time
+import zlib
+import logging
+import threading
+from collections import OrderedDict
+
+from cache import TTLCache, MISSING
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Function words ignored by the similarity tier so "whats an emi" and "what is emi" embed alike
+_STOPWORDS = frozenset({
+    'a', 'an', 'the', 'is', 'are', 'was', 'be', 'what', 'whats', 'whatre', 'do', 'does', 'i', 'me',
+    'my', 'to', 'of', 'for', 'in', 'on', 'please', 'can', 'could', 'you', 'tell', 'about', 'its', 's',
+})
+
+
+def normalize_prompt(prompt):
+    """Lowercase, drop punctuation and collapse whitespace so trivially different prompts share a key"""
+    prompt = _PUNCTUATION_RE.sub('', prompt.lower())
+    return _WHITESPACE_RE.sub(' ', prompt).strip()
+
+
+def embed_prompt(normalized_prompt, dimensions=1024):
+    """
+    Cheap fixed-size embedding: hashed content-word unigrams plus character
+    trigrams, L2-normalised and stored sparsely as {bucket: weight}
+
+    Dropping function words and adding trigrams lets "whats an emi" land close
+    to "what is emi", and "emi amount" close to "emi amounts".
+    """
+    features = {}
+    words = [word for word in normalized_prompt.split() if word not in _STOPWORDS] or normalized_prompt.split()
+    content = ' '.join(words)
+    for word in words:
+        bucket = zlib.crc32(word.encode('utf-8')) % dimensions
+        features[bucket] = features.get(bucket, 0.0) + 1.0
+    padded = f" {content} "
+    for i in range(len(padded) - 2):
+        bucket = zlib.crc32(padded[i:i + 3].encode('utf-8')) % dimensions
+        features[bucket] = features.get(bucket, 0.0) + 0.5
+    norm = math.sqrt(sum(weight * weight for weight in features.values()))
+    if not norm:
+        return {}
+    return {bucket: weight / norm for bucket, weight in features.items()}
+
+
+def cosine(vector_a, vector_b):
+    if len(vector_a) > len(vector_b):
+        vector_a, vector_b = vector_b, vector_a
+    return sum(weight * vector_b.get(bucket, 0.0) for bucket, weight in vector_a.items())
+
+
+class SemanticResponseCache:
+    """Returns a stored answer when a new prompt's embedding is close enough to a cached one"""
+
+    def __init__(self, maxsize=1000, ttl=3600.0, threshold=0.8):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        # normalized prompt -> (params, vector, response, expires_at)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, normalized_prompt, params):
+        vector = embed_prompt(normalized_prompt)
+        now = time.time()
+        best_key, best_score = None, self.threshold
+        with self._lock:
+            expired = []
+            for key, (entry_params, entry_vector, _, expires_at) in self._entries.items():
+                if expires_at <= now:
+                    expired.append(key)
+                    continue
+                if entry_params != params:
+                    continue
+                score = cosine(vector, entry_vector)
+                if score >= best_score:
+                    best_key, best_score = key, score
+            for key in expired:
+                del self._entries[key]
+
+            if best_key is None:
+                self.stats['misses'] += 1
+                return MISSING
+            self._entries.move_to_end(best_key)
+            self.stats['hits'] += 1
+            return self._entries[best_key][2]
+
+    def set(self, normalized_prompt, params, response):
+        entry = (params, embed_prompt(normalized_prompt), response, time.time() + self.ttl)
+        with self._lock:
+            self._entries[normalized_prompt] = entry
+            self._entries.move_to_end(normalized_prompt)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def dump(self):
+        now = time.time()
+        with self._lock:
+            return [
+                [key, list(params), response, expires_at]
+                for key, (params, _, response, expires_at) in self._entries.items()
+                if expires_at > now
+            ]
+
+    def load(self, entries):
+        now = time.time()
+        with self._lock:
+            for key, params, response, expires_at in entries:
+                if expires_at > now:
+                    self._entries[key] = (tuple(params), embed_prompt(key), response, expires_at)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+class LLMResponseCache:
+    def __init__(self, maxsize=5000, ttl=3600.0, semantic=False, semantic_maxsize=1000,
+                 semantic_threshold=0.8, path=None):
+        """
+        Two-tier cache for LLM generations
+
+        Args:
+            maxsize: Entries in the exact tier (normalized prompt + generation params)
+            ttl: Seconds an answer stays valid in either tier
+            semantic: Enable the similarity tier consulted after an exact miss
+            semantic_maxsize: Entries in the similarity tier (lookups scan all of them)
+            semantic_threshold: Minimum cosine similarity for a similarity hit
+            path: Optional JSON file the cache is loaded from and saved to
+        """
+        # Wall-clock expiry so entries keep their TTL across a save/load cycle
+        self.exact = TTLCache(maxsize=maxsize, ttl=ttl, clock=time.time)
+        self.semantic = SemanticResponseCache(semantic_maxsize, ttl, semantic_threshold) if semantic else None
+        self.path = path
+        if path:
+            self.load()
+
+    def get(self, prompt, model, temperature, max_tokens):
+        """Return a cached response or MISSING"""
+        normalized = normalize_prompt(prompt)
+        params = (model, temperature, max_tokens)
+        response = self.exact.get((normalized,) + params)
+        if response is MISSING and self.semantic is not None:
+            response = self.semantic.get(normalized, params)
+            if response is not MISSING:
+                # Promote so the next identical prompt is an exact hit
+                self.exact.set((normalized,) + params, response)
+        return response
+
+    def set(self, prompt, model, temperature, max_tokens, response):
+        normalized = normalize_prompt(prompt)
+        params = (model, temperature, max_tokens)
+        self.exact.set((normalized,) + params, response)
+        if self.semantic is not None:
+            self.semantic.set(normalized, params, response)
+
+    def save(self):
+        """Write both tiers to self.path atomically"""
+        if not self.path:
+            return
+        data = {
+            'exact': [[list(key), value, expires_at] for key, value, expires_at in self.exact.dump()],
+            'semantic': self.semantic.dump() if self.semantic is not None else [],
+        }
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.error(f"Failed to save LLM response cache to {self.path}: {e}")
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load LLM response cache from {self.path}: {e}")
+            return
+        self.exact.load((tuple(key), value, expires_at) for key, value, expires_at in data.get('exact', []))
+        if self.semantic is not None:
+            self.semantic.load(data.get('semantic', []))
+        logger.info(f"Loaded {len(self.exact)} cached LLM responses from {self.path}")
+
+    def get_stats(self):
+        stats = {'exact': self.exact.get_stats()}
+        if self.semantic is not None:
+            stats['semantic'] = self.semantic.get_stats()
+        return stats
@@ -1,94 +1,335 @@
-import os
-import logging
-import requests
-from typing import Optional
-from config import config
-
-logger = logging.getLogger(__name__)
-
-class LLMHandler:
-    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
-        """
-        Initialize LLM handler with Ollama model
-
-        Args:
-            api_key: Not used, kept for compatibility
-            model: Model name to use (default from config)
-        """
-        # Get configuration from config file
-        current_config = config.get(os.environ.get('FLASK_ENV', 'development'), config['default'])
-
-        self.model_name = model or current_config.LLM_MODEL
-        self.max_tokens = current_config.LLM_MAX_TOKENS
-        self.temperature = current_config.LLM_TEMPERATURE
-        self.ollama_base_url = current_config.OLLAMA_BASE_URL
-
-        # Check if Ollama is available
-        self.enabled = self._check_ollama_availability()
-        if self.enabled:
-            logger.info(f"Initialized Ollama handler for model {self.model_name}")
-
-    def _check_ollama_availability(self) -> bool:
-        """Check if Ollama server is running and model is available"""
-        try:
-            response = requests.get(f"{self.ollama_base_url}/api/tags", timeout=5)
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                model_names = [model['name'] for model in models]
-                if self.model_name in model_names:
-                    logger.info(f"Model {self.model_name} is available on Ollama")
-                    return True
-                else:
-                    logger.warning(f"Model {self.model_name} not found in available models: {model_names}")
-            else:
-                logger.error(f"Ollama server not responding: {response.status_code}")
-        except Exception as e:
-            logger.error(f"Failed to connect to Ollama: {e}")
-        return False
-
-    def generate_response(self, user_message: str, context: Optional[str] = None) -> str:
-        """
-        Generate a response using Ollama for queries not covered by intents
-
-        Args:
-            user_message: The user's message
-            context: Optional context about the chatbot/system (ignored in this implementation)
-
-        Returns:
-            Generated response or fallback message
-        """
-        if not self.enabled:
-            return "I'm sorry, I'm currently unable to generate responses. Please try again later."
-
-        try:
-            # Prepare the request payload for Ollama
-            payload = {
-                "model": self.model_name,
-                "prompt": user_message,
-                "max_tokens": self.max_tokens,
-                "temperature": self.temperature,
-                "stream": False
-            }
-
-            # Make request to Ollama API
-            response = requests.post(
-                f"{self.ollama_base_url}/api/generate",
-                json=payload,
-                timeout=30
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                generated_text = result.get('response', '')
-                logger.info(f"Generated response for: '{user_message[:50]}...'")
-                return generated_text if generated_text else "I'm sorry, I couldn't generate a response. Please try rephrasing your question."
-            else:
-                logger.error(f"Ollama API error: {response.status_code} - {response.text}")
-                return "I'm experiencing technical difficulties. Please try again later or contact customer support."
-        except Exception as e:
-            logger.error(f"Error generating response: {e}")
-            return "I'm experiencing technical difficulties. Please try again later or contact customer support."
-
-    def is_available(self) -> bool:
-        """Check if Ollama is available"""
-        return self.enabled
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Iterator, Optional
+from config import config
+from cache import MISSING
+from llm_cache import LLMResponseCache, normalize_prompt
+from llm_admission import AdmissionController, AdmissionRejected, BreakerOpen, CallGuard, CircuitBreaker, SingleFlight
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+UNAVAILABLE_MESSAGE = "I'm sorry, I'm currently unable to generate responses. Please try again later."
+ERROR_MESSAGE = "I'm experiencing technical difficulties. Please try again later or contact customer support."
+EMPTY_MESSAGE = "I'm sorry, I couldn't generate a response. Please try rephrasing your question."
+OVERLOADED_MESSAGE = "I'm receiving a lot of questions right now. Please try again in a moment."
+
+
+class LLMHandler:
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
+        """
+        Initialize LLM handler with Ollama model
+
+        Args:
+            api_key: Not used, kept for compatibility
+            model: Model name to use (default from config)
+        """
+        # Get configuration from config file
+        current_config = config.get(os.environ.get('FLASK_ENV', 'development'), config['default'])
+
+        self.model_name = model or current_config.LLM_MODEL
+        self.max_tokens = current_config.LLM_MAX_TOKENS
+        self.temperature = current_config.LLM_TEMPERATURE
+        self.ollama_base_url = current_config.OLLAMA_BASE_URL
+        self.request_timeout = current_config.LLM_REQUEST_TIMEOUT
+        self.probe_interval = current_config.LLM_PROBE_INTERVAL
+
+        # One keep-alive session shared by all threads; the adapter keeps up to
+        # LLM_HTTP_POOL_SIZE idle connections to Ollama instead of reconnecting per call
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=current_config.LLM_HTTP_POOL_SIZE, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._adapter = adapter
+
+        self.breaker = CircuitBreaker(
+            failure_threshold=current_config.LLM_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=current_config.LLM_BREAKER_RESET_TIMEOUT
+        )
+        # Protects the single local Ollama from bursts: bounded concurrency,
+        # a bounded wait queue, and one upstream call per distinct prompt
+        self.queue_timeout = current_config.LLM_QUEUE_TIMEOUT
+        self.admission = AdmissionController(
+            max_inflight=current_config.LLM_MAX_INFLIGHT,
+            max_queue=current_config.LLM_MAX_QUEUE
+        )
+        self.single_flight = SingleFlight()
+        self.guard = CallGuard(self.admission, self.breaker)
+
+        self.response_cache = None
+        if current_config.LLM_CACHE_ENABLED:
+            self.response_cache = LLMResponseCache(
+                maxsize=current_config.LLM_CACHE_SIZE,
+                ttl=current_config.LLM_CACHE_TTL,
+                semantic=current_config.LLM_SEMANTIC_CACHE_ENABLED,
+                semantic_maxsize=current_config.LLM_SEMANTIC_CACHE_SIZE,
+                semantic_threshold=current_config.LLM_SEMANTIC_CACHE_THRESHOLD,
+                path=current_config.LLM_CACHE_PATH or None
+            )
+            if self.response_cache.path:
+                atexit.register(self.response_cache.save)
+
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'probes': 0,
+        }
+
+        # Check if Ollama is available
+        self.enabled = self._check_ollama_availability()
+        if self.enabled:
+            logger.info(f"Initialized Ollama handler for model {self.model_name}")
+
+        # Keep re-checking so a model that comes up (or goes away) later is noticed
+        self._stop_probing = threading.Event()
+        self._probe_thread = None
+        if self.probe_interval > 0:
+            self._probe_thread = threading.Thread(target=self._probe_loop, name='ollama-probe', daemon=True)
+            self._probe_thread.start()
+
+    def _check_ollama_availability(self) -> bool:
+        """Check if Ollama server is running and model is available"""
+        with self._stats_lock:
+            self.stats['probes'] += 1
+        try:
+            response = self.session.get(f"{self.ollama_base_url}/api/tags", timeout=5)
+            if response.status_code == 200:
+                models = response.json().get('models', [])
+                model_names = [model['name'] for model in models]
+                if self.model_name in model_names:
+                    logger.info(f"Model {self.model_name} is available on Ollama")
+                    return True
+                else:
+                    logger.warning(f"Model {self.model_name} not found in available models: {model_names}")
+            else:
+                logger.error(f"Ollama server not responding: {response.status_code}")
+        except Exception as e:
+            logger.error(f"Failed to connect to Ollama: {e}")
+        return False
+
+    def _probe_loop(self):
+        while not self._stop_probing.wait(self.probe_interval):
+            available = self._check_ollama_availability()
+            if available != self.enabled:
+                logger.info(f"Ollama model {self.model_name} is now {'available' if available else 'unavailable'}")
+            self.enabled = available
+
+    def close(self):
+        """Stop background probing, persist the response cache and release pooled connections"""
+        self._stop_probing.set()
+        if self.response_cache is not None:
+            self.response_cache.save()
+        self.session.close()
+
+    def _cached_response(self, user_message: str):
+        if self.response_cache is None:
+            return MISSING
+        return self.response_cache.get(user_message, self.model_name, self.temperature, self.max_tokens)
+
+    def _store_response(self, user_message: str, response: str):
+        if self.response_cache is not None:
+            self.response_cache.set(user_message, self.model_name, self.temperature, self.max_tokens, response)
+
+    def _post_generate(self, payload: dict, **kwargs) -> requests.Response:
+        with self._stats_lock:
+            self.stats['requests'] += 1
+        return self.session.post(f"{self.ollama_base_url}/api/generate", json=payload, **kwargs)
+
+    def generate_response(self, user_message: str, context: Optional[str] = None,
+                          deadline: Optional[float] = None) -> str:
+        """
+        Generate a response using Ollama for queries not covered by intents
+
+        Identical prompts arriving while a generation is in flight share that
+        generation instead of each sending their own request.
+
+        Args:
+            user_message: The user's message
+            context: Optional context about the chatbot/system (ignored in this implementation)
+            deadline: time.monotonic() value by which an answer is needed (default: now + LLM_REQUEST_TIMEOUT)
+
+        Returns:
+            Generated response or fallback message
+        """
+        cached = self._cached_response(user_message)
+        if cached is not MISSING:
+            return cached
+
+        if not self.enabled:
+            return UNAVAILABLE_MESSAGE
+
+        if deadline is None:
+            deadline = time.monotonic() + self.request_timeout
+        key = (normalize_prompt(user_message), self.model_name, self.temperature, self.max_tokens)
+        try:
+            return self.single_flight.do(
+                key,
+                lambda: self._generate_uncached(user_message, deadline),
+                timeout=max(0.0, deadline - time.monotonic())
+            )
+        except TimeoutError:
+            return OVERLOADED_MESSAGE
+
+    def _generate_uncached(self, user_message: str, deadline: float) -> str:
+        # Prepare the request payload for Ollama
+        payload = {
+            "model": self.model_name,
+            "prompt": user_message,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "stream": False
+        }
+        try:
+            with self.guard.call(deadline):
+                # Make request to Ollama API, never waiting past the caller's deadline
+                timeout = max(0.1, min(self.request_timeout, deadline - time.monotonic()))
+                with STAGE_SECONDS.time('llm'):
+                    response = self._post_generate(payload, timeout=timeout)
+
+                if response.status_code != 200:
+                    self.breaker.record_failure()
+                    logger.error(f"Ollama API error: {response.status_code} - {response.text}")
+                    return ERROR_MESSAGE
+                self.breaker.record_success()
+                generated_text = response.json().get('response', '')
+                logger.info(f"Generated response for: '{user_message[:50]}...'")
+                if not generated_text:
+                    return EMPTY_MESSAGE
+                self._store_response(user_message, generated_text)
+                return generated_text
+        except AdmissionRejected as e:
+            logger.warning(f"Rejected LLM request: {e}")
+            return OVERLOADED_MESSAGE
+        except BreakerOpen:
+            return ERROR_MESSAGE
+        except Exception as e:
+            # The guard has already counted it against the breaker
+            logger.error(f"Error generating response: {e}")
+            return ERROR_MESSAGE
+
+    def stream_response(self, user_message: str, context: Optional[str] = None,
+                        deadline: Optional[float] = None) -> Iterator[str]:
+        """
+        Stream a response from Ollama, yielding text fragments as they are generated
+
+        Ollama's streaming mode returns one JSON object per line; each line is
+        decoded and yielded as soon as it arrives, so nothing is buffered here.
+
+        Args:
+            user_message: The user's message
+            context: Optional context about the chatbot/system (ignored in this implementation)
+            deadline: time.monotonic() value by which the first token is needed
+                (default: wait LLM_QUEUE_TIMEOUT for a slot, then LLM_REQUEST_TIMEOUT between chunks)
+
+        Yields:
+            Generated text fragments, or a single fallback message on failure
+        """
+        cached = self._cached_response(user_message)
+        if cached is not MISSING:
+            yield cached
+            return
+
+        if not self.enabled:
+            yield UNAVAILABLE_MESSAGE
+            return
+
+        if deadline is None:
+            deadline = time.monotonic() + self.queue_timeout
+            read_timeout = self.request_timeout
+        else:
+            read_timeout = None
+
+        payload = {
+            "model": self.model_name,
+            "prompt": user_message,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "stream": True
+        }
+
+        yielded_any = False
+        # Fragments are only kept when the finished answer is going into the cache
+        fragments = [] if self.response_cache is not None else None
+        try:
+            # A stream holds its slot until the last token has been sent
+            with self.guard.call(deadline):
+                started = time.monotonic()
+                if read_timeout is None:
+                    read_timeout = max(0.1, min(self.request_timeout, deadline - started))
+                # The read timeout applies between chunks, not to the whole completion
+                with self._post_generate(payload, stream=True, timeout=(5, read_timeout)) as response:
+                    if response.status_code != 200:
+                        self.breaker.record_failure()
+                        logger.error(f"Ollama API error: {response.status_code} - {response.text}")
+                        yield ERROR_MESSAGE
+                        return
+
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get('error'):
+                            raise RuntimeError(chunk['error'])
+                        text = chunk.get('response', '')
+                        if text:
+                            if not yielded_any:
+                                first_token = time.monotonic() - started
+                                STAGE_SECONDS.observe('llm_first_token', first_token)
+                                logger.info(f"First token after {first_token:.3f}s for: '{user_message[:50]}...'")
+                            yielded_any = True
+                            if fragments is not None:
+                                fragments.append(text)
+                            yield text
+                        if chunk.get('done'):
+                            break
+
+                self.breaker.record_success()
+                if not yielded_any:
+                    yield EMPTY_MESSAGE
+                elif fragments is not None:
+                    self._store_response(user_message, ''.join(fragments))
+        except AdmissionRejected as e:
+            logger.warning(f"Rejected LLM stream: {e}")
+            yield OVERLOADED_MESSAGE
+        except BreakerOpen:
+            yield ERROR_MESSAGE
+        except Exception as e:
+            # The guard has already counted it against the breaker
+            logger.error(f"Error streaming response: {e}")
+            if not yielded_any:
+                yield ERROR_MESSAGE
+
+    def is_available(self) -> bool:
+        """Check if Ollama is available and the circuit breaker is not open"""
+        return self.enabled and self.breaker.state != CircuitBreaker.OPEN
+
+    def get_stats(self) -> dict:
+        """Breaker state plus connection reuse counters from the urllib3 pools"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        connections_opened = 0
+        pooled_requests = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                connections_opened += pool.num_connections
+                pooled_requests += pool.num_requests
+        stats.update({
+            'enabled': self.enabled,
+            'connections_opened': connections_opened,
+            'pooled_requests': pooled_requests,
+            'connection_reuse_ratio': 1 - connections_opened / pooled_requests if pooled_requests else 0.0,
+            'breaker': self.breaker.get_stats(),
+        })
+        stats['admission'] = self.admission.get_stats()
+        stats['coalescing'] = self.single_flight.get_stats()
+        if self.response_cache is not None:
+            stats['response_cache'] = self.response_cache.get_stats()
+        return stats
@@ -0,0 +1,118 @@
+"""
+Compact loan records decoded from positional (tuple) rows
+
+Every loan query selects the lms_loan_saction columns in LOAN_COLUMNS order,
+so a row is decoded by position instead of through a per-row dict. Records are
+what the caches hold; they become API dicts only at the response boundary
+(LoanRecord.to_dict).
+"""
+import hashlib
+
+# Column order every loan query must select, starting at the decoder's offset
+LOAN_COLUMNS = (
+    'loan_id',
+    'loan_account_number',
+    'amount_sanctioned',
+    'emi_amount',
+    'emi_due_date',
+    'number_of_emis',
+    'emi_start_date',
+    'emi_end_date',
+    'rate_of_interest',
+    'interest_type',
+    'status',
+    'loan_requested',
+    'payment_freqmuency',
+    'repayment_mode',
+)
+
+# Marks records from queries that do not select application_reference_id
+_NO_REFERENCE = object()
+
+
+def _date(value):
+    return value.strftime('%Y-%m-%d') if value else 'N/A'
+
+
+class LoanRecord:
+    __slots__ = (
+        'loan_id', 'loan_account_number', 'amount_sanctioned', 'emi_amount', 'emi_due_date',
+        'number_of_emis', 'emi_start_date', 'emi_end_date', 'rate_of_interest', 'interest_type',
+        'status', 'loan_requested', 'payment_frequency', 'repayment_mode', 'application_reference_id',
+        '_digest',
+    )
+
+    def __init__(self, row, offset=0, with_reference=False):
+        """
+        Args:
+            row: Positional row holding LOAN_COLUMNS starting at offset
+            offset: Index of loan_id in row
+            with_reference: The column after LOAN_COLUMNS is application_reference_id
+        """
+        (loan_id, account_number, amount_sanctioned, emi_amount, emi_due_date, number_of_emis,
+         emi_start_date, emi_end_date, rate_of_interest, interest_type, status, loan_requested,
+         payment_frequency, repayment_mode) = row[offset:offset + len(LOAN_COLUMNS)]
+
+        self.loan_id = loan_id
+        self.loan_account_number = account_number
+        self.amount_sanctioned = float(amount_sanctioned) if amount_sanctioned else 0
+        self.emi_amount = float(emi_amount) if emi_amount else 0
+        self.emi_due_date = _date(emi_due_date)
+        self.number_of_emis = int(number_of_emis) if number_of_emis else 0
+        self.emi_start_date = _date(emi_start_date)
+        self.emi_end_date = _date(emi_end_date)
+        self.rate_of_interest = float(rate_of_interest) if rate_of_interest else 0
+        self.interest_type = interest_type or 'N/A'
+        self.status = status or 'N/A'
+        self.loan_requested = float(loan_requested) if loan_requested else 0
+        self.payment_frequency = payment_frequency or 'N/A'
+        self.repayment_mode = repayment_mode or 'N/A'
+        self.application_reference_id = row[offset + len(LOAN_COLUMNS)] if with_reference else _NO_REFERENCE
+        self._digest = None
+
+    @property
+    def key(self):
+        """(loan_id, account_number) as strings, the loan cache key"""
+        return (str(self.loan_id), str(self.loan_account_number))
+
+    @property
+    def digest(self):
+        """
+        Short hash of the decoded sanction columns, stable across processes;
+        the HTTP routes build their ETags from it. Computed on first use.
+        """
+        if self._digest is None:
+            values = (
+                self.loan_id, self.loan_account_number, self.amount_sanctioned, self.emi_amount,
+                self.emi_due_date, self.number_of_emis, self.emi_start_date, self.emi_end_date,
+                self.rate_of_interest, self.interest_type, self.status, self.loan_requested,
+                self.payment_frequency, self.repayment_mode,
+            )
+            self._digest = hashlib.blake2b(repr(values).encode('utf-8'), digest_size=12).hexdigest()
+        return self._digest
+
+    def to_dict(self):
+        """The loan dict returned by the API and used by the chat reply formatter"""
+        loan_details = {
+            'found': True,
+            'loan_id': self.loan_id,
+            'loan_account_number': self.loan_account_number,
+            'amount_sanctioned': self.amount_sanctioned,
+            'emi_amount': self.emi_amount,
+            'emi_due_date': self.emi_due_date,
+            'number_of_emis': self.number_of_emis,
+            'emi_start_date': self.emi_start_date,
+            'emi_end_date': self.emi_end_date,
+            'rate_of_interest': self.rate_of_interest,
+            'interest_type': self.interest_type,
+            'status': self.status,
+            'loan_requested': self.loan_requested,
+            'payment_frequency': self.payment_frequency,
+            'repayment_mode': self.repayment_mode
+        }
+        if self.application_reference_id is not _NO_REFERENCE:
+            loan_details['application_reference_id'] = self.application_reference_id
+        return loan_details
+
+    def __repr__(self):
+        return f"LoanRecord(loan_id={self.loan_id!r}, loan_account_number={self.loan_account_number!r})"
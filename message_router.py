@@ -0,0 +1,52 @@
+import re
+from collections import namedtuple
+
+RoutingResult = namedtuple('RoutingResult', ['is_status_inquiry', 'loan_ids', 'account_numbers', 'next_page'])
+
+# Keywords that indicate a loan STATUS/TRACKING inquiry
+LOAN_STATUS_KEYWORDS = ('status', 'emi', 'sanction', 'due date', 'details', 'track', 'check', 'loan')
+
+# The old per-message status patterns (check.*status, loan.*details, when.*emi.*due, ...)
+# each contain at least one of the keywords above, so a keyword hit already covers them.
+#
+# One alternation, tried in this order at each position of the lowercased message:
+#   account   - account numbers such as BHLPL123 (reported uppercased)
+#   loan_id   - standalone digit runs; digits inside an account number have no word boundary
+#   keyword   - any status keyword, matched as a plain substring like the old `in` check
+#   page      - "more loans", "next loans" or "next page", asking for the next
+#               page of a multi-loan summary; a bare "more"/"next" ("when is my
+#               next emi due?") is not a paging request
+_ROUTING_RE = re.compile(
+    r'(?P<account>\bbhlpl\d+\b)'
+    r'|(?P<loan_id>\b\d+\b)'
+    r'|(?P<keyword>' + '|'.join(re.escape(keyword) for keyword in LOAN_STATUS_KEYWORDS) + r')'
+    r'|(?P<page>\b(?:(?:more|next)\s+loans?|next\s+page)\b)'
+)
+
+
+def route_message(message):
+    """
+    Classify a chat message in one pass over its lowercased text
+
+    Returns:
+        RoutingResult(is_status_inquiry, loan_ids, account_numbers, next_page) with ids in message order
+    """
+    loan_ids = []
+    account_numbers = []
+    has_status_keyword = False
+    next_page = False
+
+    for match in _ROUTING_RE.finditer(message.lower()):
+        kind = match.lastgroup
+        if kind == 'loan_id':
+            loan_ids.append(match.group())
+        elif kind == 'account':
+            account_numbers.append(match.group().upper())
+        elif kind == 'page':
+            # The phrase consumes any "loans" in it, and asking for a page is a status inquiry
+            next_page = True
+            has_status_keyword = True
+        else:
+            has_status_keyword = True
+
+    return RoutingResult(has_status_keyword, loan_ids, account_numbers, next_page)
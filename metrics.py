@@ -0,0 +1,253 @@
+"""
+In-process metrics exported in the Prometheus text format
+
+Counters and fixed-bucket histograms are plain Python objects guarded by one
+lock each; recording is a bisect and a few additions. Gauges are callbacks
+read only when /api/metrics is scraped, so pools and queues are never touched
+on the request path.
+
+    with STAGE_SECONDS.time('db'):         # records the seconds spent inside
+        ...
+    STAGE_SECONDS.observe('llm', 0.42)     # label values first, then seconds
+"""
+import math
+import time
+import bisect
+import threading
+
+# Upper bounds in seconds: sub-millisecond stages (routing, intent matching)
+# up to multi-second LLM generations
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.histogram.observe(*self.labels, time.perf_counter() - self.started)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Counter:
+    def __init__(self, registry, name, documentation, labels=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        """Add amount to the series for the given label values (positional, in label order)"""
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, registry, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, *labels_and_value):
+        """observe(label values..., seconds)"""
+        if not self.registry.enabled:
+            return
+        labels, value = labels_and_value[:-1], labels_and_value[-1]
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *labels):
+        """Context manager recording the seconds spent inside it"""
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def snapshot(self, *labels):
+        """(count, sum) for one series"""
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                return 0, 0.0
+            return sum(series[0]), series[1]
+
+    def collect(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names, labels, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            series_labels = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{series_labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{series_labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, registry, name, documentation, labels, callback):
+        """
+        Args:
+            callback: Called at scrape time; returns a number, or {label values tuple: number}
+        """
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.callback = callback
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.callback()
+        except Exception:
+            # A gauge whose source is not ready (pool not opened yet) is simply left out
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            if value is None:
+                continue
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(self, name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labels, buckets))
+
+    def gauge(self, name, documentation, callback, labels=()):
+        """Register (or replace) a gauge read through callback at scrape time"""
+        gauge = Gauge(self, name, documentation, labels, callback)
+        with self._lock:
+            self._metrics[name] = gauge
+        return gauge
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REGISTRY = MetricsRegistry()
+
+# Stages of answering a chat message; see ChatBot and LLMHandler
+STAGE_SECONDS = REGISTRY.histogram(
+    'chatbot_stage_seconds',
+    'Time spent per stage of answering a chat message',
+    labels=('stage',)
+)
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'http_requests_total',
+    'HTTP requests by route, method and status code',
+    labels=('route', 'method', 'status')
+)
+HTTP_ERRORS = REGISTRY.counter(
+    'http_request_errors_total',
+    'HTTP responses with a 5xx status code',
+    labels=('route',)
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    'http_request_seconds',
+    'Time to produce a response; for streamed responses, until the stream starts',
+    labels=('route',)
+)
+
+
+def record_request(route, method, status, seconds):
+    """Count one HTTP response; route is the URL rule (e.g. /api/loan-details/<loan_id>/<account_number>)"""
+    HTTP_REQUESTS.inc(route, method, str(status))
+    if status >= 500:
+        HTTP_ERRORS.inc(route)
+    HTTP_SECONDS.observe(route, seconds)
@@ -0,0 +1,263 @@
+"""
+Replay chat_history against the current intent catalogue
+
+Re-classifies stored user messages the way the answer pipeline would (loan
+status inquiries are set aside, then the exact tier, then the index tier) and
+compares the result with the intent that produced the stored bot_response.
+Rows are streamed from Postgres through a server-side cursor, or from a JSONL
+export with user_message / bot_response / session_id fields. Batches go to a
+process pool whose workers each load the catalogue once, and at most a few
+batches per worker are in flight, so memory stays flat however long the
+history is.
+
+Usage:
+    python replay_history.py [--jsonl export.jsonl] [--output replay.jsonl] [--summary summary.json]
+                             [--workers N] [--batch-size N] [--limit N] [--stored-intents DIR]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import multiprocessing
+from collections import Counter
+
+from config import config
+from message_router import route_message
+from intent_catalogue import normalize_pattern, load_snapshot
+from intent_handler import IntentHandler
+
+current_config = config.get(os.environ.get('FLASK_ENV', 'development'), config['default'])
+
+CHAT_HISTORY_QUERY = "SELECT user_message, bot_response, session_id FROM chat_history"
+
+# Labels for stored replies that are not an intent response, and messages no intent matches
+STATUS = '<status>'
+UNMATCHED = '<unmatched>'
+NO_INTENT = '<none>'
+
+_handler = None  # per worker process
+
+
+def _init_worker(intents_dir, matcher, cache_file):
+    global _handler
+    _handler = IntentHandler(matcher=matcher, intents_dir=intents_dir, cache_file=cache_file)
+
+
+def classify_messages(messages):
+    """
+    Classify a batch of user messages with this worker's IntentHandler
+
+    Returns:
+        [(tier, tag, confidence)] in message order; tier is 'status', 'exact',
+        'index' or 'none'
+    """
+    snapshot = _handler.snapshot
+    results = [None] * len(messages)
+    pending = []
+    for position, message in enumerate(messages):
+        if route_message(message).is_status_inquiry:
+            results[position] = ('status', None, 0.0)
+            continue
+        intent = snapshot.exact.get(normalize_pattern(message))
+        if intent is not None:
+            results[position] = ('exact', intent['tag'], 1.0)
+        else:
+            pending.append(position)
+
+    # classify_batch scores the rest together (one matrix product with the tfidf matcher)
+    matches = _handler.classify_batch([messages[position] for position in pending], top_k=1)
+    for position, match in zip(pending, matches):
+        results[position] = ('index', match[0][0], match[0][1]) if match else ('none', None, 0.0)
+    return results
+
+
+def _classify_batch(rows):
+    return rows, classify_messages([row['user_message'] for row in rows])
+
+
+def iter_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_database(itersize):
+    """Stream chat_history through a named (server-side) cursor, itersize rows per round trip"""
+    import psycopg2
+
+    connection = psycopg2.connect(**current_config.DB_CONFIG)
+    try:
+        with connection.cursor(name='replay_chat_history') as cursor:
+            cursor.itersize = itersize
+            cursor.execute(CHAT_HISTORY_QUERY)
+            for user_message, bot_response, session_id in cursor:
+                yield {'user_message': user_message, 'bot_response': bot_response, 'session_id': session_id}
+    finally:
+        connection.close()
+
+
+def iter_batches(rows, batch_size, limit=None):
+    batch = []
+    for count, row in enumerate(rows):
+        if limit is not None and count >= limit:
+            break
+        if row.get('user_message'):
+            batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _bounded(batches, slots, stop):
+    # Pool.imap's feeder thread drains its input as fast as it can; waiting for
+    # a free slot here keeps only a few batches per worker in memory
+    for batch in batches:
+        while not slots.acquire(timeout=0.5):
+            if stop.is_set():
+                return
+        yield batch
+
+
+def response_tags(snapshot):
+    """Map every response text of a catalogue to its intent tag"""
+    tags = {}
+    for intent in snapshot.intents:
+        for response in intent['responses']:
+            tags.setdefault(response, intent['tag'])
+    tags.setdefault(snapshot.default_response, 'default')
+    return tags
+
+
+class ReplaySummary:
+    def __init__(self):
+        self.messages = 0
+        self.changed = 0
+        self.tiers = Counter()
+        self.intents = Counter()
+        self.stored_intents = Counter()
+        self.transitions = Counter()  # (stored tag, replayed tag) for every changed message
+
+    def add(self, stored, replayed, tier):
+        self.messages += 1
+        self.tiers[tier] += 1
+        self.intents[replayed] += 1
+        self.stored_intents[stored] += 1
+        if stored != replayed and stored != UNMATCHED:
+            self.changed += 1
+            self.transitions[(stored, replayed)] += 1
+
+    def to_dict(self, top=50):
+        comparable = self.messages - self.stored_intents[UNMATCHED]
+        return {
+            'messages': self.messages,
+            'comparable': comparable,
+            'changed': self.changed,
+            'changed_share': self.changed / comparable if comparable else 0.0,
+            'tiers': dict(self.tiers),
+            'intents': dict(self.intents.most_common()),
+            'stored_intents': dict(self.stored_intents.most_common()),
+            'transitions': [
+                {'from': stored, 'to': replayed, 'count': count}
+                for (stored, replayed), count in self.transitions.most_common(top)
+            ],
+        }
+
+
+def replay(rows, output, workers, batch_size, limit=None, stored_intents=None, intents_dir=None,
+           matcher=None, cache_file=None):
+    """
+    Classify rows on a pool of workers, write one JSON line per message to output
+
+    Args:
+        rows: Iterable of dicts with user_message, bot_response and session_id
+        output: Text file the per-message results are written to
+        stored_intents: Catalogue folder that produced the stored replies; default intents_dir
+
+    Returns:
+        ReplaySummary
+    """
+    intents_dir = intents_dir or current_config.INTENTS_DIR
+    matcher = matcher or current_config.INTENT_MATCHER
+    cache_file = current_config.INTENT_CACHE_FILE if cache_file is None else cache_file
+    # Compile (or refresh) the cache once here so every worker loads the pickle instead of recompiling
+    snapshot = load_snapshot(intents_dir, matcher, current_config.INTENT_CONFIDENCE_THRESHOLD, cache_file)
+    if stored_intents and os.path.abspath(stored_intents) != os.path.abspath(intents_dir):
+        snapshot = load_snapshot(stored_intents, matcher, current_config.INTENT_CONFIDENCE_THRESHOLD)
+    tags = response_tags(snapshot)
+
+    summary = ReplaySummary()
+    slots = threading.Semaphore(workers * 4)
+    stop = threading.Event()
+    batches = _bounded(iter_batches(rows, batch_size, limit), slots, stop)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(intents_dir, matcher, cache_file)) as pool:
+        try:
+            for batch, results in pool.imap(_classify_batch, batches):
+                slots.release()
+                for row, (tier, tag, confidence) in zip(batch, results):
+                    if tier == 'status':
+                        replayed = STATUS
+                    else:
+                        replayed = tag if tag is not None else NO_INTENT
+                    stored = tags.get(row.get('bot_response'), UNMATCHED)
+                    summary.add(stored, replayed, tier)
+                    output.write(json.dumps({
+                        'session_id': row.get('session_id'),
+                        'user_message': row['user_message'],
+                        'tier': tier,
+                        'intent': tag,
+                        'confidence': round(confidence, 4),
+                        'stored_intent': stored,
+                        'changed': stored != replayed and stored != UNMATCHED,
+                    }) + '\n')
+        finally:
+            # Lets the feeder thread finish so the pool can shut down after an error
+            stop.set()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--jsonl', help='read rows from this export instead of the chat_history table')
+    parser.add_argument('--output', help='per-message results (JSONL); default stdout')
+    parser.add_argument('--summary', help='write the aggregate diff to this JSON file; default stderr')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--batch-size', type=int, default=500, help='messages per task sent to a worker')
+    parser.add_argument('--limit', type=int, help='stop after this many rows')
+    parser.add_argument('--intents', help='catalogue folder to replay against; default INTENTS_DIR')
+    parser.add_argument('--stored-intents', help='catalogue folder that produced the stored replies')
+    parser.add_argument('--matcher', choices=('overlap', 'tfidf'), help='default INTENT_MATCHER')
+    args = parser.parse_args()
+
+    if args.jsonl:
+        rows = iter_jsonl(args.jsonl)
+    else:
+        rows = iter_database(current_config.DB_CURSOR_ITERSIZE)
+
+    started = time.perf_counter()
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        summary = replay(rows, output, args.workers, args.batch_size, args.limit,
+                         args.stored_intents, args.intents, args.matcher)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - started
+
+    result = summary.to_dict()
+    result['seconds'] = elapsed
+    result['messages_per_second'] = summary.messages / elapsed if elapsed else 0.0
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    else:
+        json.dump(result, sys.stderr, indent=2)
+        sys.stderr.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Read replica selection shared by DatabaseManager and AsyncDatabaseManager
+
+Read-only lookups go to the replica with the fewest busy connections among
+those whose last lag check passed; when none qualifies they go to the
+primary. Writes never come through here. Lag is measured in the background
+(ReplicaMonitor for the thread-based app, an asyncio task in asgi_app), so a
+read never waits on a health check.
+"""
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind. A standby whose WAL receiver is streaming and
+# that has replayed everything it received is current even when the primary
+# has been idle for a while, which now() - pg_last_xact_replay_timestamp()
+# alone would report as lag. Once the receiver disconnects the received LSN
+# stops moving, so replaying it proves nothing and the replay timestamp is
+# used instead; NULL means nothing was ever replayed. pg_stat_wal_receiver's
+# status is only visible to roles with pg_read_all_stats; without it every
+# standby is measured by replay timestamp, which errs towards lag. A server
+# that is not in recovery reports 0.
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming')
+             AND pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+def replica_configs(db_config, hosts):
+    """Connection settings per replica: db_config with each 'host[:port]' in hosts swapped in"""
+    configs = []
+    for entry in hosts:
+        host, _, port = entry.strip().partition(':')
+        config = dict(db_config, host=host)
+        if port:
+            config['port'] = int(port)
+        configs.append(config)
+    return configs
+
+
+class Replica:
+    __slots__ = ('name', 'pool', 'lag', 'healthy', 'checked_at')
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.lag = None  # seconds, from the last successful check
+        self.healthy = False  # no reads until the first check passes
+        self.checked_at = None
+
+
+class ReplicaSet:
+    def __init__(self, replicas, max_lag, busy):
+        """
+        Args:
+            replicas: Replica objects, each wrapping its own connection pool
+            max_lag: Seconds behind the primary above which a replica gets no reads
+            busy: Callable pool -> connections checked out (or being opened) on it
+        """
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.busy = busy
+        self._lock = threading.Lock()
+        self.stats = {
+            'replica_reads': 0,
+            'primary_reads': 0,
+            'fallbacks': 0,
+        }
+
+    def choose(self):
+        """Least busy usable replica, or None to read from the primary"""
+        best, best_busy = None, None
+        for replica in self.replicas:
+            if not replica.healthy:
+                continue
+            busy = self.busy(replica.pool)
+            if best is None or busy < best_busy:
+                best, best_busy = replica, busy
+        with self._lock:
+            self.stats['replica_reads' if best is not None else 'primary_reads'] += 1
+        return best
+
+    def record_lag(self, replica, lag):
+        """Store a lag measurement; lag None (nothing replayed yet) counts as unusable"""
+        replica.lag = lag
+        replica.checked_at = time.monotonic()
+        usable = lag is not None and lag <= self.max_lag
+        if usable != replica.healthy:
+            if usable:
+                logger.info(f"Read replica {replica.name} back in rotation (lag {lag:.1f}s)")
+            else:
+                logger.warning(f"Read replica {replica.name} out of rotation (lag {lag}s, max {self.max_lag}s)")
+        replica.healthy = usable
+
+    def mark_failed(self, replica, error):
+        """Take a replica out of rotation after an error; the next passing check restores it"""
+        if replica.healthy:
+            logger.warning(f"Read replica {replica.name} out of rotation: {error}")
+        replica.healthy = False
+        replica.checked_at = time.monotonic()
+
+    def fail_over(self, replica, error):
+        """A read on replica hit a connection error and is being retried on the primary"""
+        self.mark_failed(replica, error)
+        self.record_fallback()
+
+    def record_fallback(self):
+        """A read chosen for a replica went to the primary after all"""
+        with self._lock:
+            self.stats['fallbacks'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['replicas'] = [{
+            'name': replica.name,
+            'healthy': replica.healthy,
+            'lag': replica.lag,
+            'busy': self.busy(replica.pool),
+        } for replica in self.replicas]
+        return stats
+
+
+class ReplicaMonitor:
+    def __init__(self, replica_set, check, interval=2.0):
+        """
+        Background thread that measures every replica's lag
+
+        Args:
+            replica_set: ReplicaSet whose replicas are checked
+            check: Callable replica -> lag in seconds (None if unknown); raising
+                takes the replica out of rotation
+            interval: Seconds between rounds of checks
+        """
+        self.replica_set = replica_set
+        self.check = check
+        self.interval = interval
+        self._stop = threading.Event()
+        self._worker = None
+
+    def check_all(self):
+        for replica in self.replica_set.replicas:
+            try:
+                self.replica_set.record_lag(replica, self.check(replica))
+            except Exception as e:
+                self.replica_set.mark_failed(replica, e)
+
+    def start(self):
+        """Check once, then keep checking on a daemon thread (idempotent)"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stop.clear()
+        self.check_all()
+        self._worker = threading.Thread(target=self._run, name='replica-lag-monitor', daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check_all()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        worker = self._worker
+        if worker is not None and worker.is_alive() and worker is not threading.current_thread():
+            worker.join(timeout)
@@ -0,0 +1,165 @@
+import os
+import json
+import string
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Output format -> template file extension
+FORMAT_EXTENSIONS = {
+    'markdown': '.md',
+    'text': '.txt',
+    'json': '.json',
+}
+
+_formatter = string.Formatter()
+
+
+@lru_cache(maxsize=8192)
+def format_inr(amount):
+    """
+    Format a number with Indian digit grouping and two decimals: 1234567.5 -> '12,34,567.50'
+
+    Cached because the same sanctioned amounts and EMIs are rendered over and over.
+    """
+    text = f"{abs(amount):.2f}"
+    whole, fraction = text[:-3], text[-3:]
+    if len(whole) > 3:
+        head, tail = whole[:-3], whole[-3:]
+        # Pad to an even length so the head splits into two-digit groups
+        if len(head) % 2:
+            head = ' ' + head
+        groups = [head[i:i + 2] for i in range(0, len(head), 2)]
+        whole = ','.join(groups).lstrip() + ',' + tail
+    return ('-' if amount < 0 else '') + whole + fraction
+
+
+def _field_expression(field_name, format_spec, conversion):
+    if not field_name.isidentifier():
+        raise ValueError(f"Template fields must be plain names, got {{{field_name}}}")
+    value = f"values[{field_name!r}]"
+    if conversion == 'r':
+        value = f"repr({value})"
+    elif conversion == 's':
+        value = f"str({value})"
+    if format_spec == 'inr':
+        return f"_inr({value})"
+    if format_spec == 'upper':
+        return f"str({value}).upper()"
+    if format_spec:
+        return f"format({value}, {format_spec!r})"
+    return f"str({value})"
+
+
+def compile_template(text, name='<template>'):
+    """
+    Compile a str.format-style template into a function values -> str
+
+    Fields are plain names looked up in the values mapping. Besides the usual
+    format specs, {field:inr} formats a rupee amount with Indian grouping and
+    {field:upper} upper-cases the value. The template is parsed once and turned
+    into a single ''.join over constant and field parts.
+    """
+    parts = []
+    for literal, field_name, format_spec, conversion in _formatter.parse(text):
+        if literal:
+            parts.append(repr(literal))
+        if field_name is not None:
+            parts.append(_field_expression(field_name, format_spec, conversion))
+
+    source = f"def render(values):\n    return ''.join(({', '.join(parts)},))\n" if parts else "def render(values):\n    return ''\n"
+    namespace = {'_inr': format_inr}
+    exec(compile(source, name, 'exec'), namespace)
+    return namespace['render']
+
+
+def compile_structure(structure, name='<template>'):
+    """Compile every string inside a JSON template; returns a function values -> rendered structure"""
+    if isinstance(structure, str):
+        return compile_template(structure, name)
+    if isinstance(structure, dict):
+        compiled = [(key, compile_structure(value, name)) for key, value in structure.items()]
+        return lambda values: {key: render(values) for key, render in compiled}
+    if isinstance(structure, list):
+        compiled = [compile_structure(value, name) for value in structure]
+        return lambda values: [render(values) for render in compiled]
+    return lambda values: structure
+
+
+class ReplyTemplates:
+    def __init__(self, directory):
+        """
+        Reply templates loaded from files and compiled once
+
+        Each template is a file named <name><ext> in directory, where the
+        extension picks the output format (see FORMAT_EXTENSIONS). Markdown and
+        text files are str.format templates (one trailing newline is ignored);
+        JSON files hold a structure whose strings are templates.
+
+        Args:
+            directory: Folder holding the template files
+        """
+        self.directory = directory
+        self._templates = {}
+        self.version = None  # hash of the loaded template files; changes when any of them does
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _compile(self, text, path, fmt):
+        if fmt == 'json':
+            return compile_structure(json.loads(text), path)
+        if text.endswith('\n'):
+            text = text[:-1]
+        return compile_template(text, path)
+
+    def reload(self):
+        """
+        Re-read and recompile every template; on any error the previous set is kept
+
+        Returns:
+            Number of templates loaded
+        """
+        extensions = {extension: fmt for fmt, extension in FORMAT_EXTENSIONS.items()}
+        templates = {}
+        digest = hashlib.sha256()
+        try:
+            for filename in sorted(os.listdir(self.directory)):
+                name, extension = os.path.splitext(filename)
+                fmt = extensions.get(extension)
+                if fmt is not None:
+                    path = os.path.join(self.directory, filename)
+                    with open(path, encoding='utf-8') as f:
+                        text = f.read()
+                    digest.update(f"\0{filename}\0{text}".encode('utf-8'))
+                    templates[(name, fmt)] = self._compile(text, path, fmt)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load reply templates from {self.directory}: {e}")
+            return len(self._templates)
+
+        with self._lock:
+            self._templates = templates
+            self.version = digest.hexdigest()[:12]
+        logger.info(f"Loaded {len(templates)} reply templates from {self.directory}")
+        return len(templates)
+
+    def render(self, name, values=None, fmt='markdown'):
+        """
+        Render template name in the given format
+
+        Raises:
+            KeyError: if there is no such template in that format
+        """
+        try:
+            template = self._templates[(name, fmt)]
+        except KeyError:
+            raise KeyError(f"No {fmt} reply template named {name!r}") from None
+        return template(values or {})
+
+    def has(self, name, fmt='markdown'):
+        return (name, fmt) in self._templates
+
+    def names(self):
+        return sorted(self._templates)
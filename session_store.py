@@ -0,0 +1,195 @@
+import sys
+import time
+import threading
+from collections import OrderedDict, deque
+
+# Rough bytes for a Session and its deque before any text is stored, and per stored string
+_SESSION_OVERHEAD = 400
+_STRING_OVERHEAD = sys.getsizeof('')
+
+
+class Session:
+    """
+    Conversation state for one chat session
+
+    Holds the loan_id / account_number slots of a status inquiry whose reply
+    asked for the missing half of its ids, whether the last reply was a page
+    of the customer's loan summary, and the last few turns (truncated). __slots__ keeps
+    each session small in memory and cheap to pickle for an external backend.
+    """
+
+    __slots__ = ('loan_id', 'account_number', 'loan_page_shown', 'turns')
+
+    def __init__(self, max_turns=6):
+        self.loan_id = None
+        self.account_number = None
+        self.loan_page_shown = False
+        self.turns = deque(maxlen=max_turns)  # (user message, bot reply) pairs, oldest first
+
+    def fill(self, routing):
+        """
+        Complete a routing result from the slots: a message carrying only the
+        account number (or only the loan ID) that the previous reply asked for
+        becomes a full status inquiry. Slots only outlive a turn that asked for
+        the missing id (see remember), so later unrelated numbers are left alone.
+
+        A request for the next page only continues a summary the previous reply
+        showed; otherwise the summary restarts from its first page.
+        """
+        if routing.next_page and not self.loan_page_shown:
+            routing = routing._replace(next_page=False)
+        if routing.loan_ids and not routing.account_numbers and self.account_number is not None:
+            return routing._replace(is_status_inquiry=True, account_numbers=[self.account_number])
+        if routing.account_numbers and not routing.loan_ids and self.loan_id is not None:
+            return routing._replace(is_status_inquiry=True, loan_ids=[self.loan_id])
+        return routing
+
+    def remember(self, routing):
+        """
+        Update the slots after a message has been answered: keep the id of a
+        status inquiry whose reply asked for the other one, clear them after
+        any other turn
+        """
+        # A status inquiry without ids is answered with the customer's loan summary
+        self.loan_page_shown = bool(routing.is_status_inquiry and not routing.loan_ids and not routing.account_numbers)
+        if routing.is_status_inquiry and routing.loan_ids and not routing.account_numbers:
+            self.loan_id = routing.loan_ids[0]
+        elif routing.is_status_inquiry and routing.account_numbers and not routing.loan_ids:
+            self.account_number = routing.account_numbers[0]
+        else:
+            # Looked up, answered from the catalogue or the customer's loan list:
+            # the next message starts from scratch
+            self.loan_id = None
+            self.account_number = None
+
+    def add_turn(self, user_message, bot_response, max_chars=500):
+        self.turns.append((user_message[:max_chars], bot_response[:max_chars]))
+
+    def size(self):
+        """Approximate memory footprint in bytes"""
+        size = _SESSION_OVERHEAD
+        for user_message, bot_response in self.turns:
+            size += 2 * _STRING_OVERHEAD + len(user_message) + len(bot_response)
+        for slot in (self.loan_id, self.account_number):
+            if slot is not None:
+                size += _STRING_OVERHEAD + len(slot)
+        return size
+
+
+class MemorySessionBackend:
+    def __init__(self, ttl=3600.0, max_bytes=64 * 1024 * 1024, clock=time.monotonic):
+        """
+        In-process session storage with sliding expiry and a memory cap
+
+        Every load or save moves a session to the most recently used end and
+        pushes its expiry to now + ttl, so the least recently used end is also
+        the first to expire: expired sessions are trimmed from there, and when
+        the approximate total size passes max_bytes the least recently used
+        sessions are evicted.
+
+        Args:
+            ttl: Seconds of inactivity after which a session is dropped
+            max_bytes: Approximate memory cap over all sessions
+            clock: Time source
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+
+        self._data = OrderedDict()  # session_id -> (session, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+        }
+
+    def _drop_expired(self, now):
+        while self._data:
+            session_id, (session, size, expires_at) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            del self._data[session_id]
+            self._bytes -= size
+            self.stats['expirations'] += 1
+
+    def load(self, session_id):
+        """Return the stored Session, or None if there is none or it expired"""
+        now = self.clock()
+        with self._lock:
+            self._drop_expired(now)
+            entry = self._data.get(session_id)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            session, size, _ = entry
+            self._data[session_id] = (session, size, now + self.ttl)
+            self._data.move_to_end(session_id)
+            self.stats['hits'] += 1
+            return session
+
+    def save(self, session_id, session):
+        now = self.clock()
+        size = session.size()
+        with self._lock:
+            previous = self._data.pop(session_id, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._data[session_id] = (session, size, now + self.ttl)
+            self._bytes += size
+            self._drop_expired(now)
+            # Never evict the session just saved
+            while self._bytes > self.max_bytes and len(self._data) > 1:
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.stats['evictions'] += 1
+
+    def delete(self, session_id):
+        with self._lock:
+            entry = self._data.pop(session_id, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({'sessions': len(self._data), 'bytes': self._bytes, 'max_bytes': self.max_bytes})
+        return stats
+
+
+class SessionStore:
+    def __init__(self, backend=None, ttl=3600.0, max_bytes=64 * 1024 * 1024, max_turns=6, turn_chars=500):
+        """
+        Conversation state keyed by session id
+
+        Args:
+            backend: Object with load(session_id), save(session_id, session) and
+                delete(session_id); defaults to a MemorySessionBackend. An external
+                backend (Redis, database) can pickle the Session it is given
+            ttl, max_bytes: Passed to the default MemorySessionBackend
+            max_turns: Recent turns kept per session
+            turn_chars: Characters kept of each message and reply
+        """
+        self.backend = backend or MemorySessionBackend(ttl=ttl, max_bytes=max_bytes)
+        self.max_turns = max_turns
+        self.turn_chars = turn_chars
+
+    def get(self, session_id):
+        """The session for session_id, or a new empty one (stored on the first save)"""
+        session = self.backend.load(session_id)
+        return session if session is not None else Session(self.max_turns)
+
+    def record(self, session_id, session, routing, user_message, bot_response):
+        """Update the slots and turns after a reply and store the session"""
+        session.remember(routing)
+        session.add_turn(user_message, bot_response, self.turn_chars)
+        self.backend.save(session_id, session)
+
+    def delete(self, session_id):
+        self.backend.delete(session_id)
+
+    def get_stats(self):
+        get_stats = getattr(self.backend, 'get_stats', None)
+        return get_stats() if get_stats is not None else {}
@@ -0,0 +1,67 @@
+import pytest
+
+from cache import TTLCache, MISSING
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=4, ttl=10, clock=clock)
+    cache.set('a', 1)
+    clock.now = 9.9
+    assert cache.get('a') == 1
+    clock.now = 10.0
+    assert cache.get('a') is MISSING
+    assert cache.get_stats()['expirations'] == 1
+
+
+def test_negative_entries_use_their_own_ttl():
+    clock = FakeClock()
+    cache = TTLCache(ttl=60, negative_ttl=5, clock=clock)
+    cache.set('missing', None, negative=True)
+    assert cache.get('missing') is None
+    clock.now = 5
+    assert cache.get('missing') is MISSING
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=None)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_invalidate_where():
+    cache = TTLCache(ttl=None)
+    for key in range(5):
+        cache.set(key, key * 10)
+    assert cache.invalidate_where(lambda key, value: value >= 30) == 2
+    assert len(cache) == 3
+
+
+def test_dump_and_load_skip_expired_entries():
+    clock = FakeClock()
+    cache = TTLCache(ttl=10, clock=clock)
+    cache.set('short', 1, ttl=1)
+    cache.set('long', 2)
+    clock.now = 2
+    restored = TTLCache(ttl=10, clock=clock)
+    restored.load(cache.dump())
+    assert restored.get('short') is MISSING
+    assert restored.get('long') == 2
+
+
+def test_maxsize_must_be_positive():
+    with pytest.raises(ValueError):
+        TTLCache(maxsize=0)
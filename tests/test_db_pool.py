@@ -0,0 +1,135 @@
+import random
+import threading
+import time
+
+import pytest
+
+import db_pool
+from db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    """Stands in for a psycopg2 connection; counts how many are open at once"""
+
+    def __init__(self, tracker, ping_fails=0.0):
+        self.tracker = tracker
+        self.ping_fails = ping_fails
+        self.closed = 0
+        self.status = db_pool.psycopg2.extensions.STATUS_READY
+        tracker.opened()
+
+    def cursor(self):
+        return self
+
+    def execute(self, query):
+        time.sleep(0.001)
+
+    def fetchone(self):
+        if random.random() < self.ping_fails:
+            raise Exception("server closed the connection")
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        if not self.closed:
+            self.closed = 1
+            self.tracker.closed()
+
+
+class Tracker:
+    def __init__(self):
+        self.open = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def opened(self):
+        with self._lock:
+            self.open += 1
+            self.peak = max(self.peak, self.open)
+
+    def closed(self):
+        with self._lock:
+            self.open -= 1
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = Tracker()
+    tracker.ping_fails = 0.0
+    monkeypatch.setattr(db_pool.psycopg2, 'connect', lambda **kwargs: FakeConnection(tracker, tracker.ping_fails))
+    return tracker
+
+
+def test_open_connections_never_exceed_max_size(tracker):
+    # Every checkout health-checks (interval 0) and half the pings fail, so
+    # stale connections are replaced while other threads are checking out
+    tracker.ping_fails = 0.5
+    pool = ConnectionPool({}, min_size=2, max_size=4, timeout=5, healthcheck_interval=0)
+    pool.open()
+
+    def work():
+        for _ in range(100):
+            with pool.connection():
+                time.sleep(0.0005)
+
+    threads = [threading.Thread(target=work) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert tracker.peak <= 4
+    assert pool.busy() == 0
+    assert pool.get_stats()['reconnects'] > 0
+
+
+def test_checkout_times_out_when_pool_is_exhausted(tracker):
+    pool = ConnectionPool({}, min_size=0, max_size=2, timeout=0.1)
+    held = [pool.getconn(), pool.getconn()]
+
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert 0.1 <= time.monotonic() - started < 1.0
+    assert pool.get_stats()['timeouts'] == 1
+
+    pool.putconn(held.pop())
+    assert pool.getconn(timeout=0) is not None
+
+
+def test_waiter_gets_the_connection_returned_by_another_thread(tracker):
+    pool = ConnectionPool({}, min_size=0, max_size=1, timeout=2)
+    connection = pool.getconn()
+    threading.Timer(0.05, pool.putconn, args=(connection,)).start()
+    assert pool.getconn() is connection
+    assert tracker.peak == 1
+
+
+def test_failed_connect_gives_the_slot_back(tracker, monkeypatch):
+    pool = ConnectionPool({}, min_size=0, max_size=1, timeout=0.1)
+
+    def refuse(**kwargs):
+        raise db_pool.psycopg2.OperationalError("connection refused")
+
+    monkeypatch.setattr(db_pool.psycopg2, 'connect', refuse)
+    with pytest.raises(db_pool.psycopg2.OperationalError):
+        pool.getconn()
+    assert pool.busy() == 0
+
+    monkeypatch.setattr(db_pool.psycopg2, 'connect', lambda **kwargs: FakeConnection(tracker))
+    assert pool.getconn() is not None
+
+
+def test_discarded_connection_is_closed_not_reused(tracker):
+    pool = ConnectionPool({}, min_size=0, max_size=1)
+    connection = pool.getconn()
+    pool.putconn(connection, discard=True)
+    assert connection.closed
+    assert pool.getconn() is not connection
+    assert pool.get_stats()['connections_closed'] == 1
+
+
+def test_invalid_sizes_are_rejected():
+    with pytest.raises(ValueError):
+        ConnectionPool({}, min_size=3, max_size=2)
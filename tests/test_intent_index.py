@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from intent_handler import IntentHandler
+from intent_index import AhoCorasick
+
+
+@pytest.fixture(scope='module')
+def handler():
+    return IntentHandler(matcher='overlap', cache_file='')
+
+
+def sample_messages(handler, count=300):
+    """Catalogue patterns, patterns with words dropped or added, and mixes of several patterns"""
+    rng = random.Random(7)
+    patterns = [pattern for intent in handler.intents["intents"] for pattern in intent["patterns"]]
+    words = [word for pattern in patterns for word in pattern.split()] + ['hello', 'loan', 'xyz', '42']
+    messages = list(patterns)
+    for _ in range(count):
+        pattern = rng.choice(patterns).split()
+        kind = rng.randrange(3)
+        if kind == 0 and len(pattern) > 1:
+            pattern.pop(rng.randrange(len(pattern)))
+        elif kind == 1:
+            pattern.insert(rng.randrange(len(pattern) + 1), rng.choice(words))
+        else:
+            pattern += rng.choice(patterns).split()
+        messages.append(' '.join(pattern))
+    return messages
+
+
+def test_index_agrees_with_the_linear_scan(handler):
+    for message in sample_messages(handler):
+        intent, score = handler.find_best_intent(message)
+        expected_intent, expected_score = handler.find_best_intent_linear(message)
+        assert (intent and intent["tag"], score) == (expected_intent and expected_intent["tag"], expected_score), message
+
+
+def test_top_intents_lead_with_find_best(handler):
+    for message in sample_messages(handler, count=50):
+        best, score = handler.snapshot.index.find_best(message, handler.confidence_threshold)
+        top = handler.snapshot.index.top_intents(message, handler.confidence_threshold, top_k=3)
+        if best is None:
+            assert top == []
+        else:
+            assert top[0] == (best, score)
+            assert len({intent["tag"] for intent, _ in top}) == len(top)
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    automaton = AhoCorasick(['he', 'she', 'his', 'hers', ''])
+    assert automaton.find_all('ushers') == {0, 1, 3, 4}
+    assert automaton.find_all('xyz') == {4}
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from llm_admission import (
+    AdmissionController, AdmissionRejected, AsyncAdmissionController, AsyncCallGuard, AsyncSingleFlight,
+    BreakerOpen, CallGuard, CircuitBreaker
+)
+
+
+def half_open(breaker):
+    breaker._state = CircuitBreaker.OPEN
+    breaker._opened_at = time.monotonic() - breaker.reset_timeout
+
+
+def test_full_queue_is_rejected_immediately():
+    admission = AdmissionController(max_inflight=1, max_queue=0)
+    admission.acquire(time.monotonic() + 1)
+    with pytest.raises(AdmissionRejected):
+        admission.acquire(time.monotonic() + 1)
+    assert admission.get_stats()['rejected_queue_full'] == 1
+
+
+def test_guard_records_failure_and_frees_the_slot():
+    admission = AdmissionController(max_inflight=1)
+    breaker = CircuitBreaker(failure_threshold=1)
+    guard = CallGuard(admission, breaker)
+    with pytest.raises(RuntimeError):
+        with guard.call(time.monotonic() + 1):
+            raise RuntimeError("upstream failed")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert admission.get_stats()['inflight'] == 0
+    with pytest.raises(BreakerOpen):
+        with guard.call(time.monotonic() + 1):
+            pass
+    assert admission.get_stats()['inflight'] == 0
+
+
+def test_abandoned_stream_gives_the_half_open_trial_back():
+    breaker = CircuitBreaker()
+    guard = CallGuard(AdmissionController(), breaker)
+
+    def stream():
+        with guard.call(time.monotonic() + 1):
+            yield 'token'
+
+    half_open(breaker)
+    tokens = stream()
+    next(tokens)
+    tokens.close()
+    assert breaker.allow_request()
+
+
+def test_async_slot_goes_to_the_oldest_live_waiter():
+    async def main():
+        admission = AsyncAdmissionController(max_inflight=1, max_queue=5)
+        await admission.acquire(time.monotonic() + 1)
+        first = asyncio.create_task(admission.acquire(time.monotonic() + 1))
+        second = asyncio.create_task(admission.acquire(time.monotonic() + 1))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0)
+        admission.release(0.01)
+        await asyncio.wait_for(second, 1)
+        stats = admission.get_stats()
+        assert (stats['inflight'], stats['queue_depth']) == (1, 0)
+        admission.release()
+        assert admission.get_stats()['inflight'] == 0
+
+    asyncio.run(main())
+
+
+def test_async_waiter_is_rejected_at_its_deadline():
+    async def main():
+        admission = AsyncAdmissionController(max_inflight=1, max_queue=5)
+        await admission.acquire(time.monotonic() + 1)
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire(time.monotonic() + 0.05)
+        assert admission.get_stats()['queue_depth'] == 0
+
+    asyncio.run(main())
+
+
+def test_async_single_flight_coalesces_identical_calls():
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return 'answer'
+
+    async def main():
+        flight = AsyncSingleFlight()
+        results = await asyncio.gather(*[flight.do('key', generate, timeout=1) for _ in range(3)])
+        assert results == ['answer'] * 3
+        assert flight.get_stats()['coalesced'] == 2
+
+    asyncio.run(main())
+    assert len(calls) == 1
+
+
+def test_cancelled_async_call_gives_the_half_open_trial_back():
+    async def main():
+        breaker = CircuitBreaker()
+        guard = AsyncCallGuard(AsyncAdmissionController(), breaker)
+
+        async def call():
+            async with guard.call(time.monotonic() + 1):
+                await asyncio.sleep(1)
+
+        half_open(breaker)
+        task = asyncio.create_task(call())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert breaker.allow_request()
+
+    asyncio.run(main())
@@ -0,0 +1,46 @@
+import pytest
+
+from message_router import route_message
+
+
+def test_ids_and_keywords_in_one_pass():
+    routing = route_message("Check status of loan 42 on BHLPL0000042")
+    assert routing.is_status_inquiry
+    assert routing.loan_ids == ['42']
+    assert routing.account_numbers == ['BHLPL0000042']
+    assert not routing.next_page
+
+
+def test_digits_inside_an_account_number_are_not_a_loan_id():
+    routing = route_message("bhlpl123")
+    assert routing.loan_ids == []
+    assert routing.account_numbers == ['BHLPL123']
+
+
+def test_message_without_keywords_is_not_a_status_inquiry():
+    routing = route_message("what are your interest rates for 5 years?")
+    assert not routing.is_status_inquiry
+    assert routing.loan_ids == ['5']
+
+
+@pytest.mark.parametrize('message', [
+    "more loans",
+    "Next loans please",
+    "show me the next page",
+    "more   loan",
+])
+def test_paging_phrases(message):
+    routing = route_message(message)
+    assert routing.next_page
+    assert routing.is_status_inquiry
+
+
+@pytest.mark.parametrize('message', [
+    "when is my next emi due date?",
+    "tell me more about my loan status",
+    "next",
+    "more",
+    "what happens next with my sanction?",
+])
+def test_bare_more_or_next_does_not_page(message):
+    assert not route_message(message).next_page
@@ -0,0 +1,88 @@
+from message_router import route_message
+from session_store import Session, SessionStore, MemorySessionBackend
+
+
+def turn(session, message):
+    """Route message through the session and record the turn, like chat_core.route and SessionStore.record"""
+    routing = session.fill(route_message(message))
+    session.remember(routing)
+    return routing
+
+
+def test_account_number_outside_a_status_inquiry_is_not_kept():
+    session = Session()
+    turn(session, "my account is BHLPL0000007")
+    routing = turn(session, "what are your interest rates for 5 years?")
+    assert not routing.is_status_inquiry
+    assert routing.account_numbers == []
+
+
+def test_missing_account_number_is_filled_on_the_next_turn():
+    session = Session()
+    turn(session, "status of loan 7")
+    routing = turn(session, "BHLPL0000007")
+    assert routing.is_status_inquiry
+    assert routing.loan_ids == ['7']
+    assert routing.account_numbers == ['BHLPL0000007']
+
+
+def test_missing_loan_id_is_filled_on_the_next_turn():
+    session = Session()
+    turn(session, "check status of BHLPL0000007")
+    routing = turn(session, "7")
+    assert routing.is_status_inquiry
+    assert (routing.loan_ids, routing.account_numbers) == (['7'], ['BHLPL0000007'])
+
+
+def test_slots_are_cleared_after_a_non_status_turn():
+    session = Session()
+    turn(session, "status of loan 7")
+    turn(session, "what are your interest rates?")
+    assert session.loan_id is None and session.account_number is None
+    routing = turn(session, "BHLPL0000007")
+    assert routing.loan_ids == []
+
+
+def test_slots_are_cleared_after_a_completed_lookup():
+    session = Session()
+    turn(session, "status of loan 7")
+    turn(session, "BHLPL0000007")
+    routing = turn(session, "what about 5 years rates?")
+    assert not routing.is_status_inquiry
+    assert routing.account_numbers == []
+
+
+def test_next_page_needs_a_summary_on_the_previous_turn():
+    session = Session()
+    assert not turn(session, "more loans").next_page
+
+    turn(session, "my loan status")
+    assert turn(session, "more loans").next_page
+    assert turn(session, "next page").next_page
+
+    turn(session, "what are your interest rates?")
+    assert not turn(session, "more loans").next_page
+
+
+def test_store_round_trip_and_turns():
+    store = SessionStore(max_turns=2, turn_chars=5)
+    session = store.get('s1')
+    store.record('s1', session, route_message("status of loan 7"), "status of loan 7", "which account?")
+    store.record('s1', session, route_message("hello"), "hello", "hi there")
+    store.record('s1', session, route_message("bye"), "bye", "goodbye")
+    loaded = store.get('s1')
+    assert loaded is session
+    assert list(loaded.turns) == [("hello", "hi th"), ("bye", "goodb")]
+
+
+def test_memory_backend_expires_and_evicts():
+    now = [0.0]
+    backend = MemorySessionBackend(ttl=10, max_bytes=Session().size() * 2, clock=lambda: now[0])
+    for session_id in ('a', 'b', 'c'):
+        backend.save(session_id, Session())
+    assert backend.load('a') is None
+    assert backend.get_stats()['evictions'] == 1
+
+    now[0] = 11.0
+    assert backend.load('b') is None
+    assert backend.get_stats()['expirations'] == 2
@@ -0,0 +1,117 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed when INTENT_MATCHER = 'tfidf'
+    np = None
+
+try:
+    from scipy import sparse
+except ImportError:  # fall back to dense NumPy matrices
+    sparse = None
+
+
+class TfidfIntentMatcher:
+    """
+    Cosine-similarity intent scorer over a TF-IDF matrix of all patterns
+
+    Every pattern becomes an L2-normalised TF-IDF row at load time, so scoring
+    a message is one matrix-vector product followed by a per-intent max over
+    that intent's pattern rows. A batch of messages is one matrix-matrix product.
+    """
+
+    def __init__(self, intents, preprocess, threshold=0.3):
+        if np is None:
+            raise ImportError("numpy is required for the tfidf intent matcher (pip install numpy)")
+
+        self.preprocess = preprocess
+        self.threshold = threshold
+        self.intents = []
+        self.vocabulary = {}
+
+        # Pattern rows are grouped by intent so np.maximum.reduceat can take the per-intent max
+        pattern_tokens = []
+        intent_offsets = []
+        for intent in intents:
+            if intent["tag"] == "default":
+                continue
+            tokenized = [self.tokenize(pattern) for pattern in intent["patterns"]]
+            tokenized = [tokens for tokens in tokenized if tokens]
+            if not tokenized:
+                continue
+            intent_offsets.append(len(pattern_tokens))
+            self.intents.append(intent)
+            pattern_tokens.extend(tokenized)
+            for tokens in tokenized:
+                for token in tokens:
+                    self.vocabulary.setdefault(token, len(self.vocabulary))
+
+        self.intent_offsets = np.array(intent_offsets, dtype=np.intp)
+
+        # Smoothed IDF, as in scikit-learn: idf = ln((1 + n) / (1 + df)) + 1
+        document_frequency = np.zeros(len(self.vocabulary))
+        for tokens in pattern_tokens:
+            for token in set(tokens):
+                document_frequency[self.vocabulary[token]] += 1
+        n_patterns = len(pattern_tokens)
+        self.idf = np.log((1 + n_patterns) / (1 + document_frequency)) + 1
+
+        self.pattern_matrix = self._vectorize_tokens(pattern_tokens)
+
+    def tokenize(self, text):
+        return self.preprocess(text).split()
+
+    def _vectorize_tokens(self, token_lists):
+        """Build an L2-normalised (len(token_lists) x vocabulary) TF-IDF matrix"""
+        rows, cols, values = [], [], []
+        for row, tokens in enumerate(token_lists):
+            counts = {}
+            for token in tokens:
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    counts[column] = counts.get(column, 0) + 1
+            weights = {column: count * self.idf[column] for column, count in counts.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+            for column, weight in weights.items():
+                rows.append(row)
+                cols.append(column)
+                values.append(weight / norm)
+
+        shape = (len(token_lists), len(self.vocabulary))
+        if sparse is not None:
+            return sparse.csr_matrix((values, (rows, cols)), shape=shape)
+        matrix = np.zeros(shape)
+        matrix[rows, cols] = values
+        return matrix
+
+    def score_batch(self, texts):
+        """Return a (len(texts) x len(self.intents)) array of cosine scores"""
+        if not self.intents or not texts:
+            return np.zeros((len(texts), len(self.intents)))
+        queries = self._vectorize_tokens([self.tokenize(text) for text in texts])
+        pattern_scores = self.pattern_matrix @ queries.T
+        if sparse is not None and sparse.issparse(pattern_scores):
+            pattern_scores = pattern_scores.toarray()
+        return np.maximum.reduceat(np.asarray(pattern_scores).T, self.intent_offsets, axis=1)
+
+    def classify_batch(self, texts, top_k=1):
+        """Return, per text, up to top_k (intent, confidence) pairs at or above the threshold"""
+        results = []
+        for scores in self.score_batch(texts):
+            # Stable sort keeps catalogue order on ties
+            ranked = np.argsort(-scores, kind='stable')[:top_k]
+            results.append([
+                (self.intents[i], float(scores[i])) for i in ranked
+                if scores[i] > 0 and scores[i] >= self.threshold
+            ])
+        return results
+
+    def classify(self, text, top_k=1):
+        return self.classify_batch([text], top_k)[0]
+
+    def find_best(self, user_input):
+        """Return (intent, confidence) for the best match, or (None, 0) below the threshold"""
+        matches = self.classify(user_input, top_k=1)
+        if not matches:
+            return None, 0
+        return matches[0]